@@ -1,32 +1,204 @@
+from django import forms
 from django.contrib import admin
-from .models import CartItem, Product, User, MenuItem, Order
+from django.db import transaction
+from django.db.models import BigIntegerField, Q
+from django.db.models.functions import Lower
+from django.utils import timezone
+from .models import CartItem, Product, User, MenuItem, Order, OrderLine, SearchEntry
+from .cart import invalidate_cart
+from .catalog import bump_catalog_version
+from .jobs import schedule_catalog_warmup
+from .orders import transition_many
+from .pagination import EstimatedCountPaginator
+from .search import matching_ids
+from .images import InvalidImage, attach_image, read_upload
+
+
+def matching_users(term):
+    """
+    Users whose email (case-insensitively) or username starts with ``term``:
+    two range scans on ``user_email_lower_idx`` and the username index.
+    """
+    term = term.strip()
+    return User.objects.alias(email_lower=Lower('email')).filter(
+        Q(email_lower__gte=term.lower(), email_lower__lt=term.lower() + '\U0010ffff')
+        | Q(username__gte=term, username__lt=term + '\U0010ffff')
+    )
+
+
+class LargeTableMixin:
+    """Changelists that never ``COUNT(*)`` the whole table (see ``EstimatedCountPaginator``)."""
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+
+class IndexedSearchMixin:
+    """Answer the changelist search box from the catalog search index instead of icontains scans."""
+    search_kind = None
+
+    def get_search_results(self, request, queryset, search_term):
+        if not search_term.strip():
+            return queryset, False
+        ids = matching_ids(search_term, self.search_kind)
+        return (queryset.none() if ids is None else queryset.filter(pk__in=ids)), False
+
+
+class AvailabilityActionsMixin:
+    """Bulk "mark (un)available" actions for catalog models, each a single UPDATE."""
+    actions = ['mark_unavailable', 'mark_available']
+
+    @admin.action(description='Mark selected items as unavailable')
+    def mark_unavailable(self, request, queryset):
+        self.set_available(request, queryset, False)
+
+    @admin.action(description='Mark selected items as available')
+    def mark_available(self, request, queryset):
+        self.set_available(request, queryset, True)
+
+    def set_available(self, request, queryset, available):
+        changes = {'available': available}
+        if any(field.name == 'updated_at' for field in self.model._meta.fields):
+            changes['updated_at'] = timezone.now()
+        # Bulk updates bypass the catalog signals: refresh the search entries
+        # (before the update changes what ``queryset`` matches) and cached pages here.
+        with transaction.atomic():
+            SearchEntry.objects.filter(object_id__in=queryset.values('pk')).update(available=available)
+            count = queryset.update(**changes)
+            transaction.on_commit(bump_catalog_version)
+            transaction.on_commit(schedule_catalog_warmup)
+        self.message_user(request, f"{count} {'available' if available else 'unavailable'} now.")
+
 
 @admin.register(CartItem)
-class CartItemAdmin(admin.ModelAdmin):
+class CartItemAdmin(LargeTableMixin, admin.ModelAdmin):
     list_display = ('user', 'product', 'quantity')
-    search_fields = ('product__name', 'user__username')
-    list_filter = ('user',)
+    list_select_related = ('user', 'product')
+    autocomplete_fields = ('user', 'product')
+    search_fields = ('product__name', 'user__email')  # see get_search_results
+    search_help_text = 'Start of a customer email or username, or words from a product name.'
+
+    def get_search_results(self, request, queryset, search_term):
+        if not search_term.strip():
+            return queryset, False
+        condition = Q(user__in=matching_users(search_term))
+        products = matching_ids(search_term)
+        if products is not None:
+            condition |= Q(product_id__in=products)
+        return queryset.filter(condition), False
+
+    # Admin edits bypass api.cart, so invalidate cached cart snapshots here,
+    # once the admin's transaction commits (as api.cart does): a read racing
+    # an earlier bump could cache the old rows under the new revision.
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        transaction.on_commit(lambda: invalidate_cart(obj.user_id))
+
+    def delete_model(self, request, obj):
+        super().delete_model(request, obj)
+        transaction.on_commit(lambda: invalidate_cart(obj.user_id))
+
+    def delete_queryset(self, request, queryset):
+        user_ids = set(queryset.values_list('user_id', flat=True))
+        super().delete_queryset(request, queryset)
+        for user_id in user_ids:
+            transaction.on_commit(lambda user_id=user_id: invalidate_cart(user_id))
+
+class ProductForm(forms.ModelForm):
+    upload = forms.FileField(required=False, label='New image', help_text='Resized variants are rendered in the background.')
+
+    class Meta:
+        model = Product
+        exclude = ['image', 'image_variants']
+
+    def clean_upload(self):
+        upload = self.cleaned_data['upload']
+        if upload:
+            try:
+                read_upload(upload)
+            except InvalidImage as e:
+                raise forms.ValidationError(str(e))
+        return upload
 
 @admin.register(Product)
-class ProductAdmin(admin.ModelAdmin):
-    list_display = ('name', 'price', 'available')
-    search_fields = ('name',)
-    list_filter = ('available',)
+class ProductAdmin(LargeTableMixin, IndexedSearchMixin, AvailabilityActionsMixin, admin.ModelAdmin):
+    form = ProductForm
+    list_display = ('name', 'kind', 'price', 'available')
+    search_fields = ('name', 'description')
+    list_filter = ('kind', 'available')
+    ordering = ('-pk',)
+    readonly_fields = ('image',)
+
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        if form.cleaned_data.get('upload'):
+            attach_image(obj, form.cleaned_data['upload'])
 
 @admin.register(User)
-class UserAdmin(admin.ModelAdmin):
+class UserAdmin(LargeTableMixin, admin.ModelAdmin):
     list_display = ('username', 'email', 'created_at')
-    search_fields = ('username', 'email')
+    search_fields = ('username', 'email')  # see get_search_results
+    search_help_text = 'Start of an email or username.'
     list_filter = ('created_at',)
+    ordering = ('-pk',)
+
+    def get_search_results(self, request, queryset, search_term):
+        if not search_term.strip():
+            return queryset, False
+        return queryset.filter(pk__in=matching_users(search_term).values('pk')), False
 
 @admin.register(MenuItem)
-class MenuItemAdmin(admin.ModelAdmin):
+class MenuItemAdmin(LargeTableMixin, IndexedSearchMixin, AvailabilityActionsMixin, admin.ModelAdmin):
     list_display = ('name', 'price', 'available')
-    search_fields = ('name',)
+    exclude = ('image', 'image_variants')
+    search_fields = ('name', 'description')
+    search_kind = SearchEntry.Kind.MENU_ITEM
     list_filter = ('available',)
+    ordering = ('-pk',)
+
+class OrderLineInline(admin.TabularInline):
+    model = OrderLine
+    extra = 0
+    readonly_fields = ('product', 'name', 'unit_price', 'quantity')
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('product')
 
 @admin.register(Order)
-class OrderAdmin(admin.ModelAdmin):
-    list_display = ('user', 'status', 'created_at')
-    search_fields = ('user__username', 'status')
+class OrderAdmin(LargeTableMixin, admin.ModelAdmin):
+    list_display = ('user', 'status', 'total', 'created_at')
+    list_select_related = ('user',)
+    autocomplete_fields = ('user', 'items')
+    inlines = (OrderLineInline,)
+    search_fields = ('id', 'user__email')  # see get_search_results
+    search_help_text = 'An order number, or the start of a customer email or username.'
     list_filter = ('status', 'created_at')
+    actions = ['advance_status', 'cancel_orders']
+
+    # The kitchen's happy path; each step must be allowed by Order.TRANSITIONS.
+    ADVANCE = {
+        Order.Status.PENDING: Order.Status.PREPARING,
+        Order.Status.PREPARING: Order.Status.READY,
+        Order.Status.READY: Order.Status.COMPLETED,
+    }
+
+    def get_search_results(self, request, queryset, search_term):
+        term = search_term.strip().lstrip('#')
+        if not term:
+            return queryset, False
+        if term.isascii() and term.isdigit():
+            # Beyond the BigAutoField range no order can match, and the driver would overflow.
+            if len(term) > 19 or int(term) > BigIntegerField.MAX_BIGINT:
+                return queryset.none(), False
+            return queryset.filter(pk=int(term)), False
+        return queryset.filter(user__in=matching_users(term)), False
+
+    @admin.action(description='Advance selected orders to their next status')
+    def advance_status(self, request, queryset):
+        moved = transition_many(queryset, self.ADVANCE)
+        self.message_user(request, f'{moved} order(s) advanced; completed and cancelled orders were left as they were.')
+
+    @admin.action(description='Cancel selected orders')
+    def cancel_orders(self, request, queryset):
+        moves = {Order.Status.PENDING: Order.Status.CANCELLED, Order.Status.PREPARING: Order.Status.CANCELLED}
+        moved = transition_many(queryset, moves)
+        self.message_user(request, f'{moved} order(s) cancelled; orders past preparing were left as they were.')
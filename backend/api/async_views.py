@@ -0,0 +1,160 @@
+"""
+Async (ASGI-native) variants of the read-heavy endpoints.
+
+DRF's ``APIView`` is synchronous, so under ASGI every request to it hops
+through a thread executor. These views are plain Django coroutines: the
+ORM is driven with ``aiterator``/``aget``/``aexists``, serializers only
+touch already-loaded rows, and the JSON is produced by DRF's renderer so
+the bytes (and catalog cache entries) are identical to the sync views.
+Choose them per route with ``ASYNC_API_ROUTES`` in settings.
+"""
+import asyncio
+import json
+from functools import wraps
+
+from django.core.handlers.asgi import ASGIRequest
+from django.http import HttpResponse, StreamingHttpResponse
+from django.views.decorators.http import require_GET
+from rest_framework import status
+from rest_framework.exceptions import APIException, NotAuthenticated, PermissionDenied
+
+from .authentication import aauthenticate
+from .cart import cart_cache, cart_lines
+from .catalog import acatalog_version, catalog_cache, catalog_etag
+from .events import KITCHEN_CHANNEL, event_settings, get_broker, user_channel
+from .orders import active_orders
+from .models import Product
+from .pagination import KeysetPagination
+from .renderers import JSONRenderer
+from .serializers import CartItemSerializer, ProductSerializer, UserSerializer
+from .views import etag_matches, filter_products, requested_fields
+
+renderer = JSONRenderer()
+
+
+def json_response(data, status_code=status.HTTP_200_OK, headers=None):
+    return HttpResponse(renderer.render(data), status=status_code, content_type='application/json', headers=headers)
+
+
+def async_api_view(authenticated=False):
+    """Authenticate the request and turn DRF exceptions into JSON error responses."""
+    def decorator(view):
+        @wraps(view)
+        async def wrapper(request, *args, **kwargs):
+            try:
+                request.user = await aauthenticate(request)
+                if authenticated and request.user is None:
+                    raise NotAuthenticated()
+                return await view(request, *args, **kwargs)
+            except APIException as exc:
+                detail = exc.detail if isinstance(exc.detail, (dict, list)) else {'detail': exc.detail}
+                headers = {'WWW-Authenticate': 'Bearer realm="api"'} if exc.status_code == 401 else None
+                return json_response(detail, exc.status_code, headers)
+        return wrapper
+    return decorator
+
+
+@require_GET
+@async_api_view()
+async def product_list(request):
+    """Async counterpart of ``ProductListView`` (same filters, pagination, ETag and cache)."""
+    version = await acatalog_version()
+    etag = catalog_etag(version, request.GET.urlencode())
+    if etag_matches(request, etag):
+        return HttpResponse(status=status.HTTP_304_NOT_MODIFIED, headers={'ETag': etag})
+
+    async def render():
+        paginator = KeysetPagination()
+        fields = requested_fields(request.GET, ProductSerializer)
+        queryset = filter_products(Product.objects.all(), request.GET, fields, paginator.ordering)
+        page = await paginator.apaginate_queryset(queryset, request)
+        data = ProductSerializer(page, many=True, fields=fields).data
+        return renderer.render(paginator.get_paginated_data(data))
+
+    variant = f'{request.get_host()}?{request.GET.urlencode()}'
+    body = await catalog_cache.aget_or_render(version, variant, render)
+    return HttpResponse(body, content_type='application/json', headers={'ETag': etag})
+
+
+@require_GET
+@async_api_view(authenticated=True)
+async def cart_items(request):
+    """Async counterpart of ``get_cart_items``."""
+    async def build():
+        lines = [line async for line in cart_lines(request.user)]
+        return CartItemSerializer(lines, many=True).data
+
+    return json_response(await cart_cache.aget_or_build(request.user.pk, 'items', build))
+
+
+@require_GET
+@async_api_view(authenticated=True)
+async def user_detail(request):
+    """Async counterpart of ``UserDetailView``."""
+    return json_response(UserSerializer(request.user).data)
+
+
+def sse_event(event, data):
+    return f'event: {event}\ndata: {json.dumps(data, separators=(",", ":"))}\n\n'
+
+
+async def order_event_stream(channel, user_id=None):
+    """
+    Server-Sent Events: a ``snapshot`` of the active orders, then one
+    ``status`` event per change, with keepalive comments in between.
+
+    The subscription is opened before the snapshot is read so no change can
+    fall between the two. Clients that reconnect simply get a new snapshot.
+    """
+    subscription = get_broker().subscribe(channel)
+    heartbeat = event_settings()['HEARTBEAT']
+    try:
+        yield 'retry: 3000\n\n'
+        yield sse_event('snapshot', [order async for order in active_orders(user_id)])
+        while True:
+            try:
+                message = await asyncio.wait_for(subscription.get(), heartbeat)
+            except asyncio.TimeoutError:
+                yield ': keepalive\n\n'
+                continue
+            yield sse_event('status', message)
+    finally:
+        subscription.close()
+
+
+def sse_response(stream):
+    response = StreamingHttpResponse(stream, content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'  # stop nginx from buffering the stream
+    return response
+
+
+def require_asgi(view):
+    """
+    501 outside ASGI: a WSGI worker would collect the endless event stream
+    into a list (``async_to_sync``) before sending anything, and hang.
+    """
+    @wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        if not isinstance(request, ASGIRequest):
+            return json_response({'detail': 'Event streams are only served under ASGI.'}, status.HTTP_501_NOT_IMPLEMENTED)
+        return await view(request, *args, **kwargs)
+    return wrapper
+
+
+@require_GET
+@require_asgi
+@async_api_view(authenticated=True)
+async def order_events(request):
+    """Status changes of the logged-in user's orders, pushed as they happen (ASGI only)."""
+    return sse_response(order_event_stream(user_channel(request.user.pk), request.user.pk))
+
+
+@require_GET
+@require_asgi
+@async_api_view(authenticated=True)
+async def kitchen_events(request):
+    """Every order's status changes, for the kitchen dashboard (staff only, ASGI only)."""
+    if not request.user.is_staff:
+        raise PermissionDenied()
+    return sse_response(order_event_stream(KITCHEN_CHANNEL))
@@ -0,0 +1,167 @@
+import threading
+import time
+
+from django.conf import settings
+from django.utils.functional import cached_property
+from django.utils.translation import gettext_lazy as _
+from rest_framework.settings import api_settings as drf_settings
+from rest_framework_simplejwt.authentication import JWTStatelessUserAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.models import TokenUser
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from .blacklist import CachedBlacklistMixin
+from .models import User
+
+USER_CLAIMS = ('email', 'username')
+
+
+class ClaimsRefreshToken(CachedBlacklistMixin, RefreshToken):
+    """
+    Refresh token that also carries the user fields the API renders, and
+    checks the blacklist through the in-memory index in ``api.blacklist``.
+    """
+
+    @classmethod
+    def for_user(cls, user):
+        token = super().for_user(user)
+        for claim in USER_CLAIMS:
+            token[claim] = getattr(user, claim)
+        return token
+
+
+class ClaimsUser(TokenUser):
+    """
+    Token-backed user exposing the claims added by ``ClaimsRefreshToken``.
+    ``is_staff`` comes from ``user_status`` rather than the token, which
+    refresh rotation would carry past a demotion for as long as the user
+    keeps refreshing.
+    """
+
+    def __init__(self, token, is_staff):
+        super().__init__(token)
+        self.is_staff = is_staff
+
+    @cached_property
+    def email(self):
+        return self.token.get('email', '')
+
+
+class UserStatusCache:
+    """
+    Process-local cache of ``User.is_active`` and ``User.is_staff`` with a
+    short TTL.
+
+    Stateless authentication never loads the user row, so this is what keeps
+    a deactivated, deleted or demoted account from using its outstanding
+    tokens for longer than ``ttl`` seconds. One indexed primary-key lookup
+    per user per TTL replaces one full row fetch per request.
+    """
+
+    def __init__(self, ttl=None):
+        self._ttl = ttl
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    @property
+    def ttl(self):
+        if self._ttl is not None:
+            return self._ttl
+        return getattr(settings, 'STATELESS_AUTH_STATUS_TTL', 30)
+
+    def status(self, user_id):
+        """``(is_active, is_staff)`` of the user; a deleted user is neither."""
+        status = self._cached(user_id)
+        if status is None:
+            status = self._store(user_id, self._flags(user_id).first())
+        return status
+
+    async def astatus(self, user_id):
+        status = self._cached(user_id)
+        if status is None:
+            status = self._store(user_id, await self._flags(user_id).afirst())
+        return status
+
+    def _flags(self, user_id):
+        return User.objects.filter(pk=user_id).values_list('is_active', 'is_staff')
+
+    def _cached(self, user_id):
+        entry = self._entries.get(user_id)
+        if entry is not None and entry[1] > time.monotonic():
+            return entry[0]
+        return None
+
+    def _store(self, user_id, status):
+        status = status or (False, False)
+        with self._lock:
+            self._entries[user_id] = (status, time.monotonic() + self.ttl)
+        return status
+
+    def forget(self, user_id):
+        with self._lock:
+            self._entries.pop(user_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+user_status = UserStatusCache()
+
+
+class ClaimsJWTAuthentication(JWTStatelessUserAuthentication):
+    """
+    JWT authentication that builds the user from signed claims instead of
+    loading the ``User`` row on every request.
+
+    Opt in by listing it in ``REST_FRAMEWORK['DEFAULT_AUTHENTICATION_CLASSES']``.
+    Tokens issued before ``ClaimsRefreshToken`` was used lack the claims and
+    are rejected, so clients simply log in again.
+    """
+
+    def get_user(self, validated_token):
+        self.check_claims(validated_token)
+        return self.claims_user(validated_token, user_status.status(validated_token[api_settings.USER_ID_CLAIM]))
+
+    async def aget_user(self, validated_token):
+        self.check_claims(validated_token)
+        return self.claims_user(validated_token, await user_status.astatus(validated_token[api_settings.USER_ID_CLAIM]))
+
+    def claims_user(self, validated_token, status):
+        is_active, is_staff = status
+        if not is_active:
+            raise AuthenticationFailed(_('User is inactive'), code='user_inactive')
+        return ClaimsUser(validated_token, is_staff)
+
+    def check_claims(self, validated_token):
+        if any(claim not in validated_token for claim in (api_settings.USER_ID_CLAIM, *USER_CLAIMS)):
+            raise InvalidToken(_('Token contained no recognizable user identification'))
+
+
+async def aauthenticate(request):
+    """
+    Authenticate a plain Django request in an async view.
+
+    Uses the first class in ``DEFAULT_AUTHENTICATION_CLASSES`` for header
+    parsing and token validation (pure CPU), then resolves the user with the
+    async ORM. Returns None when no credentials were sent.
+    """
+    authenticator = drf_settings.DEFAULT_AUTHENTICATION_CLASSES[0]()
+    header = authenticator.get_header(request)
+    if header is None:
+        return None
+    raw_token = authenticator.get_raw_token(header)
+    if raw_token is None:
+        return None
+    validated_token = authenticator.get_validated_token(raw_token)
+
+    if isinstance(authenticator, ClaimsJWTAuthentication):
+        return await authenticator.aget_user(validated_token)
+    try:
+        user = await User.objects.aget(pk=validated_token[api_settings.USER_ID_CLAIM])
+    except (KeyError, User.DoesNotExist):
+        raise AuthenticationFailed(_('User not found'), code='user_not_found')
+    if not user.is_active:
+        raise AuthenticationFailed(_('User is inactive'), code='user_inactive')
+    return user
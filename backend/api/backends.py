@@ -1,9 +1,10 @@
-from django.contrib.auth.backends import BaseBackend
+from django.contrib.auth.backends import BaseBackend, ModelBackend
 from django.contrib.auth import get_user_model
+from django.db.models.functions import Lower
+from .hashing import make_password, verify_password
 import logging
 
-# Set up logging configuration
-logger = logging.getLogger(__name__)
+logger = logging.getLogger('api.auth')
 
 User = get_user_model()
 
@@ -12,15 +13,57 @@ class EmailBackend(BaseBackend):
         try:
             # Find the user by email
             user = User.objects.get(email=email)
-            logger.info(f"User found: {user.email}")
+            logger.debug('User %s found', user.pk)
             
             # Check if the password matches
             if user.check_password(password):
-                logger.info("Password matches")
+                logger.debug('Password matches for user %s', user.pk)
                 return user
             else:
-                logger.warning("Password does not match")
+                logger.warning('Password does not match for user %s', user.pk)
                 return None
         except User.DoesNotExist:
-            logger.error(f"User with email {email} does not exist")
+            logger.warning('No user with that email', extra={'email': email})
             return None
+
+
+class PooledHashBackend(ModelBackend):
+    """
+    ``ModelBackend`` that verifies passwords on the bounded hash pool and
+    transparently re-hashes them with the preferred hasher (the first entry in
+    ``PASSWORD_HASHERS``) after a successful login.
+    """
+
+    def authenticate(self, request, username=None, password=None, **kwargs):
+        if username is None:
+            username = kwargs.get(User.USERNAME_FIELD)
+        if not isinstance(username, str) or not isinstance(password, str):
+            return None  # missing, or JSON such as {"email": 1}
+        try:
+            user = self.get_user_by_email(username)
+        except User.DoesNotExist:
+            # Hash anyway so unknown and known emails take the same time (#20760).
+            make_password(password)
+            return None
+
+        is_correct, must_update = verify_password(password, user.password)
+        if not is_correct or not self.user_can_authenticate(user):
+            return None
+        if must_update:
+            user.password = make_password(password)
+            user.save(update_fields=['password'])
+        return user
+
+    def get_user_by_email(self, email):
+        """
+        Exact match first (unique index), then a case-insensitive one served by
+        ``user_email_lower_idx``. Ambiguous case-insensitive matches are refused.
+        """
+        try:
+            return User._default_manager.get_by_natural_key(email)
+        except User.DoesNotExist:
+            matches = list(User._default_manager.alias(email_lower=Lower('email')).filter(email_lower=email.lower())[:2])
+            if len(matches) != 1:
+                raise
+            return matches[0]
+
@@ -0,0 +1,729 @@
+"""
+Micro-benchmarks for the API, run with ``python manage.py benchmark``.
+
+Each scenario is a function registered with ``@scenario`` that receives the
+command options and returns a list of ``Result`` rows. Scenarios run against
+a throwaway test database, so they may create whatever data they need;
+``seeded()`` fills it with the ``api.seed`` dataset at ``--scale``.
+
+Results can be saved as a baseline (``--save-baseline``) and later runs
+compared against it (``--compare``): see ``compare()`` for the rules. A
+row may also carry a latency target (``target ms``, for its p50) that every
+run is checked against, baseline or not: see ``missed_targets()``.
+"""
+import asyncio
+import statistics
+import threading
+import time
+import tracemalloc
+from dataclasses import dataclass, field
+from unittest import mock
+
+from asgiref.sync import sync_to_async
+from django.db import connection, connections
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+SCENARIOS = {}
+
+
+def scenario(name):
+    def register(func):
+        SCENARIOS[name] = func
+        return func
+    return register
+
+
+@dataclass
+class Result:
+    name: str
+    latencies: list = field(repr=False)
+    queries: int = 0
+    errors: int = 0
+    wall: float = None
+    allocations: float = None  # mean peak bytes allocated per request
+    target: float = None  # p50 budget in seconds
+
+    @property
+    def requests(self):
+        return len(self.latencies)
+
+    @property
+    def per_second(self):
+        elapsed = self.wall if self.wall is not None else sum(self.latencies)
+        return self.requests / elapsed if elapsed else 0.0
+
+    @property
+    def queries_per_request(self):
+        return self.queries / self.requests if self.requests else 0.0
+
+    def percentile(self, pct):
+        ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))] if ordered else 0.0
+
+    def row(self):
+        row = {
+            'name': self.name,
+            'requests': self.requests,
+            'req/s': round(self.per_second, 1),
+            'p50 ms': round(self.percentile(50) * 1000, 3),
+            'p99 ms': round(self.percentile(99) * 1000, 3),
+            'mean ms': round(statistics.fmean(self.latencies) * 1000, 3) if self.latencies else 0.0,
+            'queries/req': round(self.queries_per_request, 2),
+            'errors': self.errors,
+        }
+        if self.allocations is not None:
+            row['alloc KiB'] = round(self.allocations / 1024, 1)
+        if self.target is not None:
+            row['target ms'] = round(self.target * 1000, 3)
+        return row
+
+
+def failed(response):
+    return getattr(response, 'status_code', 200) >= 500
+
+
+def measure(name, call, requests, before=None, target=None):
+    """
+    Time ``call()`` ``requests`` times, counting the SQL it issues and 5xx
+    responses, then measure its allocations in a separate, shorter pass (so
+    tracing does not inflate the latencies). ``before()`` runs untimed ahead
+    of every call, e.g. to clear a cache; ``target`` is the p50 budget in
+    seconds.
+    """
+    before = before or (lambda: None)
+    before()
+    call()  # warm up caches, imports and connections
+    latencies, errors = [], 0
+    with CaptureQueriesContext(connection) as queries:
+        for _ in range(requests):
+            before()
+            start = time.perf_counter()
+            errors += failed(call())
+            latencies.append(time.perf_counter() - start)
+    return Result(
+        name, latencies, len(queries), errors, allocations=measure_allocations(call, before, min(20, requests)), target=target,
+    )
+
+
+def measure_allocations(call, before, samples=20):
+    """Mean peak memory allocated by one ``call()``, via ``tracemalloc``."""
+    peaks = []
+    tracemalloc.start()
+    try:
+        for _ in range(samples):
+            before()
+            tracemalloc.reset_peak()
+            baseline = tracemalloc.get_traced_memory()[0]
+            call()
+            peaks.append(tracemalloc.get_traced_memory()[1] - baseline)
+    finally:
+        tracemalloc.stop()
+    return statistics.fmean(peaks)
+
+
+def measure_concurrent(name, call, requests, concurrency):
+    """Run ``call()`` ``requests`` times spread over ``concurrency`` threads."""
+    latencies, errors = [], []
+    lock = threading.Lock()
+
+    def worker(count):
+        try:
+            for _ in range(count):
+                start = time.perf_counter()
+                try:
+                    error = failed(call())
+                except Exception:
+                    error = True
+                elapsed = time.perf_counter() - start
+                with lock:
+                    latencies.append(elapsed)
+                    errors.append(error)
+        finally:
+            connections.close_all()
+
+    share, extra = divmod(requests, concurrency)
+    threads = [threading.Thread(target=worker, args=(share + (i < extra),)) for i in range(concurrency)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall = time.perf_counter() - start
+    # Throughput under concurrency is requests over wall time, not summed latency.
+    return Result(name, latencies, errors=sum(errors), wall=wall)
+
+
+def measure_async(name, acall, requests, concurrency):
+    """Run the coroutine function ``acall()`` ``requests`` times, ``concurrency`` at a time."""
+    latencies, errors = [], []
+
+    async def one(slots):
+        async with slots:
+            start = time.perf_counter()
+            response = await acall()
+            latencies.append(time.perf_counter() - start)
+            errors.append(failed(response))
+
+    async def main():
+        await acall()  # warm up
+        slots = asyncio.Semaphore(concurrency)
+        start = time.perf_counter()
+        await asyncio.gather(*(one(slots) for _ in range(requests)))
+        wall = time.perf_counter() - start
+        # Sync code ran in asgiref's shared executor thread; close its connections
+        # there, or they stay open (and e.g. block SQLite journal_mode changes).
+        await sync_to_async(connections.close_all)()
+        return wall
+
+    wall = asyncio.run(main())
+    return Result(name, latencies, errors=sum(errors), wall=wall)
+
+
+COMPARED = {
+    # metric: (tolerance mode, absolute slack); p99 is reported but too noisy to gate on
+    'p50 ms': ('relative', 0.05),
+    'alloc KiB': ('relative', 1.0),
+    'queries/req': ('exact', 0.01),
+    'errors': ('exact', 0),
+}
+
+
+def compare(rows, baseline, threshold):
+    """
+    Compare result rows against a saved baseline; return the regressions.
+
+    Latency and allocation metrics regress when they exceed the baseline by
+    more than ``threshold`` (a fraction, plus a small absolute slack so
+    sub-millisecond noise does not fail a run). Queries per request are
+    deterministic, so any increase is a regression, as are errors in a row
+    that had none (rows that shed load, like ``login``, vary run to run).
+    Rows without a baseline are skipped.
+    """
+    regressions = []
+    for row in rows:
+        before = baseline.get(row['name'])
+        if before is None:
+            continue
+        for metric, (mode, slack) in COMPARED.items():
+            if metric not in row or metric not in before:
+                continue
+            if metric == 'errors' and before[metric]:
+                continue
+            limit = before[metric] * (1 + threshold) + slack if mode == 'relative' else before[metric] + slack
+            if row[metric] > limit:
+                regressions.append((row['name'], metric, before[metric], row[metric]))
+    return regressions
+
+
+def missed_targets(rows):
+    """``(name, target, p50)`` of the rows whose p50 is over their ``target ms``."""
+    return [
+        (row['name'], row['target ms'], row['p50 ms'])
+        for row in rows if 'target ms' in row and row['p50 ms'] > row['target ms']
+    ]
+
+
+_seeded = {}
+
+
+def seeded(options):
+    """Seed the ``api.seed`` dataset at ``--scale`` (once per run) and return the row counts."""
+    from .seed import scaled_volumes, seed_database
+
+    if not _seeded:
+        _seeded.update(seed_database(**scaled_volumes(options.get('scale', 1.0))))
+    return _seeded
+
+
+def cold_caches():
+    from django.core.cache import cache
+
+    from .catalog import catalog_cache
+
+    cache.clear()
+    catalog_cache.clear()
+
+
+def seeded_customer():
+    """A seeded user with a non-trivial cart, and an API client logged in as them."""
+    from django.db.models import Count
+
+    from .authentication import ClaimsRefreshToken
+    from .models import User
+
+    user = User.objects.annotate(lines=Count('cartitem')).filter(lines__gt=0).order_by('-lines', 'id').first()
+    client = APIClient()
+    client.credentials(HTTP_AUTHORIZATION=f'Bearer {ClaimsRefreshToken.for_user(user).access_token}')
+    return user, client
+
+
+@scenario('catalog')
+def catalog_listing(options):
+    """GET /api/products/ over the seeded catalog: cached, cold, deep cursor and filtered."""
+    from .models import Product
+    from .pagination import KeysetPagination
+
+    seeded(options)
+    client = APIClient()
+    url = reverse('product-list')
+    products = Product.objects.order_by('created_at', 'id')
+    deep = products[int(products.count() * 0.8)]
+    cursor = KeysetPagination().encode_cursor([deep.created_at, deep.id])
+
+    runs = (
+        ('products page 1 (cached)', {}, None),
+        ('products page 1 (cold)', {}, cold_caches),
+        ('products deep page (cold)', {'cursor': cursor}, cold_caches),
+        ('products filtered (cold)', {'available': 'true', 'min_price': '100', 'fields': 'id,name,price'}, cold_caches),
+    )
+    return [
+        measure(label, lambda params=params: client.get(url, params), options['requests'], before)
+        for label, params, before in runs
+    ]
+
+
+SEARCH_TARGET = 0.010  # seconds per request, search as you type
+
+
+@scenario('search')
+def catalog_search(options):
+    """
+    Search and autocomplete over the seeded catalog (``--scale 50`` indexes
+    ~100k items). Each request should stay within ``SEARCH_TARGET`` at that
+    scale.
+    """
+    seeded(options)
+    client = APIClient()
+    runs = (
+        ('search common word', 'search', {'q': 'adobo'}),
+        ('search two words', 'search', {'q': 'crispy tamarind', 'available': 'true'}),
+        ('search typo', 'search', {'q': 'tamarnid'}),
+        ('suggest prefix', 'search-suggest', {'q': 'si'}),
+        ('suggest typo', 'search-suggest', {'q': 'adbo'}),
+    )
+    return [
+        measure(label, lambda url=reverse(name), params=params: client.get(url, params), options['requests'], target=SEARCH_TARGET)
+        for label, name, params in runs
+    ]
+
+
+@scenario('import')
+def catalog_import_export(options):
+    """
+    Catalog CSV import (an upsert of the same file, after the first run) and
+    streaming export of 20k items per ``--scale``; ``p50 ms`` is per file.
+    """
+    import io
+
+    from .catalog_io import export_catalog, import_catalog
+
+    rows = int(20000 * options.get('scale', 1.0))
+    data = ('sku,type,name,description,price,available\n' + ''.join(
+        f'BENCH-{i},product,Dish {i},Savory garlic rice with tamarind,{i % 500}.25,true\n' for i in range(rows)
+    )).encode()
+    repeats = max(3, options['requests'] // 100)
+    return [
+        measure(f'import {rows} rows csv', lambda: import_catalog(io.BytesIO(data)), repeats),
+        measure(f'export {rows} rows csv', lambda: sum(map(len, export_catalog('csv'))), repeats),
+        measure(f'export {rows} rows jsonl', lambda: sum(map(len, export_catalog('jsonl'))), repeats),
+    ]
+
+
+@scenario('compression')
+def rendering_and_compression(options):
+    """
+    JSON rendering and response compression of a 5k-product catalog: the
+    whole catalog rendered with the stdlib and orjson encoders, gzipped per
+    request and from the compressed-body cache, and a 200-product page end
+    to end with and without ``Accept-Encoding: gzip``.
+    """
+    from decimal import Decimal
+
+    from django.http import HttpResponse
+    from django.test import RequestFactory, override_settings
+
+    from .compression import compress_response
+    from .models import Product
+    from .renderers import JSONRenderer
+    from .serializers import ProductSerializer
+
+    Product.objects.bulk_create(
+        Product(name=f'Dish {i}', description='Savory garlic rice with tamarind and crispy pork belly',
+                price=Decimal(f'{i % 500}.25'), available=i % 7 != 0)
+        for i in range(5000)
+    )
+    data = ProductSerializer(Product.objects.order_by('pk'), many=True).data
+    renderer = JSONRenderer()
+    body = renderer.render(data)
+    request = RequestFactory().get('/api/products/', HTTP_ACCEPT_ENCODING='gzip, deflate, br')
+
+    def compressed(etag):
+        return compress_response(request, HttpResponse(body, content_type='application/json', headers=etag))
+
+    client = APIClient()
+    url = reverse('product-list')
+    page = {'page_size': 200}
+    requests = max(10, options['requests'] // 10)
+    with override_settings(API_JSON_ENCODER='json'):
+        stdlib = measure('render 5k products (json)', lambda: renderer.render(data), requests)
+    return [
+        stdlib,
+        measure('render 5k products (orjson)', lambda: renderer.render(data), requests),
+        measure('gzip 5k products', lambda: compressed({}), requests),
+        measure('gzip 5k products (cached)', lambda: compressed({'ETag': '"bench"'}), requests),
+        measure('products 200 (cached, identity)', lambda: client.get(url, page), options['requests']),
+        measure('products 200 (cached, gzip)', lambda: client.get(url, page, HTTP_ACCEPT_ENCODING='gzip'), options['requests']),
+    ]
+
+
+@scenario('cart')
+def cart_read_write(options):
+    """Cart reads (cached and cold) and writes for a seeded customer."""
+    from .models import Product
+
+    seeded(options)
+    user, client = seeded_customer()
+    product_ids = list(Product.objects.order_by('id').values_list('id', flat=True)[:20])
+    batch = [{'product_id': product_id, 'quantity': 1} for product_id in product_ids[:5]]
+    n = iter(range(10 ** 9))
+
+    def add():
+        return client.post(reverse('cart-add'), {'product_id': product_ids[next(n) % len(product_ids)]}, format='json')
+
+    return [
+        measure('cart items (cached)', lambda: client.get(reverse('cart')), options['requests']),
+        measure('cart items (cold)', lambda: client.get(reverse('cart')), options['requests'], cold_caches),
+        measure('cart summary (cold)', lambda: client.get(reverse('cart-summary')), options['requests'], cold_caches),
+        measure('cart add', add, options['requests']),
+        measure('cart update x5', lambda: client.post(reverse('cart-update'), batch, format='json'), options['requests']),
+    ]
+
+
+@scenario('register')
+def registration(options):
+    """POST /api/register/ with fresh emails (dominated by password hashing by design)."""
+    client = APIClient()
+    url = reverse('register')
+    n = iter(range(10 ** 9))
+
+    def register():
+        i = next(n)
+        return client.post(url, {'email': f'new{i}@example.com', 'username': f'new{i}', 'password': 'bench-pass'}, format='json')
+
+    return [measure('register', register, max(10, options['requests'] // 10))]
+
+
+@scenario('auth')
+def auth_modes(options):
+    """Authenticated GET /api/user/ with DB-backed vs claims-backed JWT auth."""
+    from rest_framework_simplejwt.authentication import JWTAuthentication
+
+    from .authentication import ClaimsJWTAuthentication, ClaimsRefreshToken, user_status
+    from .models import User
+    from .views import UserDetailView
+
+    user = User.objects.create_user(email='bench@example.com', username='bench', password='bench-pass')
+    client = APIClient()
+    client.credentials(HTTP_AUTHORIZATION=f'Bearer {ClaimsRefreshToken.for_user(user).access_token}')
+    url = reverse('user-detail')
+
+    results = []
+    for label, auth_class in (('jwt (db user)', JWTAuthentication), ('jwt (claims)', ClaimsJWTAuthentication)):
+        user_status.clear()
+        with mock.patch.object(UserDetailView, 'authentication_classes', [auth_class]):
+            results.append(measure(f'user-detail {label}', lambda: client.get(url), options['requests']))
+    return results
+
+
+@scenario('login')
+def login_hashers(options):
+    """
+    Concurrent POST /api/login/ for each password hasher; reports p50/p99.
+
+    Requests that find the hash pool saturated come back as 503 and are
+    counted under ``errors`` rather than queueing indefinitely.
+    """
+    from django.contrib.auth.hashers import make_password
+    from django.test import override_settings
+
+    from .models import User
+
+    url = reverse('login')
+    requests = max(options['concurrency'], options['requests'] // 10)  # hashing is slow by design
+    results = []
+    for algorithm in ('pbkdf2_sha256', 'scrypt'):
+        email = f'{algorithm}@example.com'
+        User.objects.create(email=email, username=algorithm, password=make_password('bench-pass', hasher=algorithm))
+        body = {'email': email, 'password': 'bench-pass'}
+        # Keep the user's hasher preferred so the login does not upgrade it mid-run.
+        with override_settings(PASSWORD_HASHERS=[
+            f'django.contrib.auth.hashers.{name}'
+            for name in (('PBKDF2PasswordHasher', 'ScryptPasswordHasher') if algorithm == 'pbkdf2_sha256'
+                         else ('ScryptPasswordHasher', 'PBKDF2PasswordHasher'))
+        ]):
+            results.append(measure_concurrent(
+                f"login {algorithm} x{options['concurrency']}",
+                lambda: APIClient().post(url, body, format='json'),
+                requests, options['concurrency'],
+            ))
+    return results
+
+
+@scenario('throttling')
+def throttle_overhead(options):
+    """
+    Cost of a throttle check, per algorithm and store, outside any view.
+
+    Each call checks 1000 distinct client addresses, so ``p50 ms`` reads as
+    microseconds per check.
+    """
+    from django.core.cache import cache
+    from django.test import RequestFactory, override_settings
+
+    from .throttling import CacheStore, LocalStore, SlidingWindowThrottle, TokenBucketThrottle
+
+    requests = [RequestFactory().post('/', REMOTE_ADDR=f'10.0.{i // 250}.{i % 250}') for i in range(1000)]
+    results = []
+    for store in (LocalStore, CacheStore):
+        for throttle_class in (SlidingWindowThrottle, TokenBucketThrottle):
+            throttle = type('BenchmarkThrottle', (throttle_class,), {'scope': 'benchmark'})()
+            store_path = f'{store.__module__}.{store.__name__}'
+            with override_settings(THROTTLING={'STORE': store_path, 'RATES': {'benchmark': '1000000/min'}}):
+                cache.clear()
+
+                def check():
+                    for request in requests:
+                        throttle.allow_request(request, None)
+
+                results.append(measure(
+                    f'throttle {throttle_class.algorithm.__name__} {store.__name__} (1000 checks)',
+                    check, max(10, options['requests'] // 10),
+                ))
+    return results
+
+
+@scenario('logging')
+def logging_overhead(options):
+    """
+    Logging cost on the request thread of the two records LoginView used to
+    write per login: as eager f-strings and as lazy ``%s`` records through a
+    synchronous handler, then queued for the listener thread (with and without
+    auth sampling). Every variant logs the same messages to a real file.
+    """
+    import logging
+    import queue
+    import tempfile
+    from logging.handlers import QueueListener
+
+    from .logs import DeferredQueueHandler, JSONFormatter, RedactFilter, SampleFilter
+
+    email, password_hash = 'jane.doe@example.com', 'pbkdf2_sha256$870000$salt$hash'
+    results = []
+    with tempfile.TemporaryDirectory() as directory:
+        def file_handler(name, formatter):
+            handler = logging.FileHandler(f'{directory}/{name}.log')
+            handler.setFormatter(formatter)
+            return handler
+
+        def isolated_logger(name, *handlers):
+            logger = logging.getLogger(f'benchmark.{name}')
+            logger.handlers, logger.propagate = list(handlers), False
+            logger.setLevel(logging.INFO)
+            return logger
+
+        sync = isolated_logger('sync', file_handler('sync', logging.Formatter('%(levelname)s %(name)s %(message)s')))
+
+        def eager():
+            sync.info(f'Attempting to authenticate user with email: {email}')
+            sync.info(f'User {email} authenticated successfully, password hash: {password_hash}')
+
+        def lazy(logger):
+            logger.info('Attempting to authenticate user with email: %s', email)
+            logger.info('User %s authenticated successfully, password hash: %s', email, password_hash)
+
+        results.append(measure('logging login sync f-strings', eager, options['requests']))
+        results.append(measure('logging login sync', lambda: lazy(sync), options['requests']))
+
+        for label, rate in (('queued', 1.0), ('queued sampled 10%', 0.1)):
+            records = queue.SimpleQueue()
+            handler = file_handler(label.replace(' ', '-'), JSONFormatter())
+            handler.addFilter(RedactFilter())
+            listener = QueueListener(records, handler)
+            logger = isolated_logger(label.replace(' ', '-'), DeferredQueueHandler(records))
+            logger.addFilter(SampleFilter(rate))
+            listener.start()
+            try:
+                results.append(measure(f'logging login {label}', lambda: lazy(logger), options['requests']))
+            finally:
+                listener.stop()
+                handler.close()
+        sync.handlers[0].close()
+    return results
+
+
+@dataclass
+class ASGIResponse:
+    status_code: int = 0
+    body: bytes = b''
+
+
+async def asgi_get(application, path, headers=()):
+    """
+    One GET through the ASGI ``application`` with raw scope/receive/send, as
+    an ASGI server (uvicorn, daphne) would issue it; returns an ``ASGIResponse``.
+    """
+    scope = {
+        'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'GET', 'scheme': 'http',
+        'path': path, 'raw_path': path.encode(), 'query_string': b'', 'root_path': '',
+        'headers': [(b'host', b'testserver'), *((name.lower().encode(), value.encode()) for name, value in headers)],
+        'client': ('127.0.0.1', 50000), 'server': ('testserver', 80),
+    }
+    response, done, requested = ASGIResponse(), asyncio.Event(), False
+
+    async def receive():
+        nonlocal requested
+        if not requested:
+            requested = True
+            return {'type': 'http.request', 'body': b'', 'more_body': False}
+        await done.wait()  # the client stays connected until the response is complete
+        return {'type': 'http.disconnect'}
+
+    async def send(message):
+        if message['type'] == 'http.response.start':
+            response.status_code = message['status']
+        elif message['type'] == 'http.response.body':
+            response.body += message.get('body', b'')
+            if not message.get('more_body'):
+                done.set()
+
+    await application(scope, receive, send)
+    done.set()
+    return response
+
+
+@scenario('asgi')
+def asgi_sync_vs_async(options):
+    """
+    Sync DRF views vs the async views in ``api.async_views``, both driven
+    through ``backend.asgi.application`` (the callable an ASGI server such as
+    uvicorn or daphne runs) with raw ASGI messages, ``--concurrency`` requests
+    in flight on one event loop. No sockets or HTTP parsing are involved;
+    everything from the handler on runs as under a server, including the
+    request signals that recycle database connections (``CONN_MAX_AGE``).
+
+    "cold" product runs clear the catalog cache before every request so the
+    database path is measured rather than the cache.
+    """
+    from decimal import Decimal
+
+    from django.core.cache import cache
+
+    from backend.asgi import application
+
+    from .authentication import ClaimsRefreshToken
+    from .catalog import catalog_cache
+    from .models import CartItem, Product, User
+
+    user = User.objects.create_user(email='asgi@example.com', username='asgi', password='bench-pass')
+    products = Product.objects.bulk_create(
+        Product(name=f'Dish {i}', description='Lorem ipsum ' * 40, price=Decimal('99.50')) for i in range(500)
+    )
+    CartItem.objects.bulk_create(CartItem(user=user, product=product, quantity=2) for product in products[:20])
+    auth = [('Authorization', f'Bearer {ClaimsRefreshToken.for_user(user).access_token}')]
+
+    def cold():
+        cache.clear()
+        catalog_cache.clear()
+
+    runs = (
+        ('products', 'product-list', 'async-product-list', [], None),
+        ('products cold', 'product-list', 'async-product-list', [], cold),
+        ('cart', 'cart', 'async-cart', auth, None),
+        ('user', 'user-detail', 'async-user-detail', auth, None),
+    )
+    results = []
+    for label, sync_name, async_name, headers, before in runs:
+        for mode, name in (('sync', sync_name), ('async', async_name)):
+            path = reverse(name)
+
+            async def call(path=path, headers=headers, before=before):
+                if before:
+                    before()
+                return await asgi_get(application, path, headers)
+
+            results.append(measure_async(
+                f"{label} {mode} x{options['concurrency']}", call, options['requests'], options['concurrency'],
+            ))
+    return results
+
+
+@scenario('writes')
+def concurrent_cart_writes(options):
+    """
+    Concurrent POST /api/cart/add/ under each database profile.
+
+    On SQLite the profiles differ in journal mode, fsync policy and
+    connection reuse; on PostgreSQL (DB_ENGINE=postgres) the configured
+    profile is measured as-is.
+    """
+    from decimal import Decimal
+
+    from django.db import connections
+    from django.test import override_settings
+
+    from .authentication import ClaimsRefreshToken
+    from .models import Product, User
+
+    products = Product.objects.bulk_create(Product(name=f'Dish {i}', price=Decimal('5.00')) for i in range(50))
+    users = [
+        User.objects.create_user(email=f'writer{i}@example.com', username=f'writer{i}', password='bench-pass')
+        for i in range(options['concurrency'])
+    ]
+    tokens = [f'Bearer {ClaimsRefreshToken.for_user(user).access_token}' for user in users]
+    url = reverse('cart-add')
+    local = threading.local()
+
+    def call():
+        # Each thread is one customer tapping "add" on random dishes.
+        if not hasattr(local, 'client'):
+            local.client = APIClient()
+            local.client.credentials(HTTP_AUTHORIZATION=tokens[threading.get_ident() % len(tokens)])
+            local.n = 0
+        local.n += 1
+        return local.client.post(url, {'product_id': products[local.n % len(products)].id}, format='json')
+
+    if connection.vendor != 'sqlite':
+        profiles = ((f'{connection.vendor} (configured)', None, None),)
+    else:
+        # journal_mode is a property of the database file, so it is switched once
+        # up front rather than by every connecting thread.
+        profiles = (
+            ('sqlite rollback journal, per-request conn', {'journal_mode': 'DELETE', 'synchronous': 'FULL', 'busy_timeout': 20000}, 0),
+            ('sqlite WAL + NORMAL, per-request conn', {'journal_mode': 'WAL', 'synchronous': 'NORMAL', 'busy_timeout': 20000}, 0),
+            ('sqlite WAL + NORMAL, persistent conn', {'journal_mode': 'WAL', 'synchronous': 'NORMAL', 'busy_timeout': 20000}, 60),
+        )
+
+    results = []
+    settings_dict = connections.settings['default']
+    original_max_age = settings_dict['CONN_MAX_AGE']
+    for label, pragmas, max_age in profiles:
+        connections.close_all()
+        if pragmas:
+            pragmas = dict(pragmas)
+            with connection.cursor() as cursor:
+                cursor.execute(f"PRAGMA journal_mode = {pragmas.pop('journal_mode')}")
+            connection.close()
+        try:
+            if max_age is not None:
+                settings_dict['CONN_MAX_AGE'] = max_age
+            with override_settings(**({'SQLITE_PRAGMAS': pragmas} if pragmas is not None else {})):
+                local = threading.local()
+                results.append(measure_concurrent(
+                    f"{label} x{options['concurrency']}", call, options['requests'], options['concurrency'],
+                ))
+        finally:
+            settings_dict['CONN_MAX_AGE'] = original_max_age
+    connections.close_all()
+    return results
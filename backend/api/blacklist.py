@@ -0,0 +1,131 @@
+import threading
+import time
+
+from django.conf import settings
+from django.utils import timezone
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+
+from . import metrics
+
+
+class BlacklistIndex:
+    """
+    In-memory index of blacklisted refresh-token JTIs, kept in front of the
+    ``BlacklistedToken`` table.
+
+    The index is built from the table on first use, updated immediately when
+    this process blacklists a token, and picks up other workers' writes with
+    an incremental ``id > last_seen`` query at most once per
+    ``TOKEN_BLACKLIST_SYNC_INTERVAL`` seconds, instead of a join on every check.
+    Entries are dropped once their token has expired, since expired tokens
+    are rejected on their ``exp`` claim anyway.
+    """
+
+    def __init__(self):
+        self._expiry = {}
+        self._last_id = None
+        self._synced_at = 0.0
+        self._lock = threading.Lock()
+        self.size = metrics.gauge('token_blacklist_index_size', 'JTIs held in the in-memory blacklist index.')
+        self.checks = metrics.counter('token_blacklist_checks_total', 'Refresh-token blacklist checks.')
+        self.syncs = metrics.counter('token_blacklist_syncs_total', 'Incremental blacklist index refreshes from the database.')
+        self.latency = metrics.histogram('token_blacklist_check_seconds', 'Latency of refresh-token blacklist checks.')
+
+    @property
+    def sync_interval(self):
+        return getattr(settings, 'TOKEN_BLACKLIST_SYNC_INTERVAL', 5)
+
+    def __contains__(self, jti):
+        start = time.perf_counter()
+        self.sync()
+        found = jti in self._expiry
+        self.checks.inc()
+        self.latency.observe(time.perf_counter() - start)
+        return found
+
+    def add(self, jti, expires_at):
+        with self._lock:
+            self._expiry[jti] = expires_at
+            self.size.set(len(self._expiry))
+
+    def sync(self, force=False):
+        if not force and time.monotonic() - self._synced_at < self.sync_interval:
+            return
+        with self._lock:
+            now = timezone.now()
+            rows = BlacklistedToken.objects.filter(token__expires_at__gt=now)
+            if self._last_id is not None:
+                rows = rows.filter(id__gt=self._last_id)
+            for row_id, jti, expires_at in rows.order_by('id').values_list('id', 'token__jti', 'token__expires_at'):
+                self._expiry[jti] = expires_at
+                self._last_id = row_id
+            if self._last_id is None:
+                self._last_id = 0
+            for jti in [jti for jti, expires_at in self._expiry.items() if expires_at <= now]:
+                del self._expiry[jti]
+            self._synced_at = time.monotonic()
+            self.size.set(len(self._expiry))
+        self.syncs.inc()
+
+    def reset(self):
+        with self._lock:
+            self._expiry.clear()
+            self._last_id = None
+            self._synced_at = 0.0
+
+
+blacklist_index = BlacklistIndex()
+
+
+class CachedBlacklistMixin:
+    """
+    Replaces simplejwt's per-check ``BlacklistedToken`` query with a lookup in
+    ``blacklist_index``. Blacklisting still goes to the database, and it is
+    authoritative: a token that was already blacklisted elsewhere cannot be
+    rotated or logged out a second time while this worker's index catches up.
+    """
+
+    def check_blacklist(self):
+        if self.payload[api_settings.JTI_CLAIM] in blacklist_index:
+            raise TokenError(_('Token is blacklisted'))
+
+    def blacklist(self):
+        blacklisted, created = super().blacklist()
+        blacklist_index.add(blacklisted.token.jti, blacklisted.token.expires_at)
+        if not created:
+            raise TokenError(_('Token is blacklisted'))
+        return blacklisted, created
+
+
+def token_table_sizes():
+    """Row counts of the token tables, published as gauges."""
+    sizes = {
+        'outstanding': OutstandingToken.objects.count(),
+        'blacklisted': BlacklistedToken.objects.count(),
+    }
+    for table, size in sizes.items():
+        metrics.gauge(f'token_{table}_rows', f'Rows in the {table} token table.').set(size)
+    return sizes
+
+
+def prune_expired_tokens(batch_size=1000, now=None):
+    """
+    Delete expired outstanding tokens (and their blacklist rows) in batches.
+
+    Each batch is a bounded id list, so the table is never locked for long
+    and memory stays flat however much has accumulated. Returns rows removed.
+    """
+    now = now or timezone.now()
+    removed = 0
+    while True:
+        ids = list(
+            OutstandingToken.objects.filter(expires_at__lte=now).order_by('id').values_list('id', flat=True)[:batch_size]
+        )
+        if not ids:
+            return removed
+        BlacklistedToken.objects.filter(token_id__in=ids).delete()
+        OutstandingToken.objects.filter(id__in=ids).only('id').delete()
+        removed += len(ids)
@@ -0,0 +1,196 @@
+import time
+from collections import Counter
+from decimal import Decimal
+
+from django.core import checks
+from django.core.cache import DEFAULT_CACHE_ALIAS, cache, caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import transaction
+from django.db.models import Case, DecimalField, ExpressionWrapper, F, Sum, Value, When, Window
+from django.db.models.functions import Greatest
+
+from . import metrics
+from .catalog import acatalog_version, catalog_version
+from .models import CartItem, Product
+
+
+class UnknownProducts(Exception):
+    def __init__(self, product_ids):
+        super().__init__(f"Unknown products: {', '.join(map(str, sorted(product_ids)))}")
+        self.product_ids = product_ids
+
+
+LINE_TOTAL = ExpressionWrapper(
+    F('quantity') * F('product__price'),
+    output_field=DecimalField(max_digits=12, decimal_places=2),
+)
+
+
+def cart_lines(user):
+    """
+    The user's cart rows with the product columns the cart renders, in one query.
+
+    ``select_related`` joins the product so serializing ``product.name`` etc.
+    does not cost a query per line, and ``only()`` keeps the long product
+    description out of the SELECT.
+    """
+    return (
+        CartItem.objects.filter(user_id=user.pk)
+        .select_related('product')
+        .only('id', 'quantity', 'product__id', 'product__name', 'product__price', 'product__image_url')
+        .annotate(line_total=LINE_TOTAL)
+        .order_by('added_at', 'id')
+    )
+
+
+def cart_summary(user):
+    """
+    Return ``(lines, item_count, total)`` for the user's cart.
+
+    Totals are window aggregates over the same SELECT as the lines, so the
+    whole summary is a single query regardless of cart size.
+    """
+    lines = list(
+        cart_lines(user).annotate(
+            cart_item_count=Window(Sum('quantity')),
+            cart_total=Window(Sum(LINE_TOTAL)),
+        )
+    )
+    if not lines:
+        return lines, 0, Decimal('0.00')
+    return lines, lines[0].cart_item_count, lines[0].cart_total
+
+
+def apply_cart_deltas(user, deltas):
+    """
+    Apply ``[(product_id, quantity_delta), ...]`` to the user's cart atomically.
+
+    Every statement is set-based, so the number of queries does not depend on
+    how many lines change:
+
+    1. one ``IN`` query validates all product ids,
+    2. one ``INSERT ... ON CONFLICT DO NOTHING`` creates missing lines at zero,
+    3. one ``UPDATE`` adds each delta in the database (``quantity = quantity + delta``),
+    4. one ``DELETE`` drops lines that reached zero.
+
+    Because increments happen in SQL rather than read-modify-write in Python,
+    concurrent requests for the same line can never lose an update. Inserting
+    at zero and then incrementing (rather than an upsert that overwrites
+    ``quantity``) is what keeps first-time adds race-free as well.
+    """
+    totals = Counter()
+    for product_id, delta in deltas:
+        totals[product_id] += delta
+    totals = {product_id: delta for product_id, delta in totals.items() if delta}
+    if not totals:
+        return
+
+    with transaction.atomic():
+        known = set(Product.objects.filter(id__in=totals).values_list('id', flat=True))
+        unknown = set(totals) - known
+        if unknown:
+            raise UnknownProducts(unknown)
+
+        lines = CartItem.objects.filter(user_id=user.pk, product_id__in=totals)
+        CartItem.objects.bulk_create(
+            [CartItem(user_id=user.pk, product_id=product_id, quantity=0) for product_id, delta in totals.items() if delta > 0],
+            ignore_conflicts=True,
+        )
+        increment = Case(
+            *(When(product_id=product_id, then=Value(delta)) for product_id, delta in totals.items()),
+            default=Value(0),
+        )
+        lines.update(quantity=Greatest(F('quantity') + increment, Value(0)))
+        lines.filter(quantity=0).delete()
+        transaction.on_commit(lambda: invalidate_cart(user.pk))
+
+
+def remove_cart_line(user, product_id):
+    """Delete one line from the user's cart; return False if it was not there."""
+    deleted, _ = CartItem.objects.filter(user_id=user.pk, product_id=product_id).delete()
+    if deleted:
+        transaction.on_commit(lambda: invalidate_cart(user.pk))
+    return bool(deleted)
+
+
+@checks.register(checks.Tags.caches, deploy=True)
+def check_cart_cache(app_configs, **kwargs):
+    if not isinstance(caches[DEFAULT_CACHE_ALIAS], (LocMemCache, DummyCache)):
+        return []
+    return [checks.Warning(
+        "Cart snapshots and revisions live in the per-process 'default' cache: with several workers, "
+        f'a cart changed through one worker is served stale by the others for up to {CartCache.timeout} s.',
+        hint="Point CACHES['default'] at a cache shared by every worker (Redis, Memcached or a FileBasedCache).",
+        id='api.W004',
+    )]
+
+
+def invalidate_cart(user_id):
+    """Bump the user's cart revision so cached snapshots are never served again."""
+    try:
+        cache.incr(f'cart:{user_id}:rev')
+    except ValueError:
+        cache.add(f'cart:{user_id}:rev', time.time_ns() // 1000, timeout=None)
+
+
+class CartCache:
+    """
+    Per-user snapshots of serialized cart responses.
+
+    Keys combine the user id, the user's cart revision (bumped by every cart
+    mutation) and the catalog version (so price or name changes show up), so
+    invalidation is a single counter increment and stale snapshots simply
+    expire. Repeated reads from the navbar badge and cart page hit no tables.
+    """
+    timeout = 300
+
+    def __init__(self):
+        self.hits = metrics.counter('cart_cache_hits_total', 'Cart reads served from a cached snapshot.')
+        self.misses = metrics.counter('cart_cache_misses_total', 'Cart reads that queried the database.')
+
+    def revision(self, user_id):
+        key = f'cart:{user_id}:rev'
+        revision = cache.get(key)
+        if revision is None:
+            cache.add(key, time.time_ns() // 1000, timeout=None)
+            revision = cache.get(key)
+        return revision
+
+    def get_or_build(self, user_id, kind, build):
+        key = f'cart:{user_id}:{self.revision(user_id)}:{catalog_version()}:{kind}'
+        data = cache.get(key)
+        if data is not None:
+            self.hits.inc()
+            return data
+        self.misses.inc()
+        data = build()
+        cache.set(key, data, timeout=self.timeout)
+        return data
+
+    async def aget_or_build(self, user_id, kind, abuild):
+        """Async counterpart of ``get_or_build`` taking a coroutine function."""
+        revision = await cache.aget(f'cart:{user_id}:rev')
+        if revision is None:
+            await cache.aadd(f'cart:{user_id}:rev', time.time_ns() // 1000, timeout=None)
+            revision = await cache.aget(f'cart:{user_id}:rev')
+        key = f'cart:{user_id}:{revision}:{await acatalog_version()}:{kind}'
+        data = await cache.aget(key)
+        if data is not None:
+            self.hits.inc()
+            return data
+        self.misses.inc()
+        data = await abuild()
+        await cache.aset(key, data, timeout=self.timeout)
+        return data
+
+    def stats(self):
+        hits, misses = self.hits.value, self.misses.value
+        return {
+            'hits': hits,
+            'misses': misses,
+            'hit_rate': hits / (hits + misses) if hits + misses else 0.0,
+        }
+
+
+cart_cache = CartCache()
@@ -0,0 +1,229 @@
+import asyncio
+import hashlib
+import threading
+import time
+import weakref
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+
+from . import metrics
+
+VERSION_KEY = 'catalog:version'
+
+DEFAULTS = {
+    'CACHE_ALIAS': 'default',  # shared cache; point at a cross-process backend in production
+    'LOCAL_MAX_ENTRIES': 256,  # per-worker LRU size
+    'TIMEOUT': 600,            # seconds rendered pages live in the shared cache
+    'LOCK_TIMEOUT': 10,        # seconds a recompute may hold the shared lock
+    'LOCK_WAIT': 2,            # seconds other workers wait for that recompute
+    'WARM_URLS': [],           # absolute URLs re-rendered by a background task after catalog changes
+}
+
+
+def cache_settings():
+    return {**DEFAULTS, **getattr(settings, 'CATALOG_CACHE', {})}
+
+
+def shared_cache():
+    return caches[cache_settings()['CACHE_ALIAS']]
+
+
+def cache_is_cross_process():
+    """Whether ``CACHE_ALIAS`` is seen by every process (not LocMem, which is per process, or Dummy)."""
+    return not isinstance(shared_cache(), (LocMemCache, DummyCache))
+
+
+def catalog_version():
+    """
+    Return the current catalog version.
+
+    The version lives in the shared cache and is bumped by the Product and
+    MenuItem signal handlers in ``api.signals``. If it has been evicted a new
+    one is seeded from the clock, so stale entries can never be matched again.
+    """
+    cache = shared_cache()
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        cache.add(VERSION_KEY, time.time_ns() // 1000, timeout=None)
+        version = cache.get(VERSION_KEY)
+    return str(version)
+
+
+async def acatalog_version():
+    """Async counterpart of ``catalog_version``."""
+    cache = shared_cache()
+    version = await cache.aget(VERSION_KEY)
+    if version is None:
+        await cache.aadd(VERSION_KEY, time.time_ns() // 1000, timeout=None)
+        version = await cache.aget(VERSION_KEY)
+    return str(version)
+
+
+def bump_catalog_version():
+    """Invalidate every cached catalog page. Call after writes that bypass model signals."""
+    cache = shared_cache()
+    try:
+        cache.incr(VERSION_KEY)
+    except ValueError:
+        cache.add(VERSION_KEY, time.time_ns() // 1000, timeout=None)
+
+
+def catalog_etag(version, *parts):
+    """Build a strong ETag from the catalog version and whatever shapes the response."""
+    digest = hashlib.sha1(version.encode())
+    for part in parts:
+        digest.update(b'\0' + str(part).encode())
+    return f'"{digest.hexdigest()}"'
+
+
+class CatalogCache:
+    """
+    Two-level cache of pre-rendered catalog responses.
+
+    Level one is a bounded LRU inside the worker, level two is the Django
+    cache named by ``CATALOG_CACHE['CACHE_ALIAS']``. Keys embed the catalog
+    version, so bumping the version invalidates both levels at once and old
+    entries simply age out. Concurrent misses for the same key are collapsed
+    into a single recompute (in-process lock plus a shared ``cache.add`` lock).
+    """
+
+    def __init__(self, max_entries=None):
+        self.max_entries = max_entries
+        self._local = OrderedDict()
+        self._lock = threading.Lock()
+        self._inflight = {}
+        self._async_inflight = weakref.WeakKeyDictionary()  # event loop -> {key: future}
+        self.hits = metrics.counter('catalog_cache_hits_total', 'Catalog pages served from the in-process LRU.')
+        self.shared_hits = metrics.counter('catalog_cache_shared_hits_total', 'Catalog pages served from the shared cache.')
+        self.misses = metrics.counter('catalog_cache_misses_total', 'Catalog pages rendered from the database.')
+        self.evictions = metrics.counter('catalog_cache_evictions_total', 'Catalog pages evicted from the in-process LRU.')
+
+    def get_or_render(self, version, variant, render):
+        """Return the cached bytes for ``variant`` at ``version``, calling ``render()`` on a miss."""
+        key = self.key(version, variant)
+
+        body = self._get_local(key)
+        if body is not None:
+            self.hits.inc()
+            return body
+
+        # Single flight: only one thread per process recomputes a given key.
+        with self._lock:
+            flight = self._inflight.setdefault(key, threading.Lock())
+        with flight:
+            try:
+                body = self._get_local(key)
+                if body is not None:
+                    self.hits.inc()
+                    return body
+                body = self._get_shared(key)
+                if body is not None:
+                    self.shared_hits.inc()
+                else:
+                    self.misses.inc()
+                    body = render()
+                    self._set_shared(key, body)
+                self._set_local(key, body)
+                return body
+            finally:
+                with self._lock:
+                    self._inflight.pop(key, None)
+
+    async def aget_or_render(self, version, variant, arender):
+        """
+        Async counterpart of ``get_or_render`` taking a coroutine function.
+
+        Concurrent misses on the same event loop await a single render; the
+        cross-process lock is skipped so the loop never sleeps on it.
+        """
+        key = self.key(version, variant)
+        body = self._get_local(key)
+        if body is not None:
+            self.hits.inc()
+            return body
+
+        loop = asyncio.get_running_loop()
+        inflight = self._async_inflight.setdefault(loop, {})
+        flight = inflight.get(key)
+        if flight is not None:
+            return await asyncio.shield(flight)
+        flight = inflight[key] = loop.create_future()
+        try:
+            body = await shared_cache().aget(key)
+            if body is not None:
+                self.shared_hits.inc()
+            else:
+                self.misses.inc()
+                body = await arender()
+                await shared_cache().aset(key, body, timeout=cache_settings()['TIMEOUT'])
+            self._set_local(key, body)
+            flight.set_result(body)
+            return body
+        except BaseException as e:
+            flight.set_exception(e)
+            flight.exception()  # mark retrieved so lone failures are not logged as unhandled
+            raise
+        finally:
+            del inflight[key]
+
+    def key(self, version, variant):
+        return f'catalog:{version}:{hashlib.sha1(variant.encode()).hexdigest()}'
+
+    def clear(self):
+        with self._lock:
+            self._local.clear()
+
+    def stats(self):
+        return {
+            'hits': self.hits.value,
+            'shared_hits': self.shared_hits.value,
+            'misses': self.misses.value,
+            'evictions': self.evictions.value,
+            'size': len(self._local),
+        }
+
+    def _get_local(self, key):
+        with self._lock:
+            body = self._local.get(key)
+            if body is not None:
+                self._local.move_to_end(key)
+            return body
+
+    def _set_local(self, key, body):
+        max_entries = self.max_entries or cache_settings()['LOCAL_MAX_ENTRIES']
+        with self._lock:
+            self._local[key] = body
+            self._local.move_to_end(key)
+            while len(self._local) > max_entries:
+                self._local.popitem(last=False)
+                self.evictions.inc()
+
+    def _get_shared(self, key):
+        cache = shared_cache()
+        body = cache.get(key)
+        if body is not None:
+            return body
+
+        # Another worker may already be rendering this page; give it a moment.
+        options = cache_settings()
+        if cache.add(f'{key}:lock', 1, timeout=options['LOCK_TIMEOUT']):
+            return None
+        deadline = time.monotonic() + options['LOCK_WAIT']
+        while time.monotonic() < deadline:
+            time.sleep(0.02)
+            body = cache.get(key)
+            if body is not None:
+                return body
+        return None
+
+    def _set_shared(self, key, body):
+        cache = shared_cache()
+        cache.set(key, body, timeout=cache_settings()['TIMEOUT'])
+        cache.delete(f'{key}:lock')
+
+
+catalog_cache = CatalogCache()
@@ -0,0 +1,247 @@
+"""
+Bulk catalog import and export as CSV or JSON Lines.
+
+Both directions stream. An import is a pipeline of generators (parse ->
+validate -> batch), and each batch is written with one upsert keyed on
+``sku``, so memory stays flat however large the
+file is. An export iterates the table with ``.iterator(chunk_size=...)``
+and yields encoded lines as they are produced.
+
+Rows have the columns of ``COLUMNS``. ``type`` is ``product`` (the
+default) or ``menu_item``; ``available`` defaults to true. A row whose SKU
+already exists updates that item (its type too), other rows create one. Invalid rows are
+skipped and reported with their line number; the valid ones are still
+imported.
+
+Upserts bypass model signals, so each batch refreshes its search entries
+with one INSERT ... SELECT and the catalog version is bumped once at the
+end.
+"""
+import csv
+import json
+import re
+from dataclasses import dataclass, field
+from decimal import Decimal, InvalidOperation
+from itertools import islice
+
+from django.db import connections, router, transaction
+from django.utils import timezone
+
+from .catalog import bump_catalog_version
+from .jobs import schedule_catalog_warmup
+from .models import Product
+from .search import index_queryset
+
+COLUMNS = ('sku', 'type', 'name', 'description', 'price', 'available')
+IMPORTED = ('kind', 'sku', 'name', 'description', 'price', 'available')  # model fields set from a row
+FORMATS = ('csv', 'jsonl')
+KINDS = tuple(Product.Kind.values)
+BOOLEANS = {'true': True, '1': True, 'yes': True, 'false': False, '0': False, 'no': False, '': True}
+MAX_REPORTED_ERRORS = 100
+UNDECODABLE = re.compile('[\udc80-\udcff]')  # bytes that were not UTF-8, kept by ``surrogateescape``
+BOM = b'\xef\xbb\xbf'
+
+
+class InvalidRow(Exception):
+    pass
+
+
+@dataclass
+class ImportReport:
+    imported: int = 0
+    invalid: int = 0
+    errors: list = field(default_factory=list)  # the first MAX_REPORTED_ERRORS as (line, message)
+
+    def reject(self, line, message):
+        self.invalid += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append((line, message))
+
+
+def format_of(name, default='csv'):
+    """The import/export format implied by a file name (``.csv``, ``.jsonl``/``.ndjson``)."""
+    extension = name.rsplit('.', 1)[-1].lower() if '.' in name else ''
+    return {'csv': 'csv', 'jsonl': 'jsonl', 'ndjson': 'jsonl'}.get(extension, default)
+
+
+def decoded_lines(stream):
+    """
+    The lines of a binary ``stream`` as text. Bytes that are not UTF-8 are
+    kept as lone surrogates (``surrogateescape``) rather than ending the
+    import mid-file; ``clean_row`` rejects the rows that contain them.
+    """
+    for number, line in enumerate(stream):
+        if number == 0 and line.startswith(BOM):
+            line = line[len(BOM):]
+        yield line.decode('utf-8', 'surrogateescape')
+
+
+def parse_rows(stream, fmt):
+    """
+    Yield ``(line number, raw dict)`` from a binary ``stream`` of CSV or JSON
+    Lines. A line that cannot be parsed (malformed CSV, not a JSON object)
+    yields an ``InvalidRow`` instead, and parsing goes on with the next one.
+    """
+    lines = decoded_lines(stream)
+    if fmt == 'csv':
+        # Count lines as the reader takes them: its own ``line_num`` lags on some errors.
+        consumed = 0
+
+        def counted():
+            nonlocal consumed
+            for consumed, line in enumerate(lines, 1):
+                yield line
+
+        reader = csv.DictReader(counted())
+        while True:
+            try:
+                row = next(reader)
+            except StopIteration:
+                return
+            except csv.Error as e:
+                row = InvalidRow(f'Malformed CSV: {e}')
+            yield consumed, row
+    for line, raw in enumerate(lines, 1):
+        if not raw.strip():
+            continue
+        try:
+            row = json.loads(raw)
+        except ValueError as e:
+            row = InvalidRow(f'Invalid JSON: {e}')
+        else:
+            if not isinstance(row, dict):
+                row = InvalidRow('Expected a JSON object')
+        yield line, row
+
+
+def clean_row(row):
+    """Validate and normalize one raw row; raise ``InvalidRow``."""
+    if isinstance(row, InvalidRow):
+        raise row
+    value = {key: ('' if row.get(key) is None else str(row[key]).strip()) for key in COLUMNS}
+    if any(UNDECODABLE.search(text) for text in value.values()):
+        raise InvalidRow('Not valid UTF-8')
+    if not value['sku'] or len(value['sku']) > 64:
+        raise InvalidRow('sku is required (at most 64 characters)')
+    if not value['name'] or len(value['name']) > 100:
+        raise InvalidRow('name is required (at most 100 characters)')
+    kind = value['type'] or Product.Kind.PRODUCT
+    if kind not in KINDS:
+        raise InvalidRow(f"type must be one of {', '.join(KINDS)}")
+    try:
+        price = Decimal(value['price'])
+    except InvalidOperation:
+        raise InvalidRow('price must be a number')
+    if not price.is_finite() or price < 0 or price != price.quantize(Decimal('0.01')) or price >= 10 ** 8:
+        raise InvalidRow('price must be between 0 and 99999999.99 with at most two decimals')
+    available = BOOLEANS.get(value['available'].lower())
+    if available is None:
+        raise InvalidRow('available must be true or false')
+    return {
+        'kind': kind, 'sku': value['sku'], 'name': value['name'], 'description': value['description'],
+        'price': price, 'available': available,
+    }
+
+
+def valid_rows(rows, report):
+    for line, row in rows:
+        try:
+            yield clean_row(row)
+        except InvalidRow as e:
+            report.reject(line, str(e))
+
+
+def batched(iterable, size):
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
+def upsert_batch(rows):
+    """Insert or update one batch (one upsert) and refresh its search entries."""
+    rows_by_sku = {row['sku']: row for row in rows}  # a SKU repeated within the batch: the last row wins
+    with transaction.atomic():
+        upsert(Product, rows_by_sku.values())
+        index_queryset(Product.objects.filter(sku__in=list(rows_by_sku)))
+    return len(rows_by_sku)
+
+
+def upsert(model, rows):
+    """
+    ``INSERT ... ON CONFLICT (sku) DO UPDATE`` the ``IMPORTED`` columns of
+    ``rows`` with ``executemany``. Other columns get their defaults on insert
+    (auto timestamps: now) and are left alone on update, except ``auto_now``
+    ones. This is ``bulk_create(update_conflicts=True)`` without compiling
+    SQL per row, which is most of the ORM's cost at this volume.
+    """
+    db = connections[router.db_for_write(model)]  # resolved once: the ``connection`` proxy costs a lookup per use
+    fields = [field for field in model._meta.concrete_fields if not field.primary_key]
+    imported = [field for field in fields if field.name in IMPORTED]
+    now = timezone.now()
+    defaults, updated = [], [field.column for field in imported if field.name != 'sku']
+    for field in fields:
+        if field.name in IMPORTED:
+            continue
+        auto = getattr(field, 'auto_now', False) or getattr(field, 'auto_now_add', False)
+        defaults.append(field.get_db_prep_save(now if auto else field.get_default(), db))
+        if getattr(field, 'auto_now', False):
+            updated.append(field.column)
+
+    quote = db.ops.quote_name
+    columns = [field.column for field in imported] + [field.column for field in fields if field.name not in IMPORTED]
+    sql = (
+        f"INSERT INTO {quote(model._meta.db_table)} ({', '.join(map(quote, columns))}) "
+        f"VALUES ({', '.join(['%s'] * len(columns))}) "
+        f"ON CONFLICT ({quote('sku')}) DO UPDATE SET {', '.join(f'{quote(c)} = excluded.{quote(c)}' for c in updated)}"
+    )
+    params = [[field.get_db_prep_save(row[field.name], db) for field in imported] + defaults for row in rows]
+    with db.cursor() as cursor:
+        cursor.executemany(sql, params)
+
+
+def import_catalog(stream, fmt='csv', batch_size=2000):
+    """Import a binary ``stream`` of catalog rows; return an ``ImportReport``."""
+    if fmt not in FORMATS:
+        raise ValueError(f'Unknown format {fmt!r}')
+    report = ImportReport()
+    try:
+        for batch in batched(valid_rows(parse_rows(stream, fmt), report), batch_size):
+            report.imported += upsert_batch(batch)
+    finally:
+        # Batches commit as they go: publish them even if a later one fails.
+        if report.imported:
+            bump_catalog_version()
+            schedule_catalog_warmup()
+    return report
+
+
+def export_rows(kinds=None, chunk_size=2000):
+    """Yield every catalog item as a dict of ``COLUMNS``, streaming from the database."""
+    rows = Product.objects.order_by('pk').values_list('sku', 'kind', 'name', 'description', 'price', 'available')
+    if kinds:
+        rows = rows.filter(kind__in=kinds)
+    for sku, kind, name, description, price, available in rows.iterator(chunk_size=chunk_size):
+        yield {
+            'sku': sku or '', 'type': kind, 'name': name, 'description': description or '',
+            'price': price, 'available': available,
+        }
+
+
+class Echo:
+    """File-like object whose ``write`` returns the value, so ``csv.writer`` rows can be yielded."""
+
+    def write(self, value):
+        return value
+
+
+def export_catalog(fmt='csv', kinds=None, chunk_size=2000):
+    """Yield the catalog as encoded CSV or JSON Lines, ``chunk_size`` rows per chunk."""
+    if fmt == 'csv':
+        writer = csv.writer(Echo())
+        yield writer.writerow(COLUMNS).encode()
+    for rows in batched(export_rows(kinds, chunk_size), chunk_size):
+        if fmt == 'csv':
+            lines = (writer.writerow([row[column] for column in COLUMNS[:-1]] + [str(row['available']).lower()]) for row in rows)
+        else:
+            lines = (json.dumps({**row, 'price': str(row['price'])}, ensure_ascii=False) + '\n' for row in rows)
+        yield ''.join(lines).encode()
@@ -0,0 +1,197 @@
+"""
+Negotiated response compression.
+
+``compression_middleware`` compresses response bodies with the best coding
+the client accepts (``Accept-Encoding``, q-values honoured) out of
+``RESPONSE_COMPRESSION['ENCODINGS']``: Brotli when the ``brotli`` package is
+installed, then gzip. A response is left alone when it is smaller than
+``MIN_SIZE``, already encoded, marked ``no-transform``, not a 200, or of a
+type outside ``CONTENT_TYPES``. HTML is not in the default list: admin and
+browsable-API pages embed CSRF tokens next to reflected input, which is what
+BREACH-style attacks need. Synchronous streaming responses (catalog
+exports) are gzipped chunk by chunk.
+
+Responses that opt in with an ETag and ``Cache-Control: public`` (the
+catalog, which serves the same bytes to every client until the version
+changes) have their compressed bodies kept in a per-worker LRU keyed by
+URL, ETag, content type and coding, so a hot page is compressed once per
+worker instead of once per request. Other responses, which may be
+per-user, are compressed every time. Compressed responses get a weak ETag (RFC 9110 8.8.1), which
+``api.views.etag_matches`` accepts for ``If-None-Match``.
+"""
+import gzip
+import re
+import threading
+from asyncio import iscoroutinefunction
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core import checks
+from django.utils.cache import patch_vary_headers
+from django.utils.decorators import sync_and_async_middleware
+from django.utils.text import compress_sequence
+
+from . import metrics
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+DEFAULTS = {
+    'ENCODINGS': ['br', 'gzip'],  # preference order; 'br' needs the brotli package
+    'MIN_SIZE': 1024,             # bytes; smaller bodies are sent as they are
+    'GZIP_LEVEL': 6,
+    'BROTLI_QUALITY': 5,          # 0-11; above ~6 costs far more CPU than it saves bytes
+    'CONTENT_TYPES': [
+        'application/json', 'application/jsonl', 'application/x-ndjson', 'application/javascript',
+        'application/xml', 'image/svg+xml', 'text/csv', 'text/plain', 'text/css', 'text/javascript',
+    ],
+    'CACHE_ENTRIES': 256,         # compressed bodies of public ETagged responses kept per worker (0 to disable)
+}
+
+ACCEPT_ENCODING = re.compile(r'\s*([\w*-]+)\s*(?:;\s*q\s*=\s*([0-9.]+))?\s*')
+PRIVATE_DIRECTIVES = {'private', 'no-store'}
+
+
+def compression_settings():
+    return {**DEFAULTS, **getattr(settings, 'RESPONSE_COMPRESSION', {})}
+
+
+def available_encodings(options):
+    return [coding for coding in options['ENCODINGS'] if coding == 'gzip' or (coding == 'br' and brotli is not None)]
+
+
+@checks.register(checks.Tags.compatibility)
+def check_encodings(app_configs, **kwargs):
+    options = compression_settings()
+    missing = [coding for coding in options['ENCODINGS'] if coding not in available_encodings(options)]
+    if not missing:
+        return []
+    return [checks.Warning(
+        f"RESPONSE_COMPRESSION['ENCODINGS'] lists {', '.join(missing)}, which this server cannot produce.",
+        hint="'br' needs the Brotli package (see requirements.txt); the other codings are still used.",
+        id='api.W001',
+    )]
+
+
+def negotiate(header, encodings):
+    """The first of ``encodings`` that ``header`` (an Accept-Encoding value) accepts, or None."""
+    accepted = {}
+    for part in header.split(','):
+        match = ACCEPT_ENCODING.fullmatch(part)
+        if not match:
+            continue
+        try:
+            accepted[match[1].lower()] = float(match[2]) if match[2] is not None else 1.0
+        except ValueError:
+            continue
+    for coding in encodings:
+        if accepted.get(coding, accepted.get('*', 0)) > 0:
+            return coding
+    return None
+
+
+def compress(body, coding, options):
+    if coding == 'br':
+        return brotli.compress(body, quality=options['BROTLI_QUALITY'])
+    return gzip.compress(body, compresslevel=options['GZIP_LEVEL'], mtime=0)
+
+
+class CompressedCache:
+    """Thread-safe LRU of compressed bodies."""
+
+    def __init__(self):
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = metrics.counter('compression_cache_hits_total', 'Compressed bodies served from the in-process LRU.')
+        self.misses = metrics.counter('compression_cache_misses_total', 'Cacheable responses compressed on the request path.')
+
+    def get_or_compress(self, key, body, coding, options):
+        with self._lock:
+            compressed = self._entries.get(key)
+            if compressed is not None:
+                self._entries.move_to_end(key)
+        if compressed is not None:
+            self.hits.inc()
+            return compressed
+        self.misses.inc()
+        compressed = compress(body, coding, options)
+        with self._lock:
+            self._entries[key] = compressed
+            while len(self._entries) > options['CACHE_ENTRIES']:
+                self._entries.popitem(last=False)
+        return compressed
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+compressed_cache = CompressedCache()
+
+
+@sync_and_async_middleware
+def compression_middleware(get_response):
+    if iscoroutinefunction(get_response):
+        async def middleware(request):
+            return compress_response(request, await get_response(request))
+    else:
+        def middleware(request):
+            return compress_response(request, get_response(request))
+    return middleware
+
+
+def compressible(response, options):
+    if response.status_code != 200 or response.has_header('Content-Encoding'):
+        return False
+    if 'no-transform' in response.get('Cache-Control', ''):
+        return False
+    content_type = response.get('Content-Type', '').split(';')[0].strip().lower()
+    return content_type in options['CONTENT_TYPES'] or content_type.endswith(('+json', '+xml'))
+
+
+def shared_representation(response):
+    """Whether the response declares itself identical for every client (``Cache-Control: public``)."""
+    directives = {part.split('=')[0].strip().lower() for part in response.get('Cache-Control', '').split(',')}
+    return 'public' in directives and not directives & PRIVATE_DIRECTIVES
+
+
+def compress_response(request, response):
+    options = compression_settings()
+    if not compressible(response, options):
+        return response
+    if not response.streaming and len(response.content) < options['MIN_SIZE']:
+        return response
+    patch_vary_headers(response, ('Accept-Encoding',))
+    accept_encoding, encodings = request.headers.get('Accept-Encoding', ''), available_encodings(options)
+    coding = negotiate(accept_encoding, encodings)
+    if coding is None:
+        return response
+
+    if response.streaming:
+        # Only gzip has a streaming compressor here; async iterators are sent as they are.
+        if response.is_async or negotiate(accept_encoding, [c for c in encodings if c == 'gzip']) is None:
+            return response
+        coding = 'gzip'
+        response.streaming_content = compress_sequence(response.streaming_content)
+        del response.headers['Content-Length']
+    else:
+        body = response.content
+        etag = response.get('ETag')
+        if etag and options['CACHE_ENTRIES'] and shared_representation(response):
+            key = (request.build_absolute_uri(), etag, response['Content-Type'], coding, len(body))
+            compressed = compressed_cache.get_or_compress(key, body, coding, options)
+        else:
+            compressed = compress(body, coding, options)
+        if len(compressed) >= len(body):
+            return response
+        response.content = compressed
+        response['Content-Length'] = str(len(compressed))
+
+    etag = response.get('ETag')
+    if etag and etag.startswith('"'):
+        response['ETag'] = 'W/' + etag
+    response['Content-Encoding'] = coding
+    metrics.counter('http_compressed_responses_total', 'Responses sent compressed, by coding.', labels={'encoding': coding}).inc()
+    return response
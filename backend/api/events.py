@@ -0,0 +1,143 @@
+"""
+Publish/subscribe for order status events.
+
+Order transitions publish to a broker; Server-Sent Events streams in
+``api.async_views`` subscribe to it. One publish fans out to every open
+stream, so connected clients cost nothing until something changes instead
+of each polling the database.
+
+The broker is chosen with ``ORDER_EVENTS['BROKER']``. ``LocalBroker`` fans
+out inside one process, which is enough for a single ASGI worker and for
+tests; with several workers, plug in a broker backed by a shared channel
+(e.g. Redis pub/sub or PostgreSQL LISTEN/NOTIFY) that implements the same
+interface.
+"""
+import asyncio
+import threading
+from functools import lru_cache
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+from . import metrics
+
+DEFAULTS = {
+    'BROKER': 'api.events.LocalBroker',
+    'QUEUE_SIZE': 100,  # events buffered per subscriber before the oldest is dropped
+    'HEARTBEAT': 15,    # seconds between SSE keepalive comments
+}
+
+KITCHEN_CHANNEL = 'orders:kitchen'
+
+
+def event_settings():
+    return {**DEFAULTS, **getattr(settings, 'ORDER_EVENTS', {})}
+
+
+def user_channel(user_id):
+    return f'orders:user:{user_id}'
+
+
+class Broker:
+    """Interface for event brokers."""
+
+    def publish(self, channel, message):
+        """Deliver ``message`` (a JSON-serializable dict) to every subscriber of ``channel``. Safe from any thread."""
+        raise NotImplementedError
+
+    def subscribe(self, *channels):
+        """Return a ``Subscription`` receiving messages published to any of ``channels``."""
+        raise NotImplementedError
+
+    def unsubscribe(self, subscription):
+        raise NotImplementedError
+
+
+class Subscription:
+    """
+    A subscriber's bounded inbox, read with ``await subscription.get()``.
+
+    Messages are handed over to the event loop that created the
+    subscription, so publishers may run in any thread. When a slow client
+    falls ``QUEUE_SIZE`` messages behind, the oldest are dropped.
+    """
+
+    def __init__(self, broker, channels, maxsize):
+        self.broker = broker
+        self.channels = channels
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(maxsize)
+
+    async def get(self):
+        return await self.queue.get()
+
+    def deliver(self, message):
+        self.loop.call_soon_threadsafe(self._put, message)
+
+    def close(self):
+        self.broker.unsubscribe(self)
+
+    def _put(self, message):
+        if self.queue.full():
+            self.queue.get_nowait()
+            self.broker.dropped.inc()
+        self.queue.put_nowait(message)
+
+
+class LocalBroker(Broker):
+    """In-process broker: fans messages out to subscriptions in this process."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscriptions = {}  # channel -> set of Subscription
+        self.published = metrics.counter('order_events_published_total', 'Order events published.')
+        self.dropped = metrics.counter('order_events_dropped_total', 'Order events dropped for slow subscribers.')
+        self.subscribers = metrics.gauge('order_events_subscribers', 'Open order event subscriptions.')
+
+    def publish(self, channel, message):
+        self.published.inc()
+        with self._lock:
+            subscriptions = list(self._subscriptions.get(channel, ()))
+        for subscription in subscriptions:
+            try:
+                subscription.deliver(message)
+            except RuntimeError:  # the subscriber's event loop is gone
+                subscription.close()
+
+    def subscribe(self, *channels):
+        subscription = Subscription(self, channels, event_settings()['QUEUE_SIZE'])
+        with self._lock:
+            for channel in channels:
+                self._subscriptions.setdefault(channel, set()).add(subscription)
+            self.subscribers.set(self._count())
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            for channel in subscription.channels:
+                subscribers = self._subscriptions.get(channel)
+                if subscribers is not None:
+                    subscribers.discard(subscription)
+                    if not subscribers:
+                        del self._subscriptions[channel]
+            self.subscribers.set(self._count())
+
+    def _count(self):
+        return len({subscription for subscribers in self._subscriptions.values() for subscription in subscribers})
+
+
+@lru_cache(maxsize=None)
+def _load_broker(path):
+    return import_string(path)()
+
+
+def get_broker():
+    return _load_broker(event_settings()['BROKER'])
+
+
+def publish_status_change(order_id, user_id, status, previous=None):
+    """Publish an order's new status to its customer and to the kitchen feed."""
+    message = {'id': order_id, 'user': user_id, 'status': status, 'previous': previous}
+    broker = get_broker()
+    broker.publish(user_channel(user_id), message)
+    broker.publish(KITCHEN_CHANNEL, message)
@@ -0,0 +1,88 @@
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth import hashers
+
+from . import metrics
+
+
+class HashingBusy(Exception):
+    """Raised when no hashing slot frees up within ``PASSWORD_HASHING['QUEUE_TIMEOUT']``."""
+
+
+class HashPool:
+    """
+    Bounded pool for password hashing.
+
+    Key derivation is deliberately CPU-heavy; during a login spike an
+    unbounded number of request threads hashing at once starves every other
+    endpoint. The pool caps concurrent hashes per process at ``MAX_WORKERS``
+    and makes callers that cannot get a slot within ``QUEUE_TIMEOUT`` seconds
+    fail fast with ``HashingBusy`` instead of piling up. Only pure functions
+    run on the pool; database work stays on the caller's thread.
+    """
+
+    def __init__(self):
+        self._executor = None
+        self._slots = None
+        self._lock = threading.Lock()
+        self.wait = metrics.histogram('password_hash_wait_seconds', 'Time spent waiting for a hashing slot.')
+        self.duration = metrics.histogram('password_hash_seconds', 'Time spent computing password hashes.')
+        self.rejected = metrics.counter('password_hash_rejected_total', 'Hash requests rejected because the pool was saturated.')
+
+    @property
+    def options(self):
+        return {'MAX_WORKERS': os.cpu_count() or 2, 'QUEUE_TIMEOUT': 2.0, **getattr(settings, 'PASSWORD_HASHING', {})}
+
+    def _ensure_started(self):
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    workers = self.options['MAX_WORKERS']
+                    self._slots = threading.BoundedSemaphore(workers)
+                    self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='hash')
+
+    def submit(self, func, *args):
+        """Schedule ``func(*args)`` on the pool and return its future."""
+        self._ensure_started()
+        start = time.perf_counter()
+        if not self._slots.acquire(timeout=self.options['QUEUE_TIMEOUT']):
+            self.rejected.inc()
+            raise HashingBusy('Too many concurrent password hashes')
+        self.wait.observe(time.perf_counter() - start)
+
+        def timed():
+            began = time.perf_counter()
+            try:
+                return func(*args)
+            finally:
+                self.duration.observe(time.perf_counter() - began)
+
+        future = self._executor.submit(timed)
+        future.add_done_callback(lambda _: self._slots.release())
+        return future
+
+    def run(self, func, *args):
+        return self.submit(func, *args).result()
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=True)
+            self._executor = None
+
+
+hash_pool = HashPool()
+
+
+def make_password(raw_password):
+    """``django.contrib.auth.hashers.make_password`` on the bounded hash pool."""
+    return hash_pool.run(hashers.make_password, raw_password)
+
+
+def verify_password(raw_password, encoded):
+    """Return ``(is_correct, must_update)`` computed on the bounded hash pool."""
+    return hash_pool.run(hashers.verify_password, raw_password, encoded)
@@ -0,0 +1,211 @@
+"""
+Product images: content-addressed originals and resized variants.
+
+``attach_image()`` stores an upload under a name derived from its SHA-256
+(``products/ab/ab12....jpg``), so a name always refers to the same bytes and
+can be cached forever, and re-uploading a file is free. It then queues
+``generate_image_variants`` (api/jobs.py), which renders every
+``PRODUCT_IMAGES['VARIANTS']`` width in every supported format, stores them
+content-addressed as well and records them in ``Product.image_variants``.
+Rendering needs Pillow; without it products keep serving their originals.
+
+Image bytes never pass through Django workers in production. The files are
+saved through the default storage, so with an object-storage backend
+``storage.url()`` points straight at the bucket or CDN (pre-signed, if the
+bucket is private). With local storage, ``serve_media`` answers with an
+``X-Accel-Redirect`` that makes the front server (e.g. nginx) send the
+file, with the Cache-Control headers set here.
+"""
+import hashlib
+import io
+import mimetypes
+import re
+
+from django.conf import settings
+from django.core import checks
+from django.core.files.base import ContentFile
+
+from .tasks import enqueue
+
+try:
+    from PIL import Image, ImageOps, features
+except ImportError:
+    Image = None
+
+DEFAULTS = {
+    'VARIANTS': {'thumb': 160, 'card': 480, 'detail': 1200},  # name -> width in pixels
+    'FORMATS': ['avif', 'webp'],        # variant formats, best first; AVIF is skipped if Pillow lacks it
+    'QUALITY': 80,
+    'MAX_UPLOAD_BYTES': 10 * 1024 * 1024,
+    'MAX_PIXELS': 40_000_000,           # refuse decompression bombs
+    'ACCEL_REDIRECT_HEADER': 'X-Accel-Redirect',
+    'ACCEL_REDIRECT_PREFIX': '/protected-media/',  # internal location aliased to MEDIA_ROOT
+    'MUTABLE_MAX_AGE': 300,             # Cache-Control for media that is not content-addressed
+}
+
+IMMUTABLE = 'public, max-age=31536000, immutable'
+HASHED_NAME = re.compile(r'products/[0-9a-f]{2}/[0-9a-f]{20}\.[a-z0-9]+')
+
+# Leading bytes of the formats accepted for upload.
+SIGNATURES = (
+    (b'\xff\xd8\xff', 0, 'jpg'),
+    (b'\x89PNG\r\n\x1a\n', 0, 'png'),
+    (b'GIF87a', 0, 'gif'),
+    (b'GIF89a', 0, 'gif'),
+    (b'WEBP', 8, 'webp'),
+    (b'ftypavif', 4, 'avif'),
+)
+
+CONTENT_TYPES = {'webp': 'image/webp', 'avif': 'image/avif'}
+
+
+class InvalidImage(Exception):
+    pass
+
+
+def image_settings():
+    return {**DEFAULTS, **getattr(settings, 'PRODUCT_IMAGES', {})}
+
+
+@checks.register(checks.Tags.compatibility)
+def check_pillow(app_configs, **kwargs):
+    if Image is not None or not image_settings()['VARIANTS']:
+        return []
+    return [checks.Warning(
+        "PRODUCT_IMAGES['VARIANTS'] is set, but Pillow is not installed to render them.",
+        hint='Install Pillow (see requirements.txt); until then products serve their original images.',
+        id='api.W003',
+    )]
+
+
+def image_storage():
+    from .models import Product
+
+    return Product._meta.get_field('image').storage
+
+
+def sniff_format(head):
+    """File extension for the image format ``head`` starts with, or None."""
+    for signature, offset, extension in SIGNATURES:
+        if head[offset:offset + len(signature)] == signature:
+            return extension
+    return None
+
+
+def hashed_name(data, extension):
+    digest = hashlib.sha256(data).hexdigest()
+    return f'products/{digest[:2]}/{digest[:20]}.{extension}'
+
+
+def save_content(data, extension):
+    """Store ``data`` under its content-addressed name (once) and return the name."""
+    name = hashed_name(data, extension)
+    if not image_storage().exists(name):
+        image_storage().save(name, ContentFile(data))
+    return name
+
+
+def read_upload(upload):
+    """
+    Return the bytes of an uploaded image and their file extension.
+
+    Raises ``InvalidImage`` if the file is too large or not a supported image.
+    """
+    limit = image_settings()['MAX_UPLOAD_BYTES']
+    if upload.size > limit:
+        raise InvalidImage(f'Images may be at most {limit // (1024 * 1024)} MB.')
+    upload.seek(0)
+    data = upload.read()
+    extension = sniff_format(data[:16])
+    if extension is None:
+        raise InvalidImage('Upload a JPEG, PNG, GIF, WebP or AVIF image.')
+    return data, extension
+
+
+def attach_image(product, upload):
+    """Store an uploaded file as ``product``'s image and queue its variants (see ``read_upload``)."""
+    product.image = save_content(*read_upload(upload))
+    product.image_variants = {}
+    product.save(update_fields=['image', 'image_variants', 'updated_at'])
+    enqueue('generate_image_variants', unique_key=f'image-variants:{product.pk}', product_id=product.pk)
+    return product.image.name
+
+
+def variant_formats():
+    """Configured variant formats this Pillow build can encode."""
+    supported = []
+    for fmt in image_settings()['FORMATS']:
+        try:
+            available = fmt != 'avif' or features.check_module('avif')  # ValueError before Pillow 11.2
+        except ValueError:
+            available = False
+        if available:
+            supported.append(fmt)
+    return supported
+
+
+def render_variants(name):
+    """
+    Render the variants of the stored original ``name``; return them as
+    ``{variant: {'width': w, 'height': h, <format>: <name>, ...}}``.
+
+    Images are never upscaled: variants wider than the original share one
+    rendering at the original size. Raises ``InvalidImage`` if Pillow is
+    missing or cannot decode the original.
+    """
+    if Image is None:
+        raise InvalidImage('Pillow is not installed; cannot render image variants.')
+    options = image_settings()
+    Image.MAX_IMAGE_PIXELS = options['MAX_PIXELS']
+    with image_storage().open(name) as f:
+        try:
+            original = ImageOps.exif_transpose(Image.open(f))
+            original.load()
+        except (Image.UnidentifiedImageError, Image.DecompressionBombError) as e:
+            raise InvalidImage(f'Cannot render {name}: {e}')
+    has_alpha = original.mode in ('RGBA', 'LA', 'PA') or 'transparency' in original.info
+    original = original.convert('RGBA' if has_alpha else 'RGB')
+
+    formats = variant_formats()
+    variants, rendered = {}, {}
+    for label, width in sorted(options['VARIANTS'].items(), key=lambda item: item[1]):
+        width = min(width, original.width)
+        if width not in rendered:
+            height = max(1, round(original.height * width / original.width))
+            resized = original.resize((width, height), Image.LANCZOS)
+            entry = {'width': width, 'height': height}
+            for fmt in formats:
+                buffer = io.BytesIO()
+                resized.save(buffer, format=fmt.upper(), quality=options['QUALITY'])
+                entry[fmt] = save_content(buffer.getvalue(), fmt)
+            rendered[width] = entry
+        variants[label] = rendered[width]
+    return variants
+
+
+def image_urls(product):
+    """
+    URLs for ``product``'s image, ready for ``<img srcset>``/``<picture>``,
+    or None if it has none. Variants are missing until they are rendered.
+    """
+    if not product.image:
+        return None
+    url = image_storage().url
+    variants = {
+        label: {key: (url(value) if key not in ('width', 'height') else value) for key, value in entry.items()}
+        for label, entry in product.image_variants.items()
+    }
+    srcset = {}
+    for fmt in image_settings()['FORMATS']:
+        widths = {entry['width']: entry[fmt] for entry in variants.values() if fmt in entry}
+        if widths:
+            srcset[fmt] = ', '.join(f'{widths[width]} {width}w' for width in sorted(widths))
+    return {'original': url(product.image.name), 'variants': variants, 'srcset': srcset}
+
+
+def media_headers(name):
+    """Content-Type and Cache-Control for a stored media file."""
+    extension = name.rsplit('.', 1)[-1].lower()
+    content_type = CONTENT_TYPES.get(extension) or mimetypes.guess_type(name)[0] or 'application/octet-stream'
+    cache_control = IMMUTABLE if HASHED_NAME.fullmatch(name) else f"public, max-age={image_settings()['MUTABLE_MAX_AGE']}"
+    return {'Content-Type': content_type, 'Cache-Control': cache_control}
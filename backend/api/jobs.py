@@ -0,0 +1,78 @@
+"""Background tasks run by ``manage.py run_worker`` (see api/tasks.py)."""
+import logging
+from functools import partial
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.core.mail import send_mail
+from django.http import QueryDict
+from django.utils import timezone
+
+from .blacklist import prune_expired_tokens
+from .catalog import bump_catalog_version, cache_is_cross_process, cache_settings, catalog_cache, catalog_version
+from .images import InvalidImage, render_variants
+from .models import Product, User
+from .tasks import enqueue, task
+
+logger = logging.getLogger(__name__)
+
+
+@task(max_attempts=5)
+def send_welcome_email(user_id):
+    user = User.objects.filter(pk=user_id).only('email', 'username').first()
+    if user is None:
+        return
+    send_mail(
+        'Welcome to Tasty Kitchen',
+        f'Hi {user.username or user.email}, thanks for signing up. Your first order is on us!',
+        settings.DEFAULT_FROM_EMAIL,
+        [user.email],
+    )
+
+
+@task()
+def warm_catalog():
+    """
+    Render the ``CATALOG_CACHE['WARM_URLS']`` pages into the shared catalog
+    cache, so the first customer after a catalog change does not pay for the
+    render. Pages are keyed as ``ProductListView`` keys them (host and query).
+    """
+    from .views import render_product_page
+
+    version = catalog_version()
+    for url in cache_settings()['WARM_URLS']:
+        parts = urlsplit(url)
+        params = QueryDict(parts.query)
+        catalog_cache.get_or_render(version, f'{parts.netloc}?{params.urlencode()}', partial(render_product_page, params, url))
+
+
+@task()
+def prune_tokens():
+    prune_expired_tokens()
+
+
+@task(max_attempts=3)
+def generate_image_variants(product_id):
+    """Render the resized variants of a product's image (see api/images.py)."""
+    product = Product.objects.filter(pk=product_id).only('image').first()
+    if product is None or not product.image:
+        return
+    name = product.image.name
+    try:
+        variants = render_variants(name)
+    except InvalidImage as e:
+        logger.warning('Skipping image variants of product #%s: %s', product_id, e)
+        return
+    # Only record them if the image was not replaced while they rendered.
+    if Product.objects.filter(pk=product_id, image=name).update(image_variants=variants, updated_at=timezone.now()):
+        bump_catalog_version()
+
+
+def schedule_catalog_warmup():
+    """
+    Queue a catalog warmup shortly; repeated calls before it runs are coalesced.
+    Only worth it when the catalog cache is shared: with a per-process cache
+    the worker would only warm its own memory.
+    """
+    if cache_settings()['WARM_URLS'] and cache_is_cross_process():
+        enqueue('warm_catalog', delay=2, unique_key='warm_catalog')
@@ -0,0 +1,142 @@
+"""
+Structured logging that keeps I/O off the request path.
+
+``settings.LOGGING_CONFIG`` points at ``configure()``, which applies
+``settings.LOGGING`` as usual and then moves the handlers of every configured
+logger behind a ``QueueHandler``. Logging a record on a request thread then
+only appends it to an in-memory queue; a ``QueueListener`` thread formats
+it, redacts it and writes it out.
+
+Because formatting happens on the listener thread, log with ``%``-style
+arguments (``logger.info('Order %s paid', order.id)``), never f-strings: a
+record that is filtered out or sampled away then costs no string building at
+all. Pass immutable values (ids, strings), since arguments are rendered
+after the call returns. Structured fields go in ``extra=`` and become keys
+of the JSON line.
+
+* ``JSONFormatter`` writes one JSON object per record.
+* ``RedactFilter`` (on handlers, so it runs on the listener thread) blanks
+  sensitive ``extra`` fields, masks e-mail addresses and scrubs password
+  hashes and JWTs from messages.
+* ``SampleFilter`` (on loggers, so it runs before the queue) keeps a
+  fraction of a high-volume logger's records below WARNING.
+"""
+import atexit
+import json
+import logging
+import logging.config
+import queue
+import random
+import re
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+
+# Attributes every LogRecord has; anything else came from ``extra=``.
+RECORD_ATTRIBUTES = frozenset(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime', 'taskName'}
+
+SENSITIVE_FIELDS = re.compile(r'password|passwd|secret|token|authorization|cookie|session|refresh|access', re.I)
+EMAIL = re.compile(r'\b([^\W_])[\w.+-]*@([\w-]+(?:\.[\w-]+)+)\b')
+SECRETS = re.compile(
+    r'\b(?:pbkdf2_sha256|argon2|bcrypt_sha256|scrypt|md5)\$\S+'  # Django password hashes
+    r'|\beyJ[\w-]+\.[\w-]+\.[\w-]*'                               # JWTs
+)
+REDACTED = '[redacted]'
+
+_listeners = []
+
+
+def mask_email(text):
+    """``jane.doe@example.com`` -> ``j***@example.com``."""
+    return EMAIL.sub(r'\1***@\2', text)
+
+
+def scrub(text):
+    return mask_email(SECRETS.sub(REDACTED, text))
+
+
+def extra_fields(record):
+    return {key: value for key, value in vars(record).items() if key not in RECORD_ATTRIBUTES}
+
+
+class JSONFormatter(logging.Formatter):
+    """One JSON object per line: time, level, logger, message, ``extra`` fields and the exception."""
+
+    def format(self, record):
+        document = {
+            'time': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        document.update(extra_fields(record))
+        if record.exc_info:
+            document['exception'] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            document['exception'] = record.exc_text
+        return json.dumps(document, default=str, ensure_ascii=False)
+
+
+class RedactFilter(logging.Filter):
+    """Blank sensitive ``extra`` fields and scrub e-mails, password hashes and JWTs from the message."""
+
+    def filter(self, record):
+        message = record.getMessage()
+        record.msg, record.args = scrub(message), None
+        for key, value in extra_fields(record).items():
+            if SENSITIVE_FIELDS.search(key):
+                setattr(record, key, REDACTED)
+            elif isinstance(value, str):
+                setattr(record, key, scrub(value))
+        return True
+
+
+class SampleFilter(logging.Filter):
+    """Keep ``rate`` of the records below ``level`` (WARNING); records at or above it always pass."""
+
+    def __init__(self, rate=1.0, level=logging.WARNING):
+        super().__init__()
+        self.rate = rate
+        self.level = level if isinstance(level, int) else logging.getLevelName(level)
+
+    def filter(self, record):
+        return record.levelno >= self.level or random.random() < self.rate
+
+
+def configure(config):
+    """``LOGGING_CONFIG`` entry point: ``dictConfig(config)``, then queue each configured logger's handlers."""
+    stop_listeners()
+    logging.config.dictConfig(config)
+    if not config.get('queue', True):
+        return
+    for name in ('root', *config.get('loggers', {})):
+        logger = logging.getLogger(None if name == 'root' else name)
+        handlers = [handler for handler in logger.handlers if not isinstance(handler, QueueHandler)]
+        if not handlers:
+            continue
+        records = queue.SimpleQueue()
+        for handler in handlers:
+            logger.removeHandler(handler)
+        logger.addHandler(DeferredQueueHandler(records))
+        listener = QueueListener(records, *handlers, respect_handler_level=True)
+        listener.start()
+        _listeners.append(listener)
+
+
+class DeferredQueueHandler(QueueHandler):
+    """
+    Enqueue records as they are. The stock ``prepare()`` formats the record
+    first so it can be pickled to another process; the listener here is a
+    thread in the same process, so formatting is left to it.
+    """
+
+    def prepare(self, record):
+        return record
+
+
+def stop_listeners():
+    """Flush and stop the listener threads (runs at exit)."""
+    while _listeners:
+        _listeners.pop().stop()
+
+
+atexit.register(stop_listeners)
@@ -0,0 +1,93 @@
+import json
+import platform
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import override_settings, setup_test_environment, teardown_test_environment
+
+from api.benchmarks import SCENARIOS, compare, missed_targets
+
+
+class Command(BaseCommand):
+    help = 'Run API micro-benchmarks against a throwaway test database.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('scenarios', nargs='*', help=f"Scenarios to run (default: all). Available: {', '.join(SCENARIOS)}")
+        parser.add_argument('--requests', type=int, default=500, help='Requests per measurement.')
+        parser.add_argument('--concurrency', type=int, default=8, help='Client threads for concurrent scenarios.')
+        parser.add_argument('--scale', type=float, default=1.0, help='Size of the seeded dataset (see manage.py seed).')
+        parser.add_argument('--save-baseline', metavar='PATH', help='Write the results to PATH as the new baseline.')
+        parser.add_argument('--compare', metavar='PATH', help='Fail if any result regresses against the baseline at PATH.')
+        parser.add_argument('--threshold', type=float, default=0.5, help='Allowed latency/allocation growth for --compare (0.5 = 50%%).')
+
+    def handle(self, *args, **options):
+        names = options['scenarios'] or list(SCENARIOS)
+        unknown = set(names) - set(SCENARIOS)
+        if unknown:
+            raise CommandError(f"Unknown scenarios: {', '.join(sorted(unknown))}")
+        baseline = self.load_baseline(options['compare']) if options['compare'] else None
+
+        setup_test_environment()
+        old_name = connection.settings_dict['NAME']
+        connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        rows = []
+        # The load scenarios would mostly measure 429s with the throttles on.
+        unthrottled = override_settings(THROTTLING={**getattr(settings, 'THROTTLING', {}), 'RATES': {}})
+        unthrottled.enable()
+        try:
+            for name in names:
+                self.stdout.write(self.style.MIGRATE_HEADING(name))
+                for result in SCENARIOS[name](options):
+                    rows.append(result.row())
+                    self.write_row(dict(rows[-1]))
+        finally:
+            unthrottled.disable()
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+
+        if options['save_baseline']:
+            self.save_baseline(options['save_baseline'], rows, options)
+        missed = missed_targets(rows)
+        for name, target, p50 in missed:
+            self.stderr.write(f'  {name}: p50 ms {p50} over the {target} ms target')
+        if baseline is not None:
+            self.check_regressions(rows, baseline, options['threshold'])
+        if missed:
+            raise CommandError(f'{len(missed)} result(s) over their latency target.')
+
+    def write_row(self, row):
+        name = row.pop('name')
+        metrics = '  '.join(f'{key}={value}' for key, value in row.items())
+        self.stdout.write(f'  {name:<40} {metrics}')
+
+    def load_baseline(self, path):
+        try:
+            return {row['name']: row for row in json.loads(Path(path).read_text())['results']}
+        except (OSError, ValueError, KeyError) as e:
+            raise CommandError(f'Cannot read baseline {path}: {e}')
+
+    def save_baseline(self, path, rows, options):
+        document = {
+            'environment': {
+                'python': platform.python_version(),
+                'machine': platform.machine(),
+                'database': connection.vendor,
+                'requests': options['requests'],
+                'concurrency': options['concurrency'],
+                'scale': options['scale'],
+            },
+            'results': rows,
+        }
+        Path(path).write_text(json.dumps(document, indent=2) + '\n')
+        self.stdout.write(f'Baseline written to {path}')
+
+    def check_regressions(self, rows, baseline, threshold):
+        regressions = compare(rows, baseline, threshold)
+        if not regressions:
+            self.stdout.write(self.style.SUCCESS(f'No regressions against the baseline (threshold {threshold:.0%}).'))
+            return
+        for name, metric, before, after in regressions:
+            self.stderr.write(f'  {name}: {metric} {before} -> {after}')
+        raise CommandError(f'{len(regressions)} regression(s) against the baseline.')
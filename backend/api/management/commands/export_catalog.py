@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from api.catalog_io import FORMATS, KINDS, export_catalog
+
+
+class Command(BaseCommand):
+    help = 'Write the catalog as CSV or JSON Lines (the import format), streaming from the database.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--format', choices=FORMATS, default='csv')
+        parser.add_argument('--type', choices=KINDS, help='Only products or only menu items.')
+        parser.add_argument('--output', '-o', help='File to write (default: standard output).')
+
+    def handle(self, *args, **options):
+        chunks = export_catalog(options['format'], [options['type']] if options['type'] else None)
+        if not options['output']:
+            for chunk in chunks:
+                self.stdout.write(chunk.decode(), ending='')
+            return
+        with open(options['output'], 'wb') as out:
+            for chunk in chunks:
+                out.write(chunk)
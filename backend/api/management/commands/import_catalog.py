@@ -0,0 +1,29 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api.catalog_io import FORMATS, format_of, import_catalog
+
+
+class Command(BaseCommand):
+    help = 'Upsert products and menu items by SKU from a CSV or JSON Lines file (see api/catalog_io.py).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="File to import, or '-' for standard input.")
+        parser.add_argument('--format', choices=FORMATS, help='Default: from the file extension, else csv.')
+        parser.add_argument('--batch-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        path = options['path']
+        fmt = options['format'] or format_of(path)
+        try:
+            stream = sys.stdin.buffer if path == '-' else open(path, 'rb')
+        except OSError as e:
+            raise CommandError(f'Cannot read {path}: {e}')
+        with stream:
+            report = import_catalog(stream, fmt, batch_size=options['batch_size'])
+        for line, message in report.errors:
+            self.stderr.write(f'  line {line}: {message}')
+        if report.invalid > len(report.errors):
+            self.stderr.write(f'  ... and {report.invalid - len(report.errors)} more')
+        self.stdout.write(f'Imported {report.imported} items, skipped {report.invalid} invalid rows.')
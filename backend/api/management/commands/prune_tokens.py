@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from api.blacklist import prune_expired_tokens, token_table_sizes
+
+
+class Command(BaseCommand):
+    help = 'Delete expired outstanding and blacklisted JWT refresh tokens in batches.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        removed = prune_expired_tokens(batch_size=options['batch_size'])
+        sizes = token_table_sizes()
+        self.stdout.write(
+            f"Removed {removed} expired tokens; "
+            f"{sizes['outstanding']} outstanding and {sizes['blacklisted']} blacklisted remain."
+        )
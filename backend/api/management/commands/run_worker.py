@@ -0,0 +1,21 @@
+import signal
+
+from django.core.management.base import BaseCommand
+
+from api.tasks import Worker, queue_settings
+
+
+class Command(BaseCommand):
+    help = 'Run queued background tasks (see api/tasks.py). Start several processes to scale out.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=None, help=f"Concurrent tasks (default: {queue_settings()['THREADS']}).")
+        parser.add_argument('--burst', action='store_true', help='Exit once no task is due instead of polling forever.')
+
+    def handle(self, *args, **options):
+        worker = Worker(threads=options['threads'])
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            signal.signal(signum, lambda *_: worker.stop())
+        self.stdout.write(f'Worker {worker.name} running {worker.threads} threads')
+        worker.run(burst=options['burst'])
+        self.stdout.write('Worker stopped')
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from api.seed import DEFAULT_VOLUMES, SEED_PASSWORD, scaled_volumes, seed_database
+
+
+class Command(BaseCommand):
+    help = 'Bulk-insert synthetic users, products, menu items, carts and orders for load testing.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scale', type=float, default=1.0, help='Multiply every default volume by this factor.')
+        for name, count in DEFAULT_VOLUMES.items():
+            parser.add_argument(f"--{name.replace('_', '-')}", type=int, dest=name, help=f'Rows to create (default: {count} x scale).')
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--seed', type=int, default=0, help='Random seed, for reproducible datasets.')
+
+    def handle(self, *args, **options):
+        volumes = scaled_volumes(options['scale'], **{name: options[name] for name in DEFAULT_VOLUMES})
+        created = seed_database(**volumes, batch_size=options['batch_size'], seed=options['seed'])
+        self.stdout.write(', '.join(f'{count} {name}' for name, count in created.items()))
+        self.stdout.write(f'Seeded users log in with password {SEED_PASSWORD!r}.')
@@ -0,0 +1,151 @@
+import threading
+
+
+class Counter:
+    """A monotonically increasing, thread-safe, process-local counter."""
+    type = 'counter'
+
+    def __init__(self, name, documentation='', labels=None):
+        self.name = name
+        self.documentation = documentation
+        self.labels = dict(labels or {})
+        self._value = 0
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self._lock:
+            self._value += amount
+
+    @property
+    def value(self):
+        return self._value
+
+    def reset(self):
+        with self._lock:
+            self._value = 0
+
+
+class Gauge:
+    """A value that can go up and down (table sizes, queue depths)."""
+    type = 'gauge'
+
+    def __init__(self, name, documentation='', labels=None):
+        self.name = name
+        self.documentation = documentation
+        self.labels = dict(labels or {})
+        self.value = 0
+
+    def set(self, value):
+        self.value = value
+
+
+class Histogram:
+    """Bucketed observations, e.g. latencies in seconds."""
+
+    type = 'histogram'
+    DEFAULT_BUCKETS = (0.0001, 0.0005, 0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+    def __init__(self, name, documentation='', buckets=DEFAULT_BUCKETS, labels=None):
+        self.name = name
+        self.documentation = documentation
+        self.labels = dict(labels or {})
+        self.buckets = tuple(buckets)
+        self.counts = [0] * len(self.buckets)
+        self.count = 0
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        with self._lock:
+            self.count += 1
+            self.sum += value
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    self.counts[i] += 1
+                    break
+
+    @property
+    def mean(self):
+        return self.sum / self.count if self.count else 0.0
+
+
+class Registry:
+    """
+    Named collection of metrics so each subsystem can register its own.
+
+    A metric is identified by its name plus its labels, so e.g. one latency
+    histogram per route shares the name ``http_request_duration_seconds``.
+    """
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            return self._metrics.setdefault((metric.name, label_key(metric.labels)), metric)
+
+    def get(self, name, **labels):
+        return self._metrics.get((name, label_key(labels)))
+
+    def __iter__(self):
+        return iter(list(self._metrics.values()))
+
+
+registry = Registry()
+
+
+def label_key(labels):
+    return tuple(sorted(labels.items()))
+
+
+def counter(name, documentation='', labels=None):
+    """Return the counter called ``name`` (with ``labels``), creating it on first use."""
+    return registry.get(name, **(labels or {})) or registry.register(Counter(name, documentation, labels))
+
+
+def gauge(name, documentation='', labels=None):
+    """Return the gauge called ``name`` (with ``labels``), creating it on first use."""
+    return registry.get(name, **(labels or {})) or registry.register(Gauge(name, documentation, labels))
+
+
+def histogram(name, documentation='', buckets=Histogram.DEFAULT_BUCKETS, labels=None):
+    """Return the histogram called ``name`` (with ``labels``), creating it on first use."""
+    return registry.get(name, **(labels or {})) or registry.register(Histogram(name, documentation, buckets, labels))
+
+
+def format_labels(labels, **extra):
+    labels = {**labels, **extra}
+    if not labels:
+        return ''
+    escaped = (
+        (key, str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+        for key, value in labels.items()
+    )
+    return '{' + ','.join(f'{key}="{value}"' for key, value in escaped) + '}'
+
+
+def exposition(metrics=None):
+    """Render ``metrics`` (default: the whole registry) in the Prometheus text format."""
+    families = {}
+    for metric in (registry if metrics is None else metrics):
+        families.setdefault(metric.name, []).append(metric)
+
+    lines = []
+    for name, members in sorted(families.items()):
+        lines.append(f'# HELP {name} {members[0].documentation}')
+        lines.append(f'# TYPE {name} {members[0].type}')
+        for metric in members:
+            if metric.type != 'histogram':
+                lines.append(f'{name}{format_labels(metric.labels)} {metric.value}')
+                continue
+            with metric._lock:
+                counts, count, total = list(metric.counts), metric.count, metric.sum
+            cumulative = 0
+            for bound, n in zip(metric.buckets, counts):
+                cumulative += n
+                lines.append(f'{name}_bucket{format_labels(metric.labels, le=bound)} {cumulative}')
+            lines.append(f'{name}_bucket{format_labels(metric.labels, le="+Inf")} {count}')
+            lines.append(f'{name}_sum{format_labels(metric.labels)} {total}')
+            lines.append(f'{name}_count{format_labels(metric.labels)} {count}')
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,170 @@
+"""
+Per-request performance instrumentation.
+
+``request_metrics_middleware`` records, per route (URL name) and method:
+
+* ``http_request_duration_seconds`` and ``http_requests_total`` for every request,
+* ``http_response_size_bytes`` for every non-streaming response,
+* ``http_request_db_queries``, ``http_request_db_seconds`` and
+  ``http_request_render_seconds`` for sampled requests.
+
+Queries are observed by a wrapper installed on every database connection
+(``api.signals.instrument_connection``). It does nothing unless the current
+request is sampled; the request is found through a context variable, so
+queries run by async views in ``sync_to_async`` threads are attributed too.
+Sampled requests may also get a ``Server-Timing`` header, and requests over
+``SLOW_REQUEST_MS`` are logged with their slowest SQL statements.
+"""
+import heapq
+import logging
+import random
+import time
+from asyncio import iscoroutinefunction
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.utils.decorators import sync_and_async_middleware
+
+from . import metrics
+
+logger = logging.getLogger('api.performance')
+
+DEFAULTS = {
+    'SAMPLE_RATE': 1.0,       # fraction of requests that get query/render instrumentation
+    'SLOW_REQUEST_MS': 500,   # log requests slower than this (None to disable)
+    'SERVER_TIMING': False,   # add Server-Timing headers to sampled responses
+    'MAX_STATEMENTS': 50,     # slowest SQL statements kept per sampled request for the slow log
+    'TOKEN': None,            # bearer token accepted by /metrics
+    'ALLOWED_IPS': (),        # REMOTE_ADDRs that may read /metrics without the token
+}
+
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 89)
+
+_current = ContextVar('request_stats', default=None)
+
+
+def metrics_settings():
+    return {**DEFAULTS, **getattr(settings, 'REQUEST_METRICS', {})}
+
+
+class RequestStats:
+    def __init__(self, max_statements):
+        self.queries = 0
+        self.db_time = 0.0
+        self.timings = {}
+        self.statements = []
+        self.max_statements = max_statements
+
+    def add_query(self, sql, elapsed):
+        self.queries += 1
+        self.db_time += elapsed
+        # Keep the slowest statements in a bounded min-heap.
+        if len(self.statements) < self.max_statements:
+            heapq.heappush(self.statements, (elapsed, sql))
+        else:
+            heapq.heappushpop(self.statements, (elapsed, sql))
+
+
+def observe_query(execute, sql, params, many, context):
+    """Connection execute wrapper: times statements run on behalf of a sampled request."""
+    stats = _current.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        stats.add_query(sql, time.perf_counter() - start)
+
+
+@contextmanager
+def record_timing(name):
+    """Add the time spent in the block to the current sampled request's ``name`` timing."""
+    stats = _current.get()
+    if stats is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        stats.timings[name] = stats.timings.get(name, 0.0) + time.perf_counter() - start
+
+
+@sync_and_async_middleware
+def request_metrics_middleware(get_response):
+    if iscoroutinefunction(get_response):
+        async def middleware(request):
+            start, stats, token = begin()
+            try:
+                response = await get_response(request)
+            finally:
+                _current.reset(token)
+            return finish(request, response, start, stats)
+    else:
+        def middleware(request):
+            start, stats, token = begin()
+            try:
+                response = get_response(request)
+            finally:
+                _current.reset(token)
+            return finish(request, response, start, stats)
+    return middleware
+
+
+def begin():
+    options = metrics_settings()
+    stats = RequestStats(options['MAX_STATEMENTS']) if random.random() < options['SAMPLE_RATE'] else None
+    return time.perf_counter(), stats, _current.set(stats)
+
+
+def finish(request, response, start, stats):
+    elapsed = time.perf_counter() - start
+    options = metrics_settings()
+    match = getattr(request, 'resolver_match', None)
+    route = (match.view_name or match.route) if match else 'unmatched'
+    labels = {'route': route, 'method': request.method}
+
+    metrics.histogram('http_request_duration_seconds', 'Request latency by route.', labels=labels).observe(elapsed)
+    metrics.counter('http_requests_total', 'Requests by route and status.', labels={**labels, 'status': response.status_code}).inc()
+    if not response.streaming:
+        metrics.histogram(
+            'http_response_size_bytes', 'Response body size by route.', SIZE_BUCKETS, labels=labels,
+        ).observe(len(response.content))
+
+    if stats is not None:
+        metrics.histogram('http_request_db_queries', 'SQL statements per sampled request.', QUERY_BUCKETS, labels=labels).observe(stats.queries)
+        metrics.histogram('http_request_db_seconds', 'Database time per sampled request.', labels=labels).observe(stats.db_time)
+        if 'render' in stats.timings:
+            metrics.histogram('http_request_render_seconds', 'Serialization time per sampled request.', labels=labels).observe(stats.timings['render'])
+        if options['SERVER_TIMING']:
+            response['Server-Timing'] = server_timing(elapsed, stats)
+
+    slow_ms = options['SLOW_REQUEST_MS']
+    if slow_ms is not None and elapsed * 1000 >= slow_ms:
+        log_slow_request(request, route, elapsed, stats)
+    return response
+
+
+def server_timing(elapsed, stats):
+    entries = [
+        f'app;dur={elapsed * 1000:.1f}',
+        f'db;dur={stats.db_time * 1000:.1f};desc="{stats.queries} queries"',
+    ]
+    entries += [f'{name};dur={seconds * 1000:.1f}' for name, seconds in stats.timings.items()]
+    return ', '.join(entries)
+
+
+def log_slow_request(request, route, elapsed, stats):
+    if stats is None:
+        logger.warning('Slow request %s %s (%s): %.0f ms (not sampled, no SQL captured)',
+                       request.method, request.path, route, elapsed * 1000)
+        return
+    slowest = sorted(stats.statements, key=lambda statement: statement[0], reverse=True)[:10]
+    logger.warning(
+        'Slow request %s %s (%s): %.0f ms, %d queries, %.0f ms in the database. Slowest SQL:\n%s',
+        request.method, request.path, route, elapsed * 1000, stats.queries, stats.db_time * 1000,
+        '\n'.join(f'  {seconds * 1000:8.2f} ms  {sql}' for seconds, sql in slowest),
+    )
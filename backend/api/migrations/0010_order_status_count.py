@@ -0,0 +1,37 @@
+# Generated by Django 5.1.4 on 2026-10-17 19:17
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def backfill_status_counts(apps, schema_editor):
+    Order = apps.get_model('api', 'Order')
+    OrderStatusCount = apps.get_model('api', 'OrderStatusCount')
+    rows = Order.objects.values('user_id', 'status').annotate(n=models.Count('id')).order_by()
+    OrderStatusCount.objects.bulk_create(
+        OrderStatusCount(user_id=row['user_id'], status=row['status'], count=row['n']) for row in rows
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0009_order_checkout'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OrderStatusCount',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(max_length=50)),
+                ('count', models.IntegerField(default=0)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='order_status_counts', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'unique_together': {('user', 'status')},
+            },
+        ),
+        migrations.RunPython(backfill_status_counts, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,63 @@
+# Generated by Django 5.1.4 on 2026-10-17 19:19
+
+from django.db import migrations, models
+
+STATUSES = ('pending', 'preparing', 'ready', 'completed', 'cancelled')
+
+# Free-text statuses written before Order.status had choices, normalised
+# (lower case, single spaces, "_"/"-" as spaces). Anything not listed here
+# becomes 'pending', the field's default, from where staff can move or
+# cancel the order.
+LEGACY_STATUSES = {
+    'new': 'pending', 'placed': 'pending', 'open': 'pending', 'received': 'pending', 'waiting': 'pending',
+    'in progress': 'preparing', 'processing': 'preparing', 'cooking': 'preparing', 'accepted': 'preparing',
+    'ready for pickup': 'ready', 'ready to pick up': 'ready',
+    'complete': 'completed', 'done': 'completed', 'delivered': 'completed', 'picked up': 'completed',
+    'served': 'completed', 'fulfilled': 'completed', 'paid': 'completed', 'closed': 'completed',
+    'canceled': 'cancelled', 'cancel': 'cancelled', 'void': 'cancelled', 'voided': 'cancelled',
+    'rejected': 'cancelled', 'refunded': 'cancelled', 'declined': 'cancelled',
+}
+
+
+def status_for(legacy):
+    normalised = ' '.join(legacy.replace('_', ' ').replace('-', ' ').lower().split())
+    if normalised in STATUSES:
+        return normalised
+    return LEGACY_STATUSES.get(normalised, 'pending')
+
+
+def map_legacy_statuses(apps, schema_editor):
+    Order = apps.get_model('api', 'Order')
+    OrderStatusCount = apps.get_model('api', 'OrderStatusCount')
+    legacy = Order.objects.exclude(status__in=STATUSES)
+    user_ids = set(legacy.values_list('user_id', flat=True).distinct())
+    if not user_ids:
+        return
+    for status in set(legacy.values_list('status', flat=True).distinct()):
+        Order.objects.filter(status=status).update(status=status_for(status))
+
+    # The bulk updates bypass the signals: rebuild the affected users' counters.
+    rows = (
+        Order.objects.filter(user_id__in=user_ids)
+        .values('user_id', 'status').annotate(n=models.Count('id')).order_by()
+    )
+    OrderStatusCount.objects.filter(user_id__in=user_ids).delete()
+    OrderStatusCount.objects.bulk_create(
+        OrderStatusCount(user_id=row['user_id'], status=row['status'], count=row['n']) for row in rows
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0010_order_status_count'),
+    ]
+
+    operations = [
+        migrations.RunPython(map_legacy_statuses, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='order',
+            name='status',
+            field=models.CharField(choices=[('pending', 'Pending'), ('preparing', 'Preparing'), ('ready', 'Ready for pickup'), ('completed', 'Completed'), ('cancelled', 'Cancelled')], default='pending', max_length=50),
+        ),
+    ]
@@ -0,0 +1,98 @@
+# Generated by Django 5.1.4 on 2026-10-17 19:43
+
+from django.db import migrations, models
+
+SQLITE_INDEX = [
+    # External-content FTS5 table over api_searchentry; prefix indexes serve autocomplete.
+    """CREATE VIRTUAL TABLE api_searchentry_fts USING fts5(
+        name, description, content='api_searchentry', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+    )""",
+    "CREATE VIRTUAL TABLE api_searchentry_vocab USING fts5vocab(api_searchentry_fts, 'row')",
+    """CREATE TRIGGER api_searchentry_fts_insert AFTER INSERT ON api_searchentry BEGIN
+        INSERT INTO api_searchentry_fts(rowid, name, description) VALUES (new.id, new.name, new.description);
+    END""",
+    """CREATE TRIGGER api_searchentry_fts_delete AFTER DELETE ON api_searchentry BEGIN
+        INSERT INTO api_searchentry_fts(api_searchentry_fts, rowid, name, description)
+        VALUES ('delete', old.id, old.name, old.description);
+    END""",
+    """CREATE TRIGGER api_searchentry_fts_update AFTER UPDATE OF name, description ON api_searchentry BEGIN
+        INSERT INTO api_searchentry_fts(api_searchentry_fts, rowid, name, description)
+        VALUES ('delete', old.id, old.name, old.description);
+        INSERT INTO api_searchentry_fts(rowid, name, description) VALUES (new.id, new.name, new.description);
+    END""",
+]
+
+SQLITE_DROP = [
+    'DROP TRIGGER api_searchentry_fts_update',
+    'DROP TRIGGER api_searchentry_fts_delete',
+    'DROP TRIGGER api_searchentry_fts_insert',
+    'DROP TABLE api_searchentry_vocab',
+    'DROP TABLE api_searchentry_fts',
+]
+
+POSTGRES_INDEX = [
+    'CREATE EXTENSION IF NOT EXISTS pg_trgm',
+    # Name terms weigh A, description terms B, for ranking and name-only autocomplete.
+    """ALTER TABLE api_searchentry ADD COLUMN document tsvector GENERATED ALWAYS AS (
+        setweight(to_tsvector('simple', name), 'A') || setweight(to_tsvector('simple', description), 'B')
+    ) STORED""",
+    'CREATE INDEX search_entry_document_idx ON api_searchentry USING gin (document)',
+    'CREATE INDEX search_entry_name_trgm_idx ON api_searchentry USING gin (name gin_trgm_ops)',
+]
+
+POSTGRES_DROP = [
+    'DROP INDEX search_entry_name_trgm_idx',
+    'DROP INDEX search_entry_document_idx',
+    'ALTER TABLE api_searchentry DROP COLUMN document',
+]
+
+
+def run_for_vendor(statements):
+    def run(apps, schema_editor):
+        for sql in statements.get(schema_editor.connection.vendor, []):
+            schema_editor.execute(sql)
+    return run
+
+
+def backfill_search_entries(apps, schema_editor):
+    SearchEntry = apps.get_model('api', 'SearchEntry')
+    for kind, model in (('product', 'Product'), ('menu_item', 'MenuItem')):
+        rows = apps.get_model('api', model).objects.values_list('id', 'name', 'description', 'price', 'available')
+        SearchEntry.objects.bulk_create(
+            (
+                SearchEntry(kind=kind, object_id=pk, name=name, description=description or '', price=price, available=available)
+                for pk, name, description, price, available in rows.iterator(chunk_size=2000)
+            ),
+            batch_size=1000,
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0012_task'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('product', 'Product'), ('menu_item', 'Menu item')], max_length=20)),
+                ('object_id', models.BigIntegerField()),
+                ('name', models.CharField(max_length=100)),
+                ('description', models.TextField(blank=True, default='')),
+                ('price', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('available', models.BooleanField(default=True)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('kind', 'object_id'), name='search_entry_object_uniq')],
+            },
+        ),
+        migrations.RunPython(
+            run_for_vendor({'sqlite': SQLITE_INDEX, 'postgresql': POSTGRES_INDEX}),
+            run_for_vendor({'sqlite': SQLITE_DROP, 'postgresql': POSTGRES_DROP}),
+        ),
+        migrations.RunPython(backfill_search_entries, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,84 @@
+# Generated by Django 5.1.4 on 2026-10-17 20:30
+
+from django.core.management.color import no_style
+from django.db import migrations, models
+
+
+def copy_menu_items(apps, schema_editor):
+    """
+    Copy every menu item into ``api_product`` as a ``menu_item``, with its id
+    shifted past the last product id, and move order items and search entries
+    to the new ids. Set-based, so it is a handful of statements at any size.
+    A menu item whose SKU is already a product's gets ``-menu`` appended.
+    """
+    Product = apps.get_model('api', 'Product')
+    connection = schema_editor.connection
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT COALESCE(MAX(id), 0) FROM api_product')
+        offset = cursor.fetchone()[0]
+        cursor.execute(
+            "INSERT INTO api_product "
+            "(id, kind, sku, name, description, price, image_url, image, image_variants, available, created_at, updated_at) "
+            "SELECT m.id + %s, 'menu_item', CASE WHEN p.id IS NULL THEN m.sku ELSE substr(m.sku, 1, 59) || '-menu' END, "
+            "m.name, m.description, m.price, NULL, '', '{}', m.available, m.created_at, m.created_at "
+            "FROM api_menuitem m LEFT JOIN api_product p ON p.sku = m.sku",
+            [offset],
+        )
+        cursor.execute(
+            'INSERT INTO api_order_catalog_items (order_id, product_id) SELECT order_id, menuitem_id + %s FROM api_order_items',
+            [offset],
+        )
+        # Through negative ids, so no row collides with one not shifted yet.
+        cursor.execute("UPDATE api_searchentry SET object_id = -(object_id + %s) WHERE kind = 'menu_item'", [offset])
+        cursor.execute("UPDATE api_searchentry SET object_id = -object_id WHERE kind = 'menu_item'")
+        for sql in connection.ops.sequence_reset_sql(no_style(), [Product]):
+            cursor.execute(sql)
+
+
+def restore_menu_items(apps, schema_editor):
+    """
+    Reverse of ``copy_menu_items``: move the ``menu_item`` rows back into
+    ``api_menuitem`` under their current ids (so search entries still point
+    at them), with their order items. Carts and order lines could not hold
+    menu items before this migration, so those rows are dropped and unlinked.
+    SKUs keep any ``-menu`` suffix.
+    """
+    MenuItem = apps.get_model('api', 'MenuItem')
+    connection = schema_editor.connection
+    menu_items = "SELECT id FROM api_product WHERE kind = 'menu_item'"
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'INSERT INTO api_menuitem (id, sku, name, description, price, available, created_at) '
+            f'SELECT id, sku, name, description, price, available, created_at FROM api_product WHERE id IN ({menu_items})'
+        )
+        cursor.execute(
+            'INSERT INTO api_order_items (order_id, menuitem_id) '
+            f'SELECT order_id, product_id FROM api_order_catalog_items WHERE product_id IN ({menu_items})'
+        )
+        cursor.execute(f'DELETE FROM api_order_catalog_items WHERE product_id IN ({menu_items})')
+        cursor.execute(f'DELETE FROM api_cartitem WHERE product_id IN ({menu_items})')
+        cursor.execute(f'UPDATE api_orderline SET product_id = NULL WHERE product_id IN ({menu_items})')
+        cursor.execute("DELETE FROM api_product WHERE kind = 'menu_item'")
+        for sql in connection.ops.sequence_reset_sql(no_style(), [MenuItem]):
+            cursor.execute(sql)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0015_catalog_sku'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='kind',
+            field=models.CharField(choices=[('product', 'Product'), ('menu_item', 'Menu item')], default='product', editable=False, max_length=20),
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='catalog_items',
+            field=models.ManyToManyField(related_name='+', to='api.product'),
+        ),
+        migrations.RunPython(copy_menu_items, restore_menu_items),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 5.1.4 on 2026-10-17 20:30
+# Separate from 0016 so PostgreSQL checks the copied rows' deferred foreign
+# keys at 0016's commit, before these tables are altered.
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0016_catalog_kind'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='order',
+            name='items',
+        ),
+        migrations.RenameField(
+            model_name='order',
+            old_name='catalog_items',
+            new_name='items',
+        ),
+        migrations.AlterField(
+            model_name='order',
+            name='items',
+            field=models.ManyToManyField(to='api.product'),
+        ),
+        migrations.DeleteModel(
+            name='MenuItem',
+        ),
+        migrations.CreateModel(
+            name='MenuItem',
+            fields=[
+            ],
+            options={
+                'proxy': True,
+                'indexes': [],
+                'constraints': [],
+            },
+            bases=('api.product',),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['kind', 'created_at', 'id'], name='product_kind_created_idx'),
+        ),
+    ]
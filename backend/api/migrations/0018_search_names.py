@@ -0,0 +1,48 @@
+# Generated by Django 5.1.4 on 2026-10-17 21:45
+# A names-only FTS5 table next to api_searchentry_fts: a name match read from
+# the full index walks every entry containing the word, descriptions too.
+
+from django.db import migrations
+
+SQLITE_INDEX = [
+    """CREATE VIRTUAL TABLE api_searchentry_names USING fts5(
+        name, content='api_searchentry', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+    )""",
+    "INSERT INTO api_searchentry_names(api_searchentry_names) VALUES ('rebuild')",
+    """CREATE TRIGGER api_searchentry_names_insert AFTER INSERT ON api_searchentry BEGIN
+        INSERT INTO api_searchentry_names(rowid, name) VALUES (new.id, new.name);
+    END""",
+    """CREATE TRIGGER api_searchentry_names_delete AFTER DELETE ON api_searchentry BEGIN
+        INSERT INTO api_searchentry_names(api_searchentry_names, rowid, name) VALUES ('delete', old.id, old.name);
+    END""",
+    """CREATE TRIGGER api_searchentry_names_update AFTER UPDATE OF name ON api_searchentry BEGIN
+        INSERT INTO api_searchentry_names(api_searchentry_names, rowid, name) VALUES ('delete', old.id, old.name);
+        INSERT INTO api_searchentry_names(rowid, name) VALUES (new.id, new.name);
+    END""",
+]
+
+SQLITE_DROP = [
+    'DROP TRIGGER api_searchentry_names_update',
+    'DROP TRIGGER api_searchentry_names_delete',
+    'DROP TRIGGER api_searchentry_names_insert',
+    'DROP TABLE api_searchentry_names',
+]
+
+
+def run_for_vendor(statements):
+    def run(apps, schema_editor):
+        for sql in statements.get(schema_editor.connection.vendor, []):
+            schema_editor.execute(sql)
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0017_unify_catalog'),
+    ]
+
+    operations = [
+        migrations.RunPython(run_for_vendor({'sqlite': SQLITE_INDEX}), run_for_vendor({'sqlite': SQLITE_DROP})),
+    ]
@@ -1,4 +1,6 @@
 from django.db import models
+from django.db.models import Q
+from django.db.models.functions import Lower
 from django.contrib.auth.models import AbstractUser
 
 class User(AbstractUser):
@@ -20,15 +22,50 @@ class User(AbstractUser):
         blank=True
     )
 
+    class Meta(AbstractUser.Meta):
+        indexes = [
+            # Case-insensitive login / admin lookups by email.
+            models.Index(Lower('email'), name='user_email_lower_idx'),
+        ]
+
 
 
 class Product(models.Model):
+    """
+    One catalog item: anything that can be put in a cart and ordered.
+
+    Products and menu items share this table and differ only in ``kind``;
+    ``MenuItem`` is a proxy over the menu items. Cart, order and catalog
+    reads therefore query (and cache and index) a single table.
+    """
+    class Kind(models.TextChoices):
+        PRODUCT = 'product', 'Product'
+        MENU_ITEM = 'menu_item', 'Menu item'
+
+    # Not editable in forms; a catalog import may re-type an item by SKU (see api/catalog_io.py).
+    kind = models.CharField(max_length=20, choices=Kind.choices, default=Kind.PRODUCT, editable=False)
+    # Stable key for catalog imports (see api/catalog_io.py); optional for items created by hand.
+    sku = models.CharField(max_length=64, unique=True, null=True, blank=True)
     name = models.CharField(max_length=100)
     description = models.TextField(blank=True, null=True)
     price = models.DecimalField(max_digits=10, decimal_places=2)
     image_url = models.CharField(max_length=255, blank=True, null=True)
+    # Content-addressed upload and its rendered variants; see api/images.py.
+    image = models.FileField(max_length=255, blank=True)
+    image_variants = models.JSONField(default=dict, blank=True)
     available = models.BooleanField(default=True)
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            # Keyset pagination of the catalog on (created_at, id) ...
+            models.Index(fields=['created_at', 'id'], name='product_created_idx'),
+            # ... and of the customer-facing ?available=true catalog.
+            models.Index(fields=['created_at', 'id'], condition=Q(available=True), name='product_available_created_idx'),
+            # ... and of one kind (?type=menu_item).
+            models.Index(fields=['kind', 'created_at', 'id'], name='product_kind_created_idx'),
+        ]
 
     def __str__(self):
         return self.name
@@ -42,15 +79,144 @@ class CartItem(models.Model):
     class Meta:
         unique_together = ('user', 'product')
 
-class MenuItem(models.Model):
-    name = models.CharField(max_length=100)
-    description = models.TextField(blank=True, null=True)
-    price = models.DecimalField(max_digits=10, decimal_places=2)
-    available = models.BooleanField(default=True)
-    created_at = models.DateTimeField(auto_now_add=True)
+class MenuItemManager(models.Manager):
+    def get_queryset(self):
+        return super().get_queryset().filter(kind=Product.Kind.MENU_ITEM)
+
+    def bulk_create(self, objs, *args, **kwargs):
+        objs = list(objs)
+        for obj in objs:
+            obj.kind = Product.Kind.MENU_ITEM
+        return super().bulk_create(objs, *args, **kwargs)
+
+class MenuItem(Product):
+    """The catalog items of kind ``menu_item``."""
+    objects = MenuItemManager()
+
+    class Meta:
+        proxy = True
+
+    def save(self, *args, **kwargs):
+        self.kind = Product.Kind.MENU_ITEM
+        super().save(*args, **kwargs)
 
 class Order(models.Model):
+    class Status(models.TextChoices):
+        PENDING = 'pending', 'Pending'
+        PREPARING = 'preparing', 'Preparing'
+        READY = 'ready', 'Ready for pickup'
+        COMPLETED = 'completed', 'Completed'
+        CANCELLED = 'cancelled', 'Cancelled'
+
+    # Allowed moves of the order state machine; see api.orders.transition.
+    TRANSITIONS = {
+        Status.PENDING: {Status.PREPARING, Status.CANCELLED},
+        Status.PREPARING: {Status.READY, Status.CANCELLED},
+        Status.READY: {Status.COMPLETED},
+        Status.COMPLETED: set(),
+        Status.CANCELLED: set(),
+    }
+
     user = models.ForeignKey(User, on_delete=models.CASCADE)
+    status = models.CharField(max_length=50, choices=Status.choices, default=Status.PENDING)
+    created_at = models.DateTimeField(auto_now_add=True)
+    items = models.ManyToManyField(Product)
+    total = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    # Client-supplied key so a retried checkout returns the original order.
+    idempotency_key = models.CharField(max_length=64, blank=True, null=True)
+
+    class Meta:
+        indexes = [
+            # A user's order history, newest first.
+            models.Index(fields=['user', 'created_at', 'id'], name='order_user_created_idx'),
+            # Admin / kitchen lists filtered by status and date.
+            models.Index(fields=['status', 'created_at'], name='order_status_created_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'idempotency_key'], name='order_user_idempotency_key_uniq'),
+        ]
+
+class OrderLine(models.Model):
+    order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name='lines')
+    product = models.ForeignKey(Product, on_delete=models.SET_NULL, null=True, related_name='+')
+    # Snapshots taken at checkout, so later catalog edits do not rewrite history.
+    name = models.CharField(max_length=100)
+    unit_price = models.DecimalField(max_digits=10, decimal_places=2)
+    quantity = models.PositiveIntegerField()
+
+    @property
+    def line_total(self):
+        return self.unit_price * self.quantity
+
+
+class OrderStatusCount(models.Model):
+    """
+    Denormalized per-user order counts by status, kept current by ``api.signals``.
+
+    Bulk ``Order`` updates bypass the signals; call ``api.orders.recount_statuses``
+    for the affected users afterwards.
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='order_status_counts')
     status = models.CharField(max_length=50)
+    count = models.IntegerField(default=0)
+
+    class Meta:
+        unique_together = ('user', 'status')
+
+class Task(models.Model):
+    """A unit of background work, run by ``manage.py run_worker`` (see api/tasks.py)."""
+    class Status(models.TextChoices):
+        QUEUED = 'queued', 'Queued'
+        RUNNING = 'running', 'Running'
+        DONE = 'done', 'Done'
+        FAILED = 'failed', 'Failed'
+
+    name = models.CharField(max_length=100)
+    kwargs = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=10, choices=Status.choices, default=Status.QUEUED)
+    # Queued tasks with the same key are coalesced into one (e.g. cache warmups).
+    unique_key = models.CharField(max_length=100, blank=True, null=True)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    max_attempts = models.PositiveSmallIntegerField(default=3)
+    run_at = models.DateTimeField()
+    locked_at = models.DateTimeField(blank=True, null=True)
+    locked_by = models.CharField(max_length=100, blank=True)
+    last_error = models.TextField(blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
-    items = models.ManyToManyField(MenuItem)
\ No newline at end of file
+    finished_at = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'run_at'], name='task_status_run_at_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['unique_key'], condition=Q(status='queued'), name='task_queued_unique_key_uniq'),
+        ]
+
+    def __str__(self):
+        return f'{self.name} ({self.status})'
+
+class SearchEntry(models.Model):
+    """
+    One searchable catalog item, kept current by ``api.signals`` (see api/search.py).
+
+    The full-text index over these rows is database specific and created by
+    migration 0013: an FTS5 table maintained by triggers on SQLite, a
+    generated ``tsvector`` column with GIN indexes on PostgreSQL.
+    """
+    Kind = Product.Kind
+
+    kind = models.CharField(max_length=20, choices=Kind.choices)
+    object_id = models.BigIntegerField()
+    name = models.CharField(max_length=100)
+    description = models.TextField(blank=True, default='')
+    price = models.DecimalField(max_digits=10, decimal_places=2)
+    available = models.BooleanField(default=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['kind', 'object_id'], name='search_entry_object_uniq'),
+        ]
+
+    def __str__(self):
+        return f'{self.kind} {self.object_id}: {self.name}'
@@ -0,0 +1,203 @@
+from collections import Counter, defaultdict
+from functools import partial
+
+from django.db import IntegrityError, transaction
+from django.db.models import Case, Count, F, Prefetch, Value, When
+
+from .cart import invalidate_cart
+from .events import publish_status_change
+from .models import CartItem, Order, OrderLine, OrderStatusCount, Product
+
+
+class EmptyCart(Exception):
+    pass
+
+
+class InvalidTransition(Exception):
+    def __init__(self, current, requested):
+        super().__init__(f"Cannot move an order from '{current}' to '{requested}'")
+        self.current = current
+        self.requested = requested
+
+
+class UnavailableProducts(Exception):
+    def __init__(self, names):
+        super().__init__(f"No longer available: {', '.join(sorted(names))}")
+        self.names = names
+
+
+def checkout(user, idempotency_key=None):
+    """
+    Turn the user's cart into an ``Order``; return ``(order, created)``.
+
+    The whole conversion is a fixed handful of statements however many
+    lines the cart has:
+
+    1. one ``SELECT ... FOR UPDATE`` locks the cart rows and reads the prices,
+    2. one lookup of a previous order with the same idempotency key,
+    3. one ``INSERT`` for the order and one batched ``INSERT`` for its lines,
+    4. one ``DELETE`` empties the cart.
+
+    Locking the cart first means a concurrent retry waits for the first
+    checkout to commit and then finds its order by key instead of buying the
+    same cart twice; the ``(user, idempotency_key)`` unique constraint backs
+    this up on databases without row locks.
+    """
+    with transaction.atomic():
+        lines = list(
+            CartItem.objects.select_for_update(of=('self',))
+            .filter(user_id=user.pk)
+            .select_related('product')
+            .only('id', 'quantity', 'product__id', 'product__name', 'product__price', 'product__available')
+            .order_by('added_at', 'id')
+        )
+        if idempotency_key:
+            previous = Order.objects.filter(user_id=user.pk, idempotency_key=idempotency_key).first()
+            if previous is not None:
+                return previous, False
+        if not lines:
+            raise EmptyCart()
+        unavailable = {line.product.name for line in lines if not line.product.available}
+        if unavailable:
+            raise UnavailableProducts(unavailable)
+
+        try:
+            with transaction.atomic():
+                order = Order.objects.create(
+                    user_id=user.pk,
+                    status=Order.Status.PENDING,
+                    total=sum(line.product.price * line.quantity for line in lines),
+                    idempotency_key=idempotency_key or None,
+                )
+        except IntegrityError:
+            if not idempotency_key:
+                raise
+            return Order.objects.get(user_id=user.pk, idempotency_key=idempotency_key), False
+
+        OrderLine.objects.bulk_create(
+            OrderLine(
+                order=order,
+                product_id=line.product.id,
+                name=line.product.name,
+                unit_price=line.product.price,
+                quantity=line.quantity,
+            )
+            for line in lines
+        )
+        CartItem.objects.filter(id__in=[line.id for line in lines]).delete()
+        transaction.on_commit(lambda: invalidate_cart(user.pk))
+    return order, True
+
+
+def transition(order_id, status, user=None):
+    """
+    Move an order to ``status`` if the state machine allows it; return the order.
+
+    The row is locked while the move is validated, so two concurrent
+    transitions cannot both start from the same status. Pass ``user`` to
+    restrict the lookup to that customer's orders. Status counters and SSE
+    subscribers are updated by the ``Order`` signals in ``api.signals``.
+    """
+    with transaction.atomic():
+        orders = Order.objects.select_for_update()
+        if user is not None:
+            orders = orders.filter(user_id=user.pk)
+        order = orders.get(pk=order_id)
+        if status not in Order.TRANSITIONS.get(order.status, ()):
+            raise InvalidTransition(order.status, status)
+        order.status = status
+        order.save(update_fields=['status'])
+    return order
+
+
+def transition_many(queryset, moves):
+    """
+    Apply ``moves`` (``{from status: to status}``) to the orders in
+    ``queryset`` with one UPDATE; orders in other statuses are left alone.
+    Return the number of orders moved.
+
+    The bulk update bypasses the ``Order`` signals, so the status counters
+    are adjusted and SSE subscribers notified here, from the rows read (and
+    locked) just before the update.
+    """
+    for current, status in moves.items():
+        if status not in Order.TRANSITIONS.get(current, ()):
+            raise InvalidTransition(current, status)
+    with transaction.atomic():
+        moving = queryset.filter(status__in=moves)
+        rows = list(moving.select_for_update().order_by().values_list('id', 'user_id', 'status'))
+        if not rows:
+            return 0
+        moving.update(status=Case(*(When(status=current, then=Value(status)) for current, status in moves.items())))
+
+        deltas = defaultdict(Counter)
+        for order_id, user_id, current in rows:
+            deltas[user_id][current] -= 1
+            deltas[user_id][moves[current]] += 1
+            transaction.on_commit(partial(publish_status_change, order_id, user_id, moves[current], current))
+        for user_id, user_deltas in deltas.items():
+            adjust_status_counts(user_id, user_deltas)
+    return len(rows)
+
+
+def active_orders(user_id=None):
+    """Orders still moving through the kitchen, oldest first, as event messages."""
+    orders = Order.objects.exclude(status__in=[Order.Status.COMPLETED, Order.Status.CANCELLED])
+    if user_id is not None:
+        orders = orders.filter(user_id=user_id)
+    return orders.order_by('created_at', 'id').values('id', 'user', 'status')
+
+
+def order_history(user):
+    """
+    The user's orders with their lines and catalog items prefetched.
+
+    Serializing a page costs three queries (orders, lines, items) instead of
+    two per order.
+    """
+    return Order.objects.filter(user_id=user.pk).prefetch_related(
+        Prefetch('lines', queryset=OrderLine.objects.only('id', 'order_id', 'product_id', 'name', 'unit_price', 'quantity').order_by('id')),
+        Prefetch('items', queryset=Product.objects.only('id')),
+    )
+
+
+def status_counts(user):
+    """``{status: count}`` for the user's orders, read from ``OrderStatusCount``."""
+    return dict(
+        OrderStatusCount.objects.filter(user_id=user.pk, count__gt=0).order_by('status').values_list('status', 'count')
+    )
+
+
+def adjust_status_counts(user_id, deltas):
+    """
+    Apply ``{status: delta}`` to the user's status counters in two statements.
+
+    Like ``api.cart.apply_cart_deltas`` the rows are created at zero and then
+    incremented in SQL, so concurrent transitions never lose a count. Only
+    increments create rows: a decrement for a user being deleted must not
+    insert a row pointing at them.
+    """
+    deltas = {status: delta for status, delta in deltas.items() if delta}
+    if not deltas:
+        return
+    OrderStatusCount.objects.bulk_create(
+        [OrderStatusCount(user_id=user_id, status=status, count=0) for status, delta in deltas.items() if delta > 0],
+        ignore_conflicts=True,
+    )
+    OrderStatusCount.objects.filter(user_id=user_id, status__in=deltas).update(count=F('count') + Case(
+        *(When(status=status, then=Value(delta)) for status, delta in deltas.items()),
+        default=Value(0),
+    ))
+
+
+def recount_statuses(user_id):
+    """Rebuild one user's counters from ``Order`` (used when the old status is unknown)."""
+    counts = dict(
+        Order.objects.filter(user_id=user_id).values_list('status').annotate(n=Count('id')).order_by()
+    )
+    with transaction.atomic():
+        OrderStatusCount.objects.filter(user_id=user_id).exclude(status__in=counts).delete()
+        OrderStatusCount.objects.bulk_create(
+            [OrderStatusCount(user_id=user_id, status=status, count=n) for status, n in counts.items()],
+            update_conflicts=True, unique_fields=['user', 'status'], update_fields=['count'],
+        )
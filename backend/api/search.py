@@ -0,0 +1,321 @@
+"""
+Catalog search over products and menu items.
+
+Every catalog item (``Product``, of either kind) has a ``SearchEntry`` row, upserted and
+deleted by the model signals in ``api.signals``; bulk writes bypass those and
+must call ``rebuild_search_index()`` (or ``manage.py rebuild_search_index``).
+Migration 0013 puts a full-text index over the entries, and a backend per
+database vendor queries it:
+
+* SQLite: FTS5 tables kept in step with ``api_searchentry`` by triggers, one
+  over names and descriptions and one over names alone (migration 0018),
+  ranked by the length of the matching field (see ``SQLiteSearch.match``).
+* PostgreSQL: a generated ``tsvector`` column with a GIN index, ranked with
+  ``ts_rank_cd``, plus a trigram index on the name for typo candidates.
+
+Matching is staged so the common case stays cheap. Completed words match
+exactly and the last word as a prefix, since the customer may still be
+typing it. If that finds nothing, every word is tried as a prefix. If that
+also finds nothing, each word that is not a prefix of any indexed word is
+replaced by the closest indexed word, allowing one typo for short words and
+two for longer ones.
+
+Ranking is bounded so that a broad query (a word most of the catalog
+contains) costs no more than a narrow one: each tier of matches reads at most
+``RANK_CANDIDATES`` matches, the newest, and ranks only those. Name matches
+are tried first and description matches fill any remaining places, whole
+words before prefixes, so a name match is never lost behind a window of
+newer description matches. (A prefix longer than the FTS5 prefix indexes
+reads every entry containing one of its completions; a whole word reads
+only the newest few.) Autocomplete does not rank by relevance at all: of
+the newest name matches it returns the shortest names, the likeliest
+completions. Typo candidates are read from the index vocabulary once per
+catalog version and first letter, and kept in the shared catalog cache.
+
+Admin changelists need every match rather than the best few:
+``matching_ids`` is an unranked, uncapped subquery of them.
+"""
+import re
+from collections import Counter, namedtuple
+
+from django.db import connection, transaction
+from django.db.models import F, OuterRef, Subquery, TextField, Value
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import Coalesce
+
+from .catalog import cache_settings, catalog_version, shared_cache
+from .models import Product, SearchEntry
+
+MAX_TERMS = 8
+RANK_CANDIDATES = 200
+RESULT_FIELDS = 'e.id, e.kind, e.object_id, e.name, e.description, e.price, e.available'
+
+SearchResults = namedtuple('SearchResults', 'entries corrected')
+
+
+def search_terms(query):
+    """Lower-cased words of ``query``, at most ``MAX_TERMS``."""
+    return re.findall(r'[^\W_]+', query.lower())[:MAX_TERMS]
+
+
+def entry_for(instance):
+    return SearchEntry(
+        kind=instance.kind, object_id=instance.pk, name=instance.name, description=instance.description or '',
+        price=instance.price, available=instance.available,
+    )
+
+
+def index_object(instance):
+    """Insert or refresh the search entry of a product or menu item (one statement)."""
+    index_objects([instance])
+
+
+def index_objects(instances):
+    """Insert or refresh the search entries of saved products and menu items in one statement."""
+    SearchEntry.objects.bulk_create(
+        [entry_for(instance) for instance in instances],
+        update_conflicts=True, unique_fields=['kind', 'object_id'],
+        update_fields=['name', 'description', 'price', 'available'],
+    )
+
+
+def index_queryset(queryset):
+    """
+    Insert or refresh the search entries of every item in ``queryset`` with one
+    INSERT ... SELECT, after dropping entries of items whose kind has changed
+    (a catalog import may re-type an item).
+    """
+    SearchEntry.objects.filter(object_id__in=queryset.values('pk')).exclude(
+        kind=Subquery(Product.objects.filter(pk=OuterRef('object_id')).values('kind')),
+    ).delete()
+    rows = queryset.order_by().annotate(
+        entry_kind=F('kind'), entry_id=F('pk'), entry_name=F('name'),
+        entry_description=Coalesce('description', Value(''), output_field=TextField()),
+        entry_price=F('price'), entry_available=F('available'),
+    ).values_list('entry_kind', 'entry_id', 'entry_name', 'entry_description', 'entry_price', 'entry_available')
+    select, params = rows.query.get_compiler(queryset.db).as_sql()
+    with connection.cursor() as cursor:
+        # Columns are picked by alias (the subquery's order is Django's); "WHERE
+        # true" keeps SQLite from reading ON CONFLICT as part of the SELECT.
+        cursor.execute(
+            f'INSERT INTO api_searchentry (kind, object_id, name, description, price, available) '
+            f'SELECT entry_kind, entry_id, entry_name, entry_description, entry_price, entry_available '
+            f'FROM ({select}) rows WHERE true '
+            f'ON CONFLICT (kind, object_id) DO UPDATE SET name = excluded.name, description = excluded.description, '
+            f'price = excluded.price, available = excluded.available',
+            params,
+        )
+
+
+def unindex_object(instance):
+    SearchEntry.objects.filter(object_id=instance.pk).delete()
+
+
+def rebuild_search_index(batch_size=1000):
+    """Re-create every search entry from the catalog; returns the number indexed."""
+    with transaction.atomic():
+        SearchEntry.objects.all().delete()
+        rows = Product.objects.only('kind', 'name', 'description', 'price', 'available').iterator(chunk_size=batch_size)
+        count = len(SearchEntry.objects.bulk_create((entry_for(row) for row in rows), batch_size=batch_size))
+    if connection.vendor == 'sqlite':
+        with connection.cursor() as cursor:
+            for table in ('api_searchentry_fts', 'api_searchentry_names'):
+                cursor.execute(f"INSERT INTO {table}({table}) VALUES ('optimize')")
+    return count
+
+
+def edit_distance(a, b, limit):
+    """Optimal string alignment distance between ``a`` and ``b``, or ``limit + 1`` once it exceeds ``limit``."""
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    before, previous = None, list(range(len(b) + 1))
+    for i, char in enumerate(a, 1):
+        current = [i] + [0] * len(b)
+        for j, other in enumerate(b, 1):
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (char != other))
+            if i > 1 and j > 1 and char == b[j - 2] and a[i - 2] == other:
+                current[j] = min(current[j], before[j - 2] + 1)
+        if min(current) > limit:
+            return limit + 1
+        before, previous = previous, current
+    return previous[-1]
+
+
+def closest_word(term, candidates):
+    """
+    The candidate ``(word, frequency)`` the customer most likely meant by
+    ``term``, or None if ``term`` is already a prefix of a word or nothing is
+    close. A word's prefix counts as close too, since the term may be
+    incomplete.
+    """
+    if len(term) < 3:
+        return None
+    limit = 1 if len(term) <= 4 else 2
+    best = None
+    for word, frequency in candidates:
+        if word.startswith(term):
+            return None
+        distance = min(edit_distance(term, word, limit), edit_distance(term, word[:len(term)], limit))
+        if distance <= limit and (best is None or (distance, -frequency) < best[:2]):
+            best = (distance, -frequency, word)
+    return best and best[2]
+
+
+def prefixed(terms, prefix_all, whole_words=False):
+    """Pair each term with whether it matches as a prefix: the last one always does, unless ``whole_words``."""
+    return [(term, not whole_words and (prefix_all or i == len(terms) - 1)) for i, term in enumerate(terms)]
+
+
+def filters(where, params, kind, available):
+    if kind is not None:
+        where, params = where + ['e.kind = %s'], params + [kind]
+    if available is not None:
+        where, params = where + ['e.available = %s'], params + [available]
+    return where, params
+
+
+class SQLiteSearch:
+    def matches(self, terms, kind=None, available=None, name_only=False, prefix_all=False, whole_words=False):
+        """FROM and WHERE clauses (and their params) selecting the entries that match every term."""
+        table = 'api_searchentry_names' if name_only else 'api_searchentry_fts'
+        terms = prefixed(terms, prefix_all, whole_words)
+        expression = ' AND '.join(f'"{term}"' + ('*' if prefix else '') for term, prefix in terms)
+        where, params = filters([f'{table} MATCH %s'], [expression], kind, available)
+        return f"FROM {table} f JOIN api_searchentry e ON e.id = f.rowid WHERE {' AND '.join(where)}", params
+
+    def match(self, terms, limit, kind=None, available=None, name_only=False, prefix_all=False, whole_words=False, ranked=True):
+        """
+        Not BM25: it first counts every entry matching each term (for the IDF),
+        which costs more than this whole query for common words. Every
+        candidate matches every term, so the IDF is the same for all of them
+        and BM25's order comes down to the length of the matching field; that
+        is the score here, ranked or not.
+        """
+        clauses, params = self.matches(terms, kind, available, name_only, prefix_all, whole_words)
+        score = 'length(e.name)' if name_only else 'length(e.description)'
+        return list(SearchEntry.objects.raw(
+            f'SELECT {RESULT_FIELDS} FROM ('
+            f'SELECT f.rowid AS id, {score} AS score {clauses} ORDER BY f.rowid DESC LIMIT %s'
+            f') m JOIN api_searchentry e ON e.id = m.id ORDER BY m.score, e.name, e.id LIMIT %s',
+            params + [RANK_CANDIDATES, limit],
+        ))
+
+    def candidates(self, term):
+        """Indexed words that may be meant by ``term`` (prefixes of it first, else same first letter)."""
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT term, doc FROM api_searchentry_vocab WHERE term >= %s AND term < %s LIMIT 1',
+                [term, term + '\U0010ffff'],
+            )
+            rows = cursor.fetchall()
+        if rows:
+            return rows
+        return [(word, frequency) for word, frequency in self.words(term[0]) if len(word) >= len(term) - 2]
+
+    def words(self, letter):
+        """
+        ``(word, frequency)`` of every indexed word starting with ``letter``.
+        The vocabulary table counts each word's entries as it is read, so
+        this is cached for the catalog version.
+        """
+        key = f'search:words:{catalog_version()}:{letter}'
+        words = shared_cache().get(key)
+        if words is None:
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    'SELECT term, doc FROM api_searchentry_vocab WHERE term >= %s AND term < %s',
+                    [letter, letter + '\U0010ffff'],
+                )
+                words = cursor.fetchall()
+            shared_cache().set(key, words, cache_settings()['TIMEOUT'])
+        return words
+
+
+class PostgresSearch:
+    def matches(self, terms, kind=None, available=None, name_only=False, prefix_all=False, whole_words=False):
+        """FROM and WHERE clauses (and their params) selecting the entries that match every term."""
+        weight = 'A' if name_only else ''  # name lexemes carry weight A
+        labels = [('*' if prefix else '') + weight for _, prefix in prefixed(terms, prefix_all, whole_words)]
+        expression = ' & '.join(f'{term}:{label}' if label else term for term, label in zip(terms, labels))
+        where, params = filters(['e.document @@ q'], [], kind, available)
+        return f"FROM api_searchentry e, to_tsquery('simple', %s) q WHERE {' AND '.join(where)}", [expression] + params
+
+    def match(self, terms, limit, kind=None, available=None, name_only=False, prefix_all=False, whole_words=False, ranked=True):
+        clauses, params = self.matches(terms, kind, available, name_only, prefix_all, whole_words)
+        score = '-ts_rank_cd(e.document, q)' if ranked else 'length(e.name)'
+        return list(SearchEntry.objects.raw(
+            f'SELECT {RESULT_FIELDS} FROM ('
+            f'SELECT e.id, {score} AS score {clauses} ORDER BY e.id DESC LIMIT %s'
+            f') m JOIN api_searchentry e ON e.id = m.id ORDER BY m.score, e.name, e.id LIMIT %s',
+            params + [RANK_CANDIDATES, limit],
+        ))
+
+    def candidates(self, term):
+        """Words of the names most similar to ``term`` (trigram word similarity, served by the GIN index)."""
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT name FROM api_searchentry WHERE %s <%% name ORDER BY word_similarity(%s, name) DESC LIMIT 20',
+                [term, term],
+            )
+            return Counter(word for (name,) in cursor.fetchall() for word in search_terms(name)).items()
+
+
+BACKENDS = {'sqlite': SQLiteSearch(), 'postgresql': PostgresSearch()}
+
+
+def stages(terms, backend):
+    """
+    ``(terms, prefix_all)`` to try in turn: the query as typed, then every
+    word as a prefix, then with typos corrected (computed only if reached).
+    """
+    yield terms, False
+    if len(terms) > 1:
+        yield terms, True
+    corrected = [closest_word(term, backend.candidates(term)) or term for term in terms]
+    if corrected != terms:
+        yield corrected, True
+
+
+def search_catalog(query, limit=20, kind=None, available=None, autocomplete=False):
+    """
+    Rank the catalog entries matching every word of ``query``.
+
+    ``autocomplete`` matches names only. Returns ``SearchResults(entries,
+    corrected)``, where ``corrected`` is the query actually run if typos were
+    corrected, else None.
+    """
+    terms = search_terms(query)
+    if not terms:
+        return SearchResults([], None)
+    backend = BACKENDS[connection.vendor]
+    for words, prefix_all in stages(terms, backend):
+        entries = backend.match(words, limit, kind, available, name_only=True, prefix_all=prefix_all, ranked=not autocomplete)
+        for whole_words in () if autocomplete else (True, False):
+            if len(entries) >= limit:
+                break
+            found = {entry.id for entry in entries}
+            more = backend.match(words, limit, kind, available, prefix_all=prefix_all, whole_words=whole_words)
+            entries += [entry for entry in more if entry.id not in found][:limit - len(entries)]
+        if entries:
+            return SearchResults(entries, None if words == terms else ' '.join(words))
+    return SearchResults([], None)
+
+
+def matching_ids(query, kind=None):
+    """
+    Subquery of the ``object_id`` of every entry matching ``query`` (staged
+    like ``search_catalog``), for ``pk__in`` filters; None if nothing matches.
+    Unranked and uncapped, for admin changelists that sort and paginate
+    themselves.
+    """
+    terms = search_terms(query)
+    if not terms:
+        return None
+    backend = BACKENDS[connection.vendor]
+    for words, prefix_all in stages(terms, backend):
+        clauses, params = backend.matches(words, kind, prefix_all=prefix_all)
+        with connection.cursor() as cursor:
+            cursor.execute(f'SELECT 1 {clauses} LIMIT 1', params)
+            if cursor.fetchone():
+                return RawSQL(f'SELECT e.object_id {clauses}', params)
+    return None
@@ -0,0 +1,133 @@
+"""
+Synthetic data for benchmarks and local load tests (``manage.py seed``).
+
+Everything is written with ``bulk_create`` in batches, so seeding a few
+hundred thousand rows takes seconds rather than the minutes one ``save()``
+per row would. Bulk inserts bypass model signals, so the derived state they
+would have maintained (order status counters, the search index, the
+catalog version) is rebuilt at the end.
+"""
+import random
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Count
+
+from .catalog import bump_catalog_version
+from .hashing import make_password
+from .models import CartItem, MenuItem, Order, OrderLine, OrderStatusCount, Product, User
+from .search import rebuild_search_index
+
+DEFAULT_VOLUMES = {
+    'users': 200,
+    'products': 2000,
+    'menu_items': 200,
+    'cart_items': 2000,
+    'orders': 2000,
+}
+
+SEED_PASSWORD = 'seed-pass'
+
+DISHES = ('Adobo', 'Sinigang', 'Kare-kare', 'Lechon', 'Sisig', 'Pancit', 'Lumpia', 'Tinola', 'Bulalo', 'Halo-halo')
+WORDS = 'savory sweet crispy slow-cooked garlic tamarind coconut peanut calamansi smoky tender'.split()
+
+
+def scaled_volumes(scale=1.0, **overrides):
+    volumes = {name: max(1, int(count * scale)) for name, count in DEFAULT_VOLUMES.items()}
+    volumes.update((name, count) for name, count in overrides.items() if count is not None)
+    return volumes
+
+
+def seed_database(users, products, menu_items, cart_items, orders, batch_size=1000, seed=0):
+    """
+    Insert the given numbers of rows and return them as a dict of counts.
+
+    Every seeded user can log in as ``seed-user-<n>@example.com`` with
+    ``SEED_PASSWORD``; the password is hashed once and shared, since hashing
+    per row would dominate the run.
+    """
+    rng = random.Random(seed)
+    password = make_password(SEED_PASSWORD)
+
+    with transaction.atomic():
+        offset = User.objects.count()
+        user_rows = User.objects.bulk_create(
+            (
+                User(email=f'seed-user-{offset + i}@example.com', username=f'seed-user-{offset + i}', password=password)
+                for i in range(users)
+            ),
+            batch_size=batch_size,
+        )
+        product_rows = Product.objects.bulk_create(
+            (
+                Product(
+                    name=f'{rng.choice(DISHES)} #{i}',
+                    description=' '.join(rng.choices(WORDS, k=rng.randint(5, 40))),
+                    price=Decimal(rng.randint(2500, 50000)) / 100,
+                    available=rng.random() > 0.1,
+                )
+                for i in range(products)
+            ),
+            batch_size=batch_size,
+        )
+        menu_rows = MenuItem.objects.bulk_create(
+            (
+                MenuItem(name=f'{rng.choice(DISHES)} set #{i}', price=Decimal(rng.randint(5000, 90000)) / 100)
+                for i in range(menu_items)
+            ),
+            batch_size=batch_size,
+        )
+
+        # Distinct (user, product) pairs, as CartItem requires.
+        pairs = set()
+        cart_items = min(cart_items, len(user_rows) * len(product_rows))
+        while len(pairs) < cart_items:
+            pairs.add((rng.randrange(len(user_rows)), rng.randrange(len(product_rows))))
+        CartItem.objects.bulk_create(
+            (
+                CartItem(user=user_rows[u], product=product_rows[p], quantity=rng.randint(1, 5))
+                for u, p in sorted(pairs)
+            ),
+            batch_size=batch_size,
+        )
+
+        statuses = [choice for choice, _ in Order.Status.choices]
+        baskets = [
+            [(product, rng.randint(1, 3)) for product in rng.sample(product_rows, min(len(product_rows), rng.randint(1, 4)))]
+            for _ in range(orders if user_rows else 0)
+        ]
+        order_rows = Order.objects.bulk_create(
+            (
+                Order(
+                    user=rng.choice(user_rows),
+                    status=rng.choice(statuses),
+                    total=sum((product.price * quantity for product, quantity in basket), Decimal('0.00')),
+                )
+                for basket in baskets
+            ),
+            batch_size=batch_size,
+        )
+        lines = [
+            OrderLine(order=order, product=product, name=product.name, unit_price=product.price, quantity=quantity)
+            for order, basket in zip(order_rows, baskets)
+            for product, quantity in basket
+        ]
+        OrderLine.objects.bulk_create(lines, batch_size=batch_size)
+
+        counts = Order.objects.values('user_id', 'status').annotate(n=Count('id')).order_by()
+        OrderStatusCount.objects.bulk_create(
+            [OrderStatusCount(user_id=row['user_id'], status=row['status'], count=row['n']) for row in counts],
+            update_conflicts=True, unique_fields=['user', 'status'], update_fields=['count'],
+            batch_size=batch_size,
+        )
+        rebuild_search_index(batch_size=batch_size)
+        transaction.on_commit(bump_catalog_version)
+
+    return {
+        'users': len(user_rows),
+        'products': len(product_rows),
+        'menu_items': len(menu_rows),
+        'cart_items': len(pairs),
+        'orders': len(order_rows),
+        'order_lines': len(lines),
+    }
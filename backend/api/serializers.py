@@ -1,6 +1,9 @@
 from rest_framework import serializers
-from django.contrib.auth.hashers import make_password
+from .hashing import make_password
+from rest_framework_simplejwt.serializers import TokenRefreshSerializer
+from .authentication import ClaimsRefreshToken
 from .models import User, Product
+from .images import image_urls
 
 class UserSerializer(serializers.ModelSerializer):
     class Meta:
@@ -13,19 +16,107 @@ class UserSerializer(serializers.ModelSerializer):
         return super().create(validated_data)
 
 
-class ProductSerializer(serializers.ModelSerializer):
+class SparseFieldsetMixin:
+    """Drop every field not named in the ``fields`` keyword argument."""
+
+    def __init__(self, *args, **kwargs):
+        fields = kwargs.pop('fields', None)
+        super().__init__(*args, **kwargs)
+        if fields is not None:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+
+
+class ProductSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
+    images = serializers.SerializerMethodField()
+
+    # Model columns behind fields that are not columns themselves (for ``?fields=`` projection).
+    field_columns = {'images': ('image', 'image_variants')}
+
     class Meta:
         model = Product
-        fields = '__all__'
+        exclude = ['image', 'image_variants']
+
+    def get_images(self, product):
+        return image_urls(product)
 
 from rest_framework import serializers
-from .models import CartItem
+from .models import CartItem, Order, OrderLine, SearchEntry
 
 class CartItemSerializer(serializers.ModelSerializer):
     product_name = serializers.ReadOnlyField(source='product.name')
     product_price = serializers.ReadOnlyField(source='product.price')
     product_image = serializers.ReadOnlyField(source='product.image_url')
+    # Only present when the queryset is annotated (see api.cart.cart_lines).
+    line_total = serializers.DecimalField(max_digits=12, decimal_places=2, read_only=True)
 
     class Meta:
         model = CartItem
-        fields = ['id', 'product', 'product_name', 'product_price', 'product_image', 'quantity']
+        fields = ['id', 'product', 'product_name', 'product_price', 'product_image', 'quantity', 'line_total']
+
+
+class CartSummarySerializer(serializers.Serializer):
+    items = CartItemSerializer(many=True)
+    item_count = serializers.IntegerField()
+    total = serializers.DecimalField(max_digits=12, decimal_places=2)
+
+
+class CartDeltaSerializer(serializers.Serializer):
+    product_id = serializers.IntegerField()
+    quantity = serializers.IntegerField(default=1, min_value=-1000, max_value=1000)
+
+
+class CartAddSerializer(CartDeltaSerializer):
+    quantity = serializers.IntegerField(default=1, min_value=1, max_value=1000)
+
+
+class OrderLineSerializer(serializers.ModelSerializer):
+    line_total = serializers.DecimalField(max_digits=12, decimal_places=2, read_only=True)
+
+    class Meta:
+        model = OrderLine
+        fields = ['id', 'product', 'name', 'unit_price', 'quantity', 'line_total']
+
+
+class OrderSerializer(serializers.ModelSerializer):
+    lines = OrderLineSerializer(many=True, read_only=True)
+
+    class Meta:
+        model = Order
+        fields = ['id', 'status', 'total', 'created_at', 'lines', 'items']
+        read_only_fields = ['items']
+
+
+class OrderStatusSerializer(serializers.Serializer):
+    status = serializers.ChoiceField(choices=Order.Status.choices)
+
+
+class SearchQuerySerializer(serializers.Serializer):
+    q = serializers.CharField(max_length=200, trim_whitespace=True)
+    type = serializers.ChoiceField(choices=SearchEntry.Kind.choices, required=False)
+    available = serializers.BooleanField(required=False, allow_null=True, default=None)
+    limit = serializers.IntegerField(required=False, min_value=1, max_value=50)
+
+
+class CatalogFileQuerySerializer(serializers.Serializer):
+    # Not ``format``: DRF reserves that query parameter for picking a renderer.
+    file_format = serializers.ChoiceField(choices=['csv', 'jsonl'], required=False)
+    type = serializers.ChoiceField(choices=SearchEntry.Kind.choices, required=False)
+
+
+class SearchResultSerializer(serializers.ModelSerializer):
+    type = serializers.CharField(source='kind')
+    id = serializers.IntegerField(source='object_id')
+
+    class Meta:
+        model = SearchEntry
+        fields = ['type', 'id', 'name', 'description', 'price', 'available']
+
+
+class SearchSuggestionSerializer(SearchResultSerializer):
+    class Meta(SearchResultSerializer.Meta):
+        fields = ['type', 'id', 'name']
+
+
+class ClaimsTokenRefreshSerializer(TokenRefreshSerializer):
+    token_class = ClaimsRefreshToken
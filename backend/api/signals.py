@@ -0,0 +1,95 @@
+from functools import partial
+
+from django.conf import settings
+from django.db import transaction
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_delete, post_init, post_save
+from django.dispatch import receiver
+
+from .authentication import user_status
+from .catalog import bump_catalog_version
+from .events import publish_status_change
+from .jobs import schedule_catalog_warmup
+from .middleware import observe_query
+from .models import MenuItem, Order, Product, User
+from .orders import adjust_status_counts, recount_statuses
+from .search import index_object, unindex_object
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+@receiver(post_save, sender=MenuItem)
+@receiver(post_delete, sender=MenuItem)
+def invalidate_catalog(sender, **kwargs):
+    """
+    Any catalog write (API, admin or shell) invalidates cached catalog pages,
+    once it commits: bumping earlier would let a concurrent reader cache the
+    pre-commit rows under the new version, and the warmup could run too soon.
+    """
+    transaction.on_commit(bump_catalog_version)
+    transaction.on_commit(schedule_catalog_warmup)
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_save, sender=MenuItem)
+def index_catalog_item(sender, instance, **kwargs):
+    index_object(instance)
+
+
+@receiver(post_delete, sender=Product)
+@receiver(post_delete, sender=MenuItem)
+def unindex_catalog_item(sender, instance, **kwargs):
+    unindex_object(instance)
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def forget_user_status(sender, instance, **kwargs):
+    """Drop this worker's cached active flag; other workers catch up within the TTL."""
+    user_status.forget(instance.pk)
+
+
+@receiver(post_init, sender=Order)
+def remember_order_status(sender, instance, **kwargs):
+    # Read from __dict__ so a deferred status is not fetched just to track it.
+    instance._saved_status = instance.__dict__.get('status')
+
+
+@receiver(post_save, sender=Order)
+def track_order_status(sender, instance, created, **kwargs):
+    """
+    Keep ``OrderStatusCount`` in step with order creates and status changes,
+    and publish the change to SSE subscribers once the transaction commits.
+    """
+    old, new = (None if created else instance._saved_status), instance.status
+    if created:
+        adjust_status_counts(instance.user_id, {new: 1})
+    elif old is None:
+        recount_statuses(instance.user_id)
+    elif old != new:
+        adjust_status_counts(instance.user_id, {old: -1, new: 1})
+    if created or old != new:
+        transaction.on_commit(partial(publish_status_change, instance.pk, instance.user_id, new, old))
+    instance._saved_status = new
+
+
+@receiver(post_delete, sender=Order)
+def uncount_order_status(sender, instance, **kwargs):
+    adjust_status_counts(instance.user_id, {instance.status: -1})
+
+
+@receiver(connection_created)
+def instrument_connection(sender, connection, **kwargs):
+    """Let the request metrics middleware observe this connection's queries."""
+    if observe_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(observe_query)
+
+
+@receiver(connection_created)
+def configure_sqlite(sender, connection, **kwargs):
+    """Apply ``SQLITE_PRAGMAS`` to each new SQLite connection."""
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        for pragma, value in getattr(settings, 'SQLITE_PRAGMAS', {}).items():
+            cursor.execute(f'PRAGMA {pragma} = {value}')
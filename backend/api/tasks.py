@@ -0,0 +1,193 @@
+"""
+A small database-backed task queue for work that should not run inside a request.
+
+Functions are registered with ``@task`` and queued with ``enqueue()``; the
+row is written in the caller's transaction, so a task is only ever visible
+to workers if the request that queued it committed. ``manage.py run_worker``
+claims due rows, runs them on a thread pool and retries failures with
+exponential backoff. Several worker processes may run side by side: claims
+are conditional updates, so each task is handed to exactly one of them.
+"""
+import logging
+import os
+import random
+import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, close_old_connections, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from . import metrics
+from .models import Task
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'THREADS': 4,          # tasks run concurrently per worker process
+    'POLL_INTERVAL': 1.0,  # seconds an idle worker sleeps between claims
+    'LEASE': 300,          # seconds before a task held by a dead worker is retried
+    'MAX_ATTEMPTS': 3,
+    'BACKOFF': 5,          # first retry delay in seconds, doubled per attempt ...
+    'BACKOFF_MAX': 600,    # ... up to this cap
+    'PERIODIC': {},        # task name -> interval in seconds
+}
+
+TASKS = {}
+
+enqueued = metrics.counter('tasks_enqueued_total', 'Tasks added to the queue.')
+succeeded = metrics.counter('tasks_succeeded_total', 'Tasks that completed.')
+retried = metrics.counter('tasks_retried_total', 'Task attempts that failed and were rescheduled.')
+failed = metrics.counter('tasks_failed_total', 'Tasks that failed on their last attempt.')
+duration = metrics.histogram('task_duration_seconds', 'Time spent running a task.')
+queue_delay = metrics.histogram('task_queue_delay_seconds', 'Time from a task being due to a worker starting it.')
+queued = metrics.gauge('tasks_queued', 'Tasks waiting to run, as of the last claim.')
+
+
+def queue_settings():
+    return {**DEFAULTS, **getattr(settings, 'TASK_QUEUE', {})}
+
+
+def task(name=None, max_attempts=None):
+    """Register a function as a task. Its keyword arguments must be JSON-serializable."""
+    def register(func):
+        func.task_name = name or func.__name__
+        func.max_attempts = max_attempts
+        TASKS[func.task_name] = func
+        return func
+    return register
+
+
+def enqueue(name, delay=0, unique_key=None, **kwargs):
+    """
+    Queue task ``name`` to run with ``kwargs`` after ``delay`` seconds.
+
+    With ``unique_key``, nothing is queued while a task with the same key is
+    still waiting, so bursts of triggers (e.g. many product edits) coalesce
+    into one run. Returns the new ``Task`` or None if it was coalesced.
+    """
+    func = TASKS[name]
+    row = Task(
+        name=name,
+        kwargs=kwargs,
+        unique_key=unique_key,
+        max_attempts=func.max_attempts or queue_settings()['MAX_ATTEMPTS'],
+        run_at=timezone.now() + timedelta(seconds=delay),
+    )
+    if unique_key is None:
+        row.save()
+    else:
+        try:
+            with transaction.atomic():
+                row.save()
+        except IntegrityError:
+            return None
+    enqueued.inc()
+    return row
+
+
+def backoff(attempts):
+    """Delay before retry number ``attempts``: exponential, capped, with jitter."""
+    options = queue_settings()
+    delay = min(options['BACKOFF'] * 2 ** (attempts - 1), options['BACKOFF_MAX'])
+    return delay * random.uniform(0.5, 1.0)
+
+
+class Worker:
+    """
+    Claims due tasks and runs them on a thread pool.
+
+    ``run()`` loops until stopped; ``run(burst=True)`` returns as soon as no
+    task is due, which is what tests and one-off cron invocations use.
+    """
+
+    def __init__(self, threads=None, name=None):
+        options = queue_settings()
+        self.threads = threads or options['THREADS']
+        self.name = name or f'{socket.gethostname()}:{os.getpid()}:{id(self):x}'
+        self.poll_interval = options['POLL_INTERVAL']
+        self.lease = timedelta(seconds=options['LEASE'])
+        self.periodic = options['PERIODIC']
+        self._next_periodic = {}
+        self._stop = threading.Event()
+
+    def stop(self):
+        self._stop.set()
+
+    def run(self, burst=False):
+        with ThreadPoolExecutor(self.threads, thread_name_prefix='task') as pool:
+            running = set()
+            while not self._stop.is_set():
+                self.schedule_periodic()
+                running = {future for future in running if not future.done()}
+                claimed = self.claim(self.threads - len(running)) if len(running) < self.threads else []
+                for row in claimed:
+                    running.add(pool.submit(self.execute, row))
+                if not claimed:
+                    if burst and not running:
+                        break
+                    self._stop.wait(self.poll_interval if not running else 0.01)
+
+    def claim(self, limit):
+        """Mark up to ``limit`` due tasks as ours and return them."""
+        now = timezone.now()
+        due = Q(status=Task.Status.QUEUED, run_at__lte=now) | Q(status=Task.Status.RUNNING, locked_at__lt=now - self.lease)
+        ids = list(Task.objects.filter(due).order_by('run_at', 'id').values_list('id', flat=True)[:limit])
+        if not ids:
+            queued.set(0)
+            return []
+        # The status/lease check is repeated in the UPDATE, so when workers race
+        # for the same rows each row is won by exactly one of them.
+        Task.objects.filter(due, id__in=ids).update(
+            status=Task.Status.RUNNING, locked_at=now, locked_by=self.name, attempts=F('attempts') + 1,
+        )
+        claimed = list(Task.objects.filter(id__in=ids, status=Task.Status.RUNNING, locked_by=self.name, locked_at=now))
+        queued.set(Task.objects.filter(status=Task.Status.QUEUED, run_at__lte=now).count())
+        return claimed
+
+    def execute(self, row):
+        close_old_connections()
+        queue_delay.observe(max(0.0, (row.locked_at - row.run_at).total_seconds()))
+        start = time.perf_counter()
+        try:
+            func = TASKS[row.name]
+            func(**row.kwargs)
+        except Exception as e:
+            duration.observe(time.perf_counter() - start)
+            self.record_failure(row, e)
+        else:
+            duration.observe(time.perf_counter() - start)
+            Task.objects.filter(id=row.id, locked_by=self.name).update(
+                status=Task.Status.DONE, finished_at=timezone.now(), last_error='',
+            )
+            succeeded.inc()
+        finally:
+            close_old_connections()
+
+    def record_failure(self, row, error):
+        message = f'{type(error).__name__}: {error}'
+        if row.attempts < row.max_attempts:
+            retried.inc()
+            logger.warning('Task %s #%s failed (attempt %s/%s), retrying: %s', row.name, row.id, row.attempts, row.max_attempts, message)
+            Task.objects.filter(id=row.id, locked_by=self.name).update(
+                status=Task.Status.QUEUED, run_at=timezone.now() + timedelta(seconds=backoff(row.attempts)),
+                locked_at=None, last_error=message,
+            )
+        else:
+            failed.inc()
+            logger.error('Task %s #%s failed permanently: %s', row.name, row.id, message, exc_info=error)
+            Task.objects.filter(id=row.id, locked_by=self.name).update(
+                status=Task.Status.FAILED, finished_at=timezone.now(), last_error=message,
+            )
+
+    def schedule_periodic(self):
+        """Queue each ``PERIODIC`` task when its interval has passed (coalesced across workers)."""
+        now = time.monotonic()
+        for name, interval in self.periodic.items():
+            if self._next_periodic.get(name, 0) <= now:
+                enqueue(name, unique_key=f'periodic:{name}')
+                self._next_periodic[name] = now + interval
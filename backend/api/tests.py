@@ -1,3 +1,1602 @@
-from django.test import TestCase
+import asyncio
+import gzip
+import io
+import json
+import logging
+import os
+import shutil
+import tempfile
+import threading
+import time
+from datetime import timedelta
+from importlib import import_module
+from decimal import Decimal
+from io import StringIO
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.apps import apps as django_apps
+from django.contrib.admin import site as admin_site
+from django.core import mail
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.db.models.functions import Lower
+from django.contrib.auth.hashers import identify_hasher, make_password
+from django.test.utils import CaptureQueriesContext
+from django.test import AsyncClient, RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.http import Http404, HttpResponse
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from .backends import PooledHashBackend
+from .benchmarks import compare, missed_targets
+from .authentication import ClaimsJWTAuthentication, ClaimsRefreshToken, user_status
+from .blacklist import blacklist_index, prune_expired_tokens
+from .cart import apply_cart_deltas, cart_cache, cart_lines, check_cart_cache
+from .catalog import CatalogCache, bump_catalog_version, catalog_cache, catalog_version
+from .catalog_io import import_catalog
+from .compression import check_encodings, compress_response, compressed_cache, negotiate
+from .hashing import HashingBusy, HashPool
+from .images import Image, InvalidImage, attach_image, check_pillow, hashed_name, media_headers, sniff_format
+from .jobs import generate_image_variants
+from .logs import JSONFormatter, RedactFilter, SampleFilter, configure, stop_listeners
+from .models import CartItem, MenuItem, Order, OrderLine, OrderStatusCount, Product, SearchEntry, Task, User
+from .events import LocalBroker, get_broker, publish_status_change, user_channel
+from .orders import checkout, status_counts, transition
+from .tasks import Worker, enqueue, task
+from .throttling import CacheStore, LocalStore, get_store, parse_rate, sliding_window, token_bucket
+from . import metrics, tasks
+from .pagination import EstimatedCountPaginator, KeysetPagination
+from .renderers import JSONRenderer, check_encoder, orjson
+from .search import closest_word, edit_distance, matching_ids, rebuild_search_index, search_catalog
+from .seed import scaled_volumes
+from .views import UserDetailView, filter_products
+
+
+class ProductListViewTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        catalog_cache.clear()
+        self.client = APIClient()
+        self.url = reverse('product-list')
+        for i in range(5):
+            Product.objects.create(
+                name=f'Dish {i}', description='x' * 500, price=Decimal(10 + i),
+                available=i % 2 == 0,
+            )
+
+    def test_keyset_pagination_walks_whole_catalog(self):
+        seen = []
+        url = f'{self.url}?page_size=2'
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            seen += [row['id'] for row in response.json()['results']]
+            url = response.json()['next']
+        self.assertEqual(seen, list(Product.objects.order_by('created_at', 'id').values_list('id', flat=True)))
+
+    def test_filters(self):
+        response = self.client.get(self.url, {'available': 'true', 'min_price': '11', 'max_price': '14'})
+        self.assertEqual([row['name'] for row in response.json()['results']], ['Dish 2', 'Dish 4'])
+
+    def test_invalid_filter_is_rejected(self):
+        self.assertEqual(self.client.get(self.url, {'min_price': 'abc'}).status_code, 400)
+        self.assertEqual(self.client.get(self.url, {'fields': 'id,secret'}).status_code, 400)
+
+    def test_sparse_fieldset(self):
+        response = self.client.get(self.url, {'fields': 'id,name,price'})
+        self.assertEqual(set(response.json()['results'][0]), {'id', 'name', 'price'})
+
+    def test_etag_revalidation(self):
+        response = self.client.get(self.url)
+        etag = response['ETag']
+
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Product.objects.filter(name='Dish 0').first().save()
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_etag_varies_with_query(self):
+        self.assertNotEqual(
+            self.client.get(self.url)['ETag'],
+            self.client.get(self.url, {'available': 'true'})['ETag'],
+        )
+
+
+class CatalogCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        catalog_cache.clear()
+        self.client = APIClient()
+        self.url = reverse('product-list')
+        Product.objects.create(name='Adobo', price=Decimal('120.00'))
+
+    def test_second_request_is_served_without_queries(self):
+        first = self.client.get(self.url)
+        with self.assertNumQueries(0):
+            second = self.client.get(self.url)
+        self.assertEqual(first.content, second.content)
+        self.assertEqual(second['ETag'], first['ETag'])
+
+    def test_writes_invalidate(self):
+        self.client.get(self.url)
+        with self.captureOnCommitCallbacks(execute=True):
+            Product.objects.create(name='Sinigang', price=Decimal('150.00'))
+        names = [row['name'] for row in self.client.get(self.url).json()['results']]
+        self.assertEqual(names, ['Adobo', 'Sinigang'])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Product.objects.get(name='Adobo').delete()
+        names = [row['name'] for row in self.client.get(self.url).json()['results']]
+        self.assertEqual(names, ['Sinigang'])
+
+    def test_menu_item_writes_bump_version(self):
+        version = catalog_version()
+        with self.captureOnCommitCallbacks(execute=True):
+            MenuItem.objects.create(name='Halo-halo', price=Decimal('80.00'))
+            self.assertEqual(catalog_version(), version)  # not before the write commits
+        self.assertNotEqual(catalog_version(), version)
+
+    def test_lru_eviction_and_counters(self):
+        lru = CatalogCache(max_entries=2)
+        for variant in 'abc':
+            lru.get_or_render('1', variant, lambda: variant.encode())
+        self.assertEqual(lru.get_or_render('1', 'c', lambda: b'stale'), b'c')
+        self.assertEqual(lru.stats()['size'], 2)
+        self.assertGreaterEqual(lru.evictions.value, 1)
+
+    def test_concurrent_misses_render_once(self):
+        lru = CatalogCache()
+        calls = []
+
+        def render():
+            calls.append(1)
+            time.sleep(0.05)
+            return b'page'
+
+        threads = [threading.Thread(target=lru.get_or_render, args=('v', 'single-flight', render)) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(calls), 1)
+
+
+class CartReadTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(email='juan@example.com', username='juan', password='pw')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def fill_cart(self, lines):
+        products = Product.objects.bulk_create(
+            Product(name=f'Dish {i}', price=Decimal('12.50')) for i in range(lines)
+        )
+        CartItem.objects.bulk_create(
+            CartItem(user=self.user, product=product, quantity=2) for product in products
+        )
+
+    def test_summary_totals_come_from_database(self):
+        self.fill_cart(3)
+        response = self.client.get(reverse('cart-summary'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['item_count'], 6)
+        self.assertEqual(response.data['total'], '75.00')
+        self.assertEqual([line['line_total'] for line in response.data['items']], ['25.00'] * 3)
+
+    def test_empty_cart_summary(self):
+        response = self.client.get(reverse('cart-summary'))
+        self.assertEqual(response.data, {'items': [], 'item_count': 0, 'total': '0.00'})
+
+    def test_query_count_does_not_grow_with_cart_size(self):
+        for url in (reverse('cart'), reverse('cart-summary')):
+            CartItem.objects.all().delete()
+            self.fill_cart(1)
+            cache.clear()  # measure the database path, not the cart snapshot cache
+            with self.assertNumQueries(1):
+                self.client.get(url)
+            self.fill_cart(25)
+            cache.clear()
+            with self.assertNumQueries(1):
+                response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+
+
+class CartMutationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(email='maria@example.com', username='maria', password='pw')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.adobo = Product.objects.create(name='Adobo', price=Decimal('120.00'))
+        self.pancit = Product.objects.create(name='Pancit', price=Decimal('90.00'))
+
+    def quantities(self):
+        return dict(CartItem.objects.filter(user=self.user).values_list('product_id', 'quantity'))
+
+    def test_bulk_update_applies_all_deltas(self):
+        CartItem.objects.create(user=self.user, product=self.adobo, quantity=2)
+        response = self.client.post(reverse('cart-update'), [
+            {'product_id': self.adobo.id, 'quantity': 3},
+            {'product_id': self.pancit.id, 'quantity': 1},
+            {'product_id': self.pancit.id, 'quantity': 1},
+        ], format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.quantities(), {self.adobo.id: 5, self.pancit.id: 2})
+        self.assertEqual(response.data['item_count'], 7)
+
+    def test_negative_delta_removes_line(self):
+        CartItem.objects.create(user=self.user, product=self.adobo, quantity=2)
+        self.client.post(reverse('cart-update'), [{'product_id': self.adobo.id, 'quantity': -5}], format='json')
+        self.assertEqual(self.quantities(), {})
+
+    def test_unknown_product_rejects_whole_batch(self):
+        response = self.client.post(reverse('cart-update'), [
+            {'product_id': self.adobo.id, 'quantity': 1},
+            {'product_id': 999999, 'quantity': 1},
+        ], format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.quantities(), {})
+
+    def test_query_count_is_independent_of_batch_size(self):
+        products = Product.objects.bulk_create(Product(name=f'Dish {i}', price=Decimal('1.00')) for i in range(30))
+        with self.assertNumQueries(4 + 2):  # validate, insert, update, delete + savepoint pair
+            apply_cart_deltas(self.user, [(product.id, 1) for product in products])
+
+
+class ConcurrentCartTests(TransactionTestCase):
+    def test_concurrent_increments_are_not_lost(self):
+        user = User.objects.create_user(email='rush@example.com', username='rush', password='pw')
+        product = Product.objects.create(name='Lechon', price=Decimal('300.00'))
+        threads, rounds = 8, 10
+
+        def worker():
+            try:
+                for _ in range(rounds):
+                    apply_cart_deltas(user, [(product.id, 1)])
+            finally:
+                connection.close()
+
+        pool = [threading.Thread(target=worker) for _ in range(threads)]
+        for thread in pool:
+            thread.start()
+        for thread in pool:
+            thread.join()
+        self.assertEqual(CartItem.objects.get(user=user, product=product).quantity, threads * rounds)
+
+
+class CartCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(email='ana@example.com', username='ana', password='pw')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.product = Product.objects.create(name='Kare-kare', price=Decimal('200.00'))
+
+    def mutate(self, method, url, data=None):
+        # Snapshots are invalidated on commit, which TestCase otherwise never reaches.
+        with self.captureOnCommitCallbacks(execute=True):
+            return getattr(self.client, method)(url, data, format='json')
+
+    def test_second_read_performs_no_queries(self):
+        self.mutate('post', reverse('cart-add'), {'product_id': self.product.id, 'quantity': 2})
+        for url in (reverse('cart'), reverse('cart-summary')):
+            first = self.client.get(url)
+            hits = cart_cache.hits.value
+            with self.assertNumQueries(0):
+                second = self.client.get(url)
+            self.assertEqual(first.data, second.data)
+            self.assertEqual(cart_cache.hits.value, hits + 1)
+
+    def test_add_reports_created_or_updated_and_rejects_non_positive_quantities(self):
+        url = reverse('cart-add')
+        self.assertEqual(self.mutate('post', url, {'product_id': self.product.id, 'quantity': 2}).status_code, 201)
+        response = self.mutate('post', url, {'product_id': self.product.id})
+        self.assertEqual((response.status_code, response.data['quantity']), (200, 3))
+        for quantity in (0, -3):
+            self.assertEqual(self.mutate('post', url, {'product_id': self.product.id, 'quantity': quantity}).status_code, 400)
+        self.assertEqual(self.mutate('post', url, {'product_id': 999999}).status_code, 404)
+        self.assertEqual(CartItem.objects.get(user=self.user).quantity, 3)
+
+    def test_deploy_check_warns_about_a_per_process_cache(self):
+        self.assertEqual([w.id for w in check_cart_cache(None)], ['api.W004'])
+        location = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, location)
+        shared = {'default': {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': location}}
+        with override_settings(CACHES=shared):
+            self.assertEqual(check_cart_cache(None), [])
+
+    def test_mutations_invalidate_snapshot(self):
+        self.mutate('post', reverse('cart-add'), {'product_id': self.product.id})
+        self.assertEqual(self.client.get(reverse('cart-summary')).data['item_count'], 1)
+
+        self.mutate('post', reverse('cart-add'), {'product_id': self.product.id})
+        self.assertEqual(self.client.get(reverse('cart-summary')).data['item_count'], 2)
+
+        self.product.price = Decimal('10.00')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product.save()
+        self.assertEqual(self.client.get(reverse('cart-summary')).data['total'], '20.00')
+
+        response = self.mutate('delete', reverse('cart-remove', args=[self.product.id]))
+        self.assertEqual(response.status_code, 204)
+        self.assertEqual(self.client.get(reverse('cart')).data, [])
+        self.assertEqual(self.mutate('delete', reverse('cart-remove', args=[self.product.id])).status_code, 404)
+
+
+@mock.patch.object(UserDetailView, 'authentication_classes', [ClaimsJWTAuthentication])
+class ClaimsAuthenticationTests(TestCase):
+    def setUp(self):
+        user_status.clear()
+        self.user = User.objects.create_user(email='pedro@example.com', username='pedro', password='pw')
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {ClaimsRefreshToken.for_user(self.user).access_token}')
+
+    def test_user_is_built_from_claims(self):
+        self.client.get(reverse('user-detail'))  # first request primes the status cache
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse('user-detail'))
+        self.assertEqual(response.data, {'id': self.user.id, 'username': 'pedro', 'email': 'pedro@example.com'})
+
+    def test_deactivated_user_is_rejected(self):
+        self.assertEqual(self.client.get(reverse('user-detail')).status_code, 200)
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self.client.get(reverse('user-detail')).status_code, 401)
+
+    def test_staff_status_is_read_from_the_database_not_the_token(self):
+        self.user.is_staff = True
+        self.user.save()
+        authentication = ClaimsJWTAuthentication()
+        token = authentication.get_validated_token(str(ClaimsRefreshToken.for_user(self.user).access_token))
+        self.assertTrue(authentication.get_user(token).is_staff)
+        self.user.is_staff = False
+        self.user.save()
+        self.assertFalse(authentication.get_user(token).is_staff)
+
+    def test_token_without_claims_is_rejected(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(self.user).access_token}')
+        self.assertEqual(self.client.get(reverse('user-detail')).status_code, 401)
+
+
+class TokenBlacklistTests(TestCase):
+    def setUp(self):
+        blacklist_index.reset()
+        self.user = User.objects.create_user(email='rosa@example.com', username='rosa', password='pw')
+        self.refresh = ClaimsRefreshToken.for_user(self.user)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {self.refresh.access_token}')
+
+    def test_rotation_rejects_reused_refresh_token(self):
+        response = self.client.post(reverse('token-refresh'), {'refresh': str(self.refresh)})
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('email', RefreshToken(response.data['refresh']).payload)
+
+        response = self.client.post(reverse('token-refresh'), {'refresh': str(self.refresh)})
+        self.assertEqual(response.status_code, 401)
+
+    def test_logout_blacklists_and_checks_skip_the_database(self):
+        response = self.client.post(reverse('logout'), {'refresh': str(self.refresh)})
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(self.refresh['jti'], blacklist_index)
+        with self.assertNumQueries(0):
+            self.assertIn(self.refresh['jti'], blacklist_index)
+
+    def test_blacklist_written_elsewhere_is_authoritative(self):
+        # Another worker blacklisted the token; this worker's index has not synced yet.
+        blacklist_index.sync(force=True)
+        RefreshToken(str(self.refresh)).blacklist()
+        response = self.client.post(reverse('logout'), {'refresh': str(self.refresh)})
+        self.assertEqual(response.status_code, 400)
+
+    def test_prune_expired_tokens_in_batches(self):
+        expired = timezone.now() - timedelta(days=1)
+        tokens = OutstandingToken.objects.bulk_create(
+            OutstandingToken(user=self.user, jti=f'old-{i}', token='x', expires_at=expired) for i in range(7)
+        )
+        BlacklistedToken.objects.bulk_create(BlacklistedToken(token=token) for token in tokens[:3])
+
+        self.assertEqual(prune_expired_tokens(batch_size=3), 7)
+        self.assertEqual(OutstandingToken.objects.count(), 1)  # self.refresh is still valid
+        self.assertEqual(BlacklistedToken.objects.count(), 0)
+
+    def test_prune_command(self):
+        call_command('prune_tokens', batch_size=10, stdout=StringIO())
+        self.assertEqual(OutstandingToken.objects.count(), 1)
+
+
+class PasswordHashingTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create(
+            email='lito@example.com', username='lito',
+            password=make_password('correct horse', hasher='pbkdf2_sha256'),
+        )
+
+    def login(self, password):
+        return self.client.post(reverse('login'), {'email': 'lito@example.com', 'password': password}, format='json')
+
+    def test_legacy_hash_is_upgraded_on_login(self):
+        self.assertEqual(self.login('correct horse').status_code, 200)
+        self.user.refresh_from_db()
+        self.assertEqual(identify_hasher(self.user.password).algorithm, 'scrypt')
+        self.assertEqual(self.login('correct horse').status_code, 200)
+
+    def test_wrong_password_is_not_upgraded(self):
+        self.assertEqual(self.login('wrong').status_code, 400)
+        self.user.refresh_from_db()
+        self.assertEqual(identify_hasher(self.user.password).algorithm, 'pbkdf2_sha256')
+
+    def test_non_string_credentials_are_invalid(self):
+        for body in ({'email': 1, 'password': 'x'}, {'email': ['lito@example.com'], 'password': 'x'},
+                     {'email': 'lito@example.com', 'password': {'p': 1}}, {}):
+            response = self.client.post(reverse('login'), body, format='json')
+            self.assertEqual(response.status_code, 400, body)
+
+    def test_saturated_pool_fails_fast(self):
+        with mock.patch('api.views.authenticate', side_effect=HashingBusy):
+            response = self.login('correct horse')
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response['Retry-After'], '1')
+
+    @override_settings(PASSWORD_HASHING={'MAX_WORKERS': 1, 'QUEUE_TIMEOUT': 0.05})
+    def test_pool_caps_concurrent_hashes(self):
+        pool = HashPool()
+        release = threading.Event()
+        try:
+            blocked = pool.submit(release.wait)
+            with self.assertRaises(HashingBusy):
+                pool.submit(lambda: None)
+            release.set()
+            blocked.result()
+            self.assertEqual(pool.run(lambda: 42), 42)
+        finally:
+            release.set()
+            pool.shutdown()
+
+
+class AsyncViewTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        catalog_cache.clear()
+        self.user = User.objects.create_user(email='nena@example.com', username='nena', password='pw')
+        self.product = Product.objects.create(name='Bibingka', price=Decimal('45.00'))
+        CartItem.objects.create(user=self.user, product=self.product, quantity=3)
+        token = ClaimsRefreshToken.for_user(self.user).access_token
+        self.client = AsyncClient()
+        self.auth = {'Authorization': f'Bearer {token}'}
+
+    async def test_product_list_matches_sync_view(self):
+        response = await self.client.get(reverse('async-product-list'), {'fields': 'id,name,price'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['results'], [{'id': self.product.id, 'name': 'Bibingka', 'price': '45.00'}])
+
+        catalog_cache.clear()
+        cache.clear()
+        sync = await self.client.get(reverse('product-list'), {'fields': 'id,name,price'})
+        self.assertEqual(sync.content, response.content)
+
+    async def test_product_list_revalidation_and_errors(self):
+        response = await self.client.get(reverse('async-product-list'))
+        again = await self.client.get(reverse('async-product-list'), headers={'If-None-Match': response['ETag']})
+        self.assertEqual(again.status_code, 304)
+        self.assertEqual((await self.client.get(reverse('async-product-list'), {'min_price': 'x'})).status_code, 400)
+        self.assertEqual((await self.client.post(reverse('async-product-list'))).status_code, 405)
+
+    async def test_cart_and_user_detail(self):
+        response = await self.client.get(reverse('async-cart'), headers=self.auth)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()[0]['quantity'], 3)
+        self.assertEqual(response.json()[0]['line_total'], '135.00')
+
+        response = await self.client.get(reverse('async-user-detail'), headers=self.auth)
+        self.assertEqual(response.json(), {'id': self.user.id, 'username': 'nena', 'email': 'nena@example.com'})
+
+    async def test_authentication_required(self):
+        response = await self.client.get(reverse('async-cart'))
+        self.assertEqual(response.status_code, 401)
+        response = await self.client.get(reverse('async-user-detail'), headers={'Authorization': 'Bearer nonsense'})
+        self.assertEqual(response.status_code, 401)
+
+
+class DatabaseProfileTests(TestCase):
+    def test_sqlite_connections_get_pragmas(self):
+        if connection.vendor != 'sqlite':
+            self.skipTest('SQLite only')
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA journal_mode')
+            self.assertEqual(cursor.fetchone()[0], 'wal')
+            cursor.execute('PRAGMA synchronous')
+            self.assertEqual(cursor.fetchone()[0], 1)  # NORMAL
+            cursor.execute('PRAGMA busy_timeout')
+            self.assertEqual(cursor.fetchone()[0], 20000)
+
+
+class QueryPlanTests(TestCase):
+    """The hot queries must be index range scans on a realistically sized dataset."""
+    ROWS = 100_000
+
+    @classmethod
+    def setUpTestData(cls):
+        users = User.objects.bulk_create(
+            User(email=f'diner{i}@example.com', username=f'diner{i}', password='!') for i in range(1000)
+        )
+        Product.objects.bulk_create(
+            (Product(name=f'Dish {i}', price=Decimal('10.00'), available=i % 4 != 0) for i in range(cls.ROWS)),
+            batch_size=5000,
+        )
+        Order.objects.bulk_create(
+            (Order(user=users[i % len(users)], status=('pending', 'preparing', 'ready')[i % 3]) for i in range(cls.ROWS)),
+            batch_size=5000,
+        )
+        products = list(Product.objects.order_by('id')[:100])
+        CartItem.objects.bulk_create(CartItem(user=user, product=product, quantity=1) for user in users[:200] for product in products)
+        cls.user = users[500]
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+
+    def assertUsesIndex(self, queryset, index=None):
+        plan = queryset.explain()
+        if index is not None:
+            self.assertIn(index, plan)
+        if connection.vendor == 'sqlite':
+            # "SCAN t" is a full table scan; "SCAN t USING INDEX i" walks an index in order.
+            self.assertNotRegex(plan, r'SCAN \w+(?! USING)( |$)', plan)
+        else:
+            self.assertNotIn('Seq Scan', plan)
+        return plan
+
+    def catalog_page(self, query):
+        paginator = KeysetPagination()
+        request = RequestFactory().get('/api/products/', query)
+        return paginator.page_queryset(filter_products(Product.objects.all(), request.GET), request)
+
+    def test_catalog_first_page(self):
+        self.assertUsesIndex(self.catalog_page({}), 'product_created_idx')
+
+    def test_available_catalog_deep_page(self):
+        product = Product.objects.filter(available=True).order_by('created_at', 'id')[50_000]
+        cursor = KeysetPagination().encode_cursor([product.created_at, product.id])
+        plan = self.assertUsesIndex(self.catalog_page({'available': 'true', 'cursor': cursor}), 'product_available_created_idx')
+        if connection.vendor == 'sqlite':
+            # Seeks straight to the cursor rather than walking the index from the start.
+            self.assertIn('SEARCH api_product USING INDEX product_available_created_idx (created_at>?)', plan)
+
+    def test_order_history(self):
+        orders = Order.objects.filter(user=self.user).order_by('-created_at', '-id')[:20]
+        self.assertUsesIndex(orders, 'order_user_created_idx')
+
+    def test_orders_by_status(self):
+        orders = Order.objects.filter(status='pending').order_by('-created_at')[:50]
+        self.assertUsesIndex(orders, 'order_status_created_idx')
+
+    def test_cart_lines(self):
+        self.assertUsesIndex(cart_lines(self.user))
+
+    def test_case_insensitive_email_lookup(self):
+        self.assertEqual(PooledHashBackend().get_user_by_email('Diner500@Example.com'), self.user)
+        users = User.objects.alias(email_lower=Lower('email')).filter(email_lower='diner500@example.com')
+        self.assertUsesIndex(users, 'user_email_lower_idx')
+
+
+class CheckoutTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(email='tala@example.com', username='tala', password='pw')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.sisig = Product.objects.create(name='Sisig', price=Decimal('150.00'))
+        self.halo = Product.objects.create(name='Halo-halo', price=Decimal('85.50'))
+
+    def fill_cart(self, *lines):
+        with self.captureOnCommitCallbacks(execute=True):
+            apply_cart_deltas(self.user, lines)
+
+    def post(self, key=None):
+        headers = {'Idempotency-Key': key} if key else {}
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post(reverse('checkout'), headers=headers)
+
+    def test_cart_becomes_order_with_price_snapshot(self):
+        self.fill_cart((self.sisig.id, 2), (self.halo.id, 1))
+        self.client.get(reverse('cart'))  # prime the cart cache
+        response = self.post()
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(Decimal(response.data['total']), Decimal('385.50'))
+        self.assertEqual([(line['name'], line['quantity']) for line in response.data['lines']], [('Sisig', 2), ('Halo-halo', 1)])
+        self.assertFalse(CartItem.objects.filter(user=self.user).exists())
+        self.assertEqual(self.client.get(reverse('cart')).json(), [])
+
+        Product.objects.filter(id=self.sisig.id).update(price=Decimal('999.00'))
+        self.assertEqual(OrderLine.objects.get(product=self.sisig).unit_price, Decimal('150.00'))
+
+    def test_retry_with_same_key_returns_original_order(self):
+        self.fill_cart((self.sisig.id, 1))
+        first = self.post('retry-1')
+        self.fill_cart((self.halo.id, 1))
+        second = self.post('retry-1')
+        self.assertEqual(second.status_code, 200)
+        self.assertEqual(second.data['id'], first.data['id'])
+        self.assertEqual(Order.objects.filter(user=self.user).count(), 1)
+        self.assertTrue(CartItem.objects.filter(user=self.user, product=self.halo).exists())
+
+    def test_empty_cart_is_rejected(self):
+        self.assertEqual(self.post().status_code, 400)
+
+    def test_unavailable_product_blocks_checkout(self):
+        self.fill_cart((self.sisig.id, 1), (self.halo.id, 1))
+        Product.objects.filter(id=self.halo.id).update(available=False)
+        response = self.post()
+        self.assertEqual(response.status_code, 409)
+        self.assertIn('Halo-halo', response.data['error'])
+        self.assertEqual(CartItem.objects.filter(user=self.user).count(), 2)
+
+    def test_query_count_is_independent_of_cart_size(self):
+        products = Product.objects.bulk_create(Product(name=f'Dish {i}', price=Decimal('1.00')) for i in range(50))
+        self.fill_cart((self.sisig.id, 1))
+        with CaptureQueriesContext(connection) as small:
+            checkout(self.user, 'small')
+        self.fill_cart(*((product.id, 1) for product in products))
+        with CaptureQueriesContext(connection) as large:
+            order, created = checkout(self.user, 'large')
+        self.assertEqual(order.lines.count(), 50)
+        self.assertEqual(len(large), len(small))
+
+
+class OrderHistoryTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(email='dalisay@example.com', username='dalisay', password='pw')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.kare = MenuItem.objects.create(name='Kare-kare', price=Decimal('220.00'))
+
+    def place_orders(self, count, lines=3, status='pending'):
+        orders = []
+        for i in range(count):
+            order = Order.objects.create(user=self.user, status=status)
+            order.items.add(self.kare)
+            OrderLine.objects.bulk_create(
+                OrderLine(order=order, name=f'Dish {n}', unit_price=Decimal('10.00'), quantity=1) for n in range(lines)
+            )
+            orders.append(order)
+        return orders
+
+    def test_history_is_newest_first_across_pages(self):
+        orders = self.place_orders(25)
+        first = self.client.get(reverse('order-list')).data
+        second = self.client.get(first['next']).data
+        ids = [order['id'] for order in first['results'] + second['results']]
+        self.assertEqual(ids, [order.id for order in reversed(orders)])
+        self.assertIsNone(second['next'])
+        self.assertEqual(len(first['results'][0]['lines']), 3)
+        self.assertEqual(first['results'][0]['items'], [self.kare.id])
+
+    def test_page_query_count_is_constant(self):
+        self.place_orders(20, lines=5)
+        with self.assertNumQueries(3):  # orders, lines, items
+            self.client.get(reverse('order-list'))
+
+    def test_other_users_orders_are_hidden(self):
+        other = User.objects.create_user(email='other@example.com', username='other', password='pw')
+        Order.objects.create(user=other, status='pending')
+        self.assertEqual(self.client.get(reverse('order-list')).data['results'], [])
+
+    def test_status_counters_follow_transitions(self):
+        first, second, third = self.place_orders(3, lines=0)
+        first.status = 'preparing'
+        first.save()
+        deferred = Order.objects.only('id', 'user').get(pk=second.pk)
+        deferred.status = 'completed'
+        deferred.save()
+        third.delete()
+
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('order-summary'))
+        self.assertEqual(response.data, {'total': 2, 'statuses': {'completed': 1, 'preparing': 1}})
+        self.assertEqual(OrderStatusCount.objects.get(user=self.user, status='pending').count, 0)
+
+    def test_checkout_counts_new_order(self):
+        product = Product.objects.create(name='Tapsilog', price=Decimal('95.00'))
+        CartItem.objects.create(user=self.user, product=product, quantity=1)
+        checkout(self.user)
+        self.assertEqual(self.client.get(reverse('order-summary')).data['statuses'], {'pending': 1})
+
+
+class OrderStatusTests(TestCase):
+    def setUp(self):
+        self.customer = User.objects.create_user(email='bayani@example.com', username='bayani', password='pw')
+        self.cook = User.objects.create_user(email='cook@example.com', username='cook', password='pw', is_staff=True)
+        self.order = Order.objects.create(user=self.customer)
+        self.client = APIClient()
+        self.auth = {'Authorization': f'Bearer {ClaimsRefreshToken.for_user(self.customer).access_token}'}
+
+    def move(self, user, status, order=None):
+        self.client.force_authenticate(user)
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post(reverse('order-status', args=[(order or self.order).id]), {'status': status}, format='json')
+
+    def test_kitchen_walks_the_state_machine(self):
+        for status in ('preparing', 'ready', 'completed'):
+            response = self.move(self.cook, status)
+            self.assertEqual(response.status_code, 200, response.data)
+            self.assertEqual(response.data['status'], status)
+        self.assertEqual(self.move(self.cook, 'cancelled').status_code, 409)
+
+    def test_skipping_a_step_is_rejected(self):
+        response = self.move(self.cook, 'completed')
+        self.assertEqual(response.status_code, 409)
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.status, Order.Status.PENDING)
+
+    def test_customers_may_only_cancel_their_own_orders(self):
+        self.assertEqual(self.move(self.customer, 'preparing').status_code, 403)
+        stranger = User.objects.create_user(email='stranger@example.com', username='stranger', password='pw')
+        self.assertEqual(self.move(stranger, 'cancelled').status_code, 404)
+        self.assertEqual(self.move(self.customer, 'cancelled').status_code, 200)
+
+    def test_unknown_status_is_a_validation_error(self):
+        self.assertEqual(self.move(self.cook, 'burnt').status_code, 400)
+
+    def test_migration_maps_legacy_statuses(self):
+        migration = import_module('api.migrations.0011_order_status_choices')
+        Order.objects.bulk_create(Order(user=self.customer, status=status) for status in ('Done', 'in_progress', 'Canceled', '???'))
+        migration.map_legacy_statuses(django_apps, None)
+        self.assertEqual(
+            sorted(Order.objects.values_list('status', flat=True)),
+            ['cancelled', 'completed', 'pending', 'pending', 'preparing'],
+        )
+        self.assertEqual(status_counts(self.customer), {'cancelled': 1, 'completed': 1, 'pending': 2, 'preparing': 1})
+
+    async def test_broker_fans_out_across_threads(self):
+        broker = LocalBroker()
+        first, second = broker.subscribe('a'), broker.subscribe('a', 'b')
+        thread = threading.Thread(target=broker.publish, args=('a', {'n': 1}))
+        thread.start()
+        thread.join()
+        self.assertEqual(await asyncio.wait_for(first.get(), 1), {'n': 1})
+        self.assertEqual(await asyncio.wait_for(second.get(), 1), {'n': 1})
+        first.close()
+        broker.publish('a', {'n': 2})
+        self.assertEqual(await asyncio.wait_for(second.get(), 1), {'n': 2})
+        self.assertTrue(first.queue.empty())
+
+    async def test_customer_stream_pushes_status_changes(self):
+        response = await AsyncClient().get(reverse('order-events'), headers=self.auth)
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        stream = aiter(response.streaming_content)
+        self.assertEqual(await anext(stream), b'retry: 3000\n\n')
+        snapshot = await anext(stream)
+        self.assertIn(b'event: snapshot', snapshot)
+        self.assertEqual(json.loads(snapshot.split(b'data: ')[1])[0]['status'], 'pending')
+
+        publish_status_change(self.order.id, self.customer.id, 'preparing', 'pending')
+        event = await asyncio.wait_for(anext(stream), 1)
+        self.assertEqual(event, b'event: status\ndata: {"id":%d,"user":%d,"status":"preparing","previous":"pending"}\n\n' % (self.order.id, self.customer.id))
+        await stream.aclose()
+
+    def test_streams_refuse_wsgi_requests(self):
+        for name in ('order-events', 'kitchen-events'):
+            response = self.client.get(reverse(name), headers=self.auth)
+            self.assertEqual(response.status_code, 501)
+            self.assertFalse(response.streaming)
+
+    async def test_kitchen_stream_is_staff_only(self):
+        response = await AsyncClient().get(reverse('kitchen-events'), headers=self.auth)
+        self.assertEqual(response.status_code, 403)
+
+    def test_transition_publishes_after_commit(self):
+        with mock.patch.object(get_broker(), 'publish') as publish:
+            with self.captureOnCommitCallbacks() as callbacks:
+                transition(self.order.id, 'preparing')
+            publish.assert_not_called()
+            for callback in callbacks:
+                callback()
+        channels = [call.args[0] for call in publish.call_args_list]
+        self.assertEqual(channels, [user_channel(self.customer.id), 'orders:kitchen'])
+        self.assertEqual(publish.call_args.args[1]['previous'], 'pending')
+
+
+FLAKY_CALLS = []
+
+
+@task(name='tests.flaky', max_attempts=3)
+def flaky_task(failures):
+    FLAKY_CALLS.append(failures)
+    if len(FLAKY_CALLS) <= failures:
+        raise RuntimeError(f'failure {len(FLAKY_CALLS)}')
+
+
+@override_settings(TASK_QUEUE={'BACKOFF': 0, 'POLL_INTERVAL': 0.01})
+class TaskQueueTests(TransactionTestCase):
+    def setUp(self):
+        FLAKY_CALLS.clear()
+        cache.clear()
+        catalog_cache.clear()
+
+    def run_worker(self):
+        Task.objects.filter(status=Task.Status.QUEUED).update(run_at=timezone.now())  # skip any delay
+        Worker(threads=4).run(burst=True)
+
+    def test_worker_runs_queued_tasks_on_its_pool(self):
+        before = tasks.succeeded.value
+        for _ in range(10):
+            enqueue('tests.flaky', failures=0)
+        self.run_worker()
+        self.assertEqual(Task.objects.filter(status=Task.Status.DONE).count(), 10)
+        self.assertEqual(tasks.succeeded.value - before, 10)
+        self.assertGreaterEqual(tasks.duration.count, 10)
+
+    def test_failures_are_retried_then_given_up(self):
+        retry = enqueue('tests.flaky', failures=2)
+        with self.assertLogs('api.tasks', 'WARNING'):
+            self.run_worker()
+        retry.refresh_from_db()
+        self.assertEqual((retry.status, retry.attempts), (Task.Status.DONE, 3))
+
+        FLAKY_CALLS.clear()
+        doomed = enqueue('tests.flaky', failures=5)
+        with self.assertLogs('api.tasks', 'WARNING') as logs:
+            self.run_worker()
+        self.assertIn('failed permanently', logs.output[-1])
+        doomed.refresh_from_db()
+        self.assertEqual((doomed.status, doomed.attempts), (Task.Status.FAILED, 3))
+        self.assertEqual(doomed.last_error, 'RuntimeError: failure 3')
+
+    def test_unique_key_coalesces_waiting_tasks(self):
+        self.assertIsNotNone(enqueue('tests.flaky', unique_key='once', failures=0))
+        self.assertIsNone(enqueue('tests.flaky', unique_key='once', failures=0))
+        self.run_worker()
+        self.assertIsNotNone(enqueue('tests.flaky', unique_key='once', failures=0))
+
+    def test_task_of_a_dead_worker_is_reclaimed_after_the_lease(self):
+        row = enqueue('tests.flaky', failures=0)
+        Task.objects.filter(id=row.id).update(
+            status=Task.Status.RUNNING, locked_by='gone', locked_at=timezone.now() - timedelta(hours=1),
+        )
+        self.run_worker()
+        row.refresh_from_db()
+        self.assertEqual(row.status, Task.Status.DONE)
+
+    def test_registration_sends_welcome_email_in_the_background(self):
+        response = APIClient().post(reverse('register'), {
+            'email': 'amihan@example.com', 'username': 'amihan', 'password': 'secret-pass',
+        }, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(mail.outbox, [])
+        self.run_worker()
+        self.assertEqual(mail.outbox[0].to, ['amihan@example.com'])
+
+    def test_catalog_change_warms_the_shared_cache(self):
+        location = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, location)
+        shared = {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': location}
+        with override_settings(
+            CACHES={**settings.CACHES, 'shared': shared},
+            CATALOG_CACHE={'CACHE_ALIAS': 'shared', 'WARM_URLS': ['http://testserver/api/products/?page_size=1']},
+        ):
+            Product.objects.create(name='Turon', price=Decimal('25.00'))
+            Product.objects.create(name='Puto', price=Decimal('15.00'))
+            self.assertEqual(Task.objects.filter(name='warm_catalog').count(), 1)
+            self.run_worker()
+            catalog_cache.clear()  # as seen by another process: only the shared cache is warm
+            shared_hits = catalog_cache.shared_hits.value
+            response = APIClient().get(reverse('product-list'), {'page_size': 1})
+            self.assertEqual(len(response.json()['results']), 1)
+            self.assertTrue(response.json()['next'].startswith('http://testserver/api/products/?'))
+            self.assertEqual(catalog_cache.shared_hits.value, shared_hits + 1)
+
+    @override_settings(CATALOG_CACHE={'WARM_URLS': ['http://testserver/api/products/']})
+    def test_no_warmup_for_a_per_process_cache(self):
+        Product.objects.create(name='Turon', price=Decimal('25.00'))
+        self.assertFalse(Task.objects.filter(name='warm_catalog').exists())
+
+
+class RequestMetricsTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        catalog_cache.clear()
+        Product.objects.create(name='Ensaymada', price=Decimal('35.00'))
+
+    def route_metric(self, name, route='product-list'):
+        return metrics.registry.get(name, route=route, method='GET')
+
+    def observed(self, name, route='product-list'):
+        histogram = self.route_metric(name, route)
+        return (histogram.count, histogram.sum) if histogram else (0, 0)
+
+    @override_settings(REQUEST_METRICS={'SERVER_TIMING': True})
+    def test_sampled_request_records_db_and_render_time(self):
+        queries, size = self.observed('http_request_db_queries'), self.observed('http_response_size_bytes')
+        response = self.client.get(reverse('product-list'))
+        timing = response['Server-Timing']
+        self.assertRegex(timing, r'^app;dur=[\d.]+, db;dur=[\d.]+;desc="1 queries", render;dur=[\d.]+$')
+        self.assertEqual(self.observed('http_request_db_queries'), (queries[0] + 1, queries[1] + 1))
+        self.assertEqual(self.observed('http_response_size_bytes')[1] - size[1], len(response.content))
+        self.assertGreater(self.route_metric('http_request_render_seconds').count, 0)
+
+    @override_settings(REQUEST_METRICS={'SAMPLE_RATE': 0, 'SERVER_TIMING': True})
+    def test_unsampled_requests_only_record_latency(self):
+        latency, queries = self.observed('http_request_duration_seconds'), self.observed('http_request_db_queries')
+        self.client.get(reverse('product-list'))
+        self.assertEqual(self.observed('http_request_duration_seconds')[0], latency[0] + 1)
+        self.assertEqual(self.observed('http_request_db_queries'), queries)
+        self.assertNotIn('Server-Timing', self.client.get(reverse('product-list')))
+
+    async def test_async_view_queries_are_attributed(self):
+        await AsyncClient().get(reverse('async-product-list'))
+        self.assertGreaterEqual(self.route_metric('http_request_db_queries', 'async-product-list').sum, 1)
+
+    @override_settings(REQUEST_METRICS={'SLOW_REQUEST_MS': 0})
+    def test_slow_request_log_includes_sql(self):
+        with self.assertLogs('api.performance', 'WARNING') as logs:
+            self.client.get(reverse('product-list'))
+        self.assertIn('(product-list)', logs.output[0])
+        self.assertIn('FROM "api_product"', logs.output[0])
+
+    @override_settings(REQUEST_METRICS={'TOKEN': 's3cret'})
+    def test_metrics_endpoint(self):
+        self.client.get(reverse('product-list'))
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, 403)
+        response = self.client.get(reverse('metrics'), headers={'Authorization': 'Bearer s3cret'})
+        self.assertEqual(response['Content-Type'], 'text/plain; version=0.0.4; charset=utf-8')
+        body = response.content.decode()
+        self.assertIn('# TYPE http_request_duration_seconds histogram', body)
+        self.assertRegex(body, r'http_request_duration_seconds_count\{route="product-list",method="GET"\} \d+')
+        self.assertIn('http_request_duration_seconds_bucket{route="product-list",method="GET",le="+Inf"}', body)
+        self.assertIn('# TYPE catalog_cache_misses_total counter', body)
+        self.assertEqual(self.client.get(reverse('metrics'), headers={'Authorization': 'Bearer s3cre'}).status_code, 403)
+
+    def test_metrics_endpoint_is_closed_without_a_token(self):
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, 403)
+        with override_settings(REQUEST_METRICS={'ALLOWED_IPS': ['127.0.0.1']}):
+            self.assertEqual(self.client.get(reverse('metrics')).status_code, 200)
+        staff = User.objects.create_user(username='ops', email='ops@example.com', password='pw', is_staff=True)
+        self.client.force_login(staff)
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, 200)
+
+
+class SeedAndBaselineTests(TestCase):
+    def test_seed_command_keeps_derived_state_consistent(self):
+        version = catalog_version()
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command('seed', scale=0.01, orders=30, stdout=StringIO())
+        volumes = scaled_volumes(0.01)
+        self.assertEqual(Product.objects.count(), volumes['products'] + volumes['menu_items'])  # one catalog table
+        self.assertEqual(MenuItem.objects.count(), volumes['menu_items'])
+        self.assertEqual(Order.objects.count(), 30)
+        self.assertEqual(sum(OrderStatusCount.objects.values_list('count', flat=True)), 30)
+        self.assertGreater(catalog_version(), version)
+        user = User.objects.filter(email__startswith='seed-user-').first()
+        self.assertTrue(self.client.login(email=user.email, password='seed-pass'))
+
+    def test_compare_flags_regressions(self):
+        baseline = {
+            'list': {'name': 'list', 'p50 ms': 10.0, 'p99 ms': 20.0, 'queries/req': 1.0, 'errors': 0},
+            'login': {'name': 'login', 'p50 ms': 100.0, 'queries/req': 0.0, 'errors': 2},
+        }
+        rows = [
+            {'name': 'list', 'p50 ms': 12.0, 'p99 ms': 90.0, 'queries/req': 2.0, 'errors': 0},
+            {'name': 'login', 'p50 ms': 200.0, 'queries/req': 0.0, 'errors': 5},
+            {'name': 'new', 'p50 ms': 1.0},
+        ]
+        self.assertEqual(compare(rows, baseline, threshold=0.25), [
+            ('list', 'queries/req', 1.0, 2.0),
+            ('login', 'p50 ms', 100.0, 200.0),
+        ])
+
+    def test_rows_over_their_latency_target_are_reported(self):
+        rows = [
+            {'name': 'search', 'p50 ms': 12.0, 'target ms': 10.0},
+            {'name': 'suggest', 'p50 ms': 2.0, 'target ms': 10.0},
+            {'name': 'list', 'p50 ms': 50.0},
+        ]
+        self.assertEqual(missed_targets(rows), [('search', 10.0, 12.0)])
+
+
+@override_settings(THROTTLING={'RATES': {'login': '2/min', 'cart': '3/min'}})
+class ThrottlingTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        get_store().clear()
+        self.client = APIClient()
+
+    def test_parse_rate(self):
+        self.assertEqual(parse_rate('10/min'), (10, 60))
+        self.assertEqual(parse_rate('100/5m'), (100, 300))
+        with self.assertRaises(ValueError):
+            parse_rate('10 per minute')
+
+    def test_sliding_window_weights_previous_window(self):
+        for store in (LocalStore(), CacheStore()):
+            with self.subTest(store=type(store).__name__):
+                key = f'{type(store).__name__}:k'
+                self.assertEqual(sliding_window(store, key, 2, 60, 1000 * 60 + 10), 0)
+                self.assertEqual(sliding_window(store, key, 2, 60, 1000 * 60 + 20), 0)
+                wait = sliding_window(store, key, 2, 60, 1000 * 60 + 30)
+                # Three hits in the window: the next one fits once 1/3 of them has faded out.
+                self.assertAlmostEqual(wait, 30 + 60 * 2 / 3)
+                self.assertGreater(sliding_window(store, key, 2, 60, 1000 * 60 + 30 + wait - 1), 0)
+                self.assertEqual(sliding_window(store, key, 2, 60, 1003 * 60), 0)
+
+    def test_token_bucket_allows_bursts_then_refills(self):
+        for store in (LocalStore(), CacheStore()):
+            with self.subTest(store=type(store).__name__):
+                key = f'{type(store).__name__}:k'
+                self.assertEqual([token_bucket(store, key, 3, 60, 100.0) for _ in range(3)], [0, 0, 0])
+                self.assertAlmostEqual(token_bucket(store, key, 3, 60, 100.0), 20)
+                self.assertAlmostEqual(token_bucket(store, key, 3, 60, 110.0), 10)
+                self.assertEqual(token_bucket(store, key, 3, 60, 120.0), 0)
+
+    def test_login_throttled_per_ip_with_retry_after(self):
+        body = {'email': 'nobody@example.com', 'password': 'wrong'}
+        for _ in range(2):
+            self.assertEqual(self.client.post(reverse('login'), body, format='json').status_code, 400)
+        response = self.client.post(reverse('login'), body, format='json')
+        self.assertEqual(response.status_code, 429)
+        self.assertGreaterEqual(int(response['Retry-After']), 1)
+        other = self.client.post(reverse('login'), body, format='json', REMOTE_ADDR='10.0.0.2')
+        self.assertEqual(other.status_code, 400)
+
+    def test_login_throttle_ignores_spoofed_forwarded_for(self):
+        body = {'email': 'nobody@example.com', 'password': 'wrong'}
+        statuses = [
+            self.client.post(reverse('login'), body, format='json', HTTP_X_FORWARDED_FOR=f'203.0.113.{i}').status_code
+            for i in range(3)
+        ]
+        self.assertEqual(statuses, [400, 400, 429])
+
+    def test_cart_throttled_per_user(self):
+        product = Product.objects.create(name='Adobo', price=Decimal('120.00'))
+        clients = []
+        for name in ('ana', 'ben'):
+            client = APIClient()
+            client.force_authenticate(User.objects.create_user(email=f'{name}@example.com', username=name, password='pw'))
+            clients.append(client)
+        statuses = [clients[0].post(reverse('cart-add'), {'product_id': product.id}, format='json').status_code for _ in range(4)]
+        self.assertEqual(statuses, [201, 200, 200, 429])  # created, then updated
+        self.assertEqual(clients[1].post(reverse('cart-add'), {'product_id': product.id}, format='json').status_code, 201)
+
+    @override_settings(THROTTLING={'RATES': {}})
+    def test_scopes_without_rate_are_not_throttled(self):
+        body = {'email': 'nobody@example.com', 'password': 'wrong'}
+        for _ in range(5):
+            self.assertEqual(self.client.post(reverse('login'), body, format='json').status_code, 400)
+
+
+class SearchTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.adobo = Product.objects.create(name='Chicken Adobo', description='Braised in vinegar and soy', price=Decimal('180.00'))
+        self.sinigang = Product.objects.create(name='Pork Sinigang', description='Sour tamarind soup', price=Decimal('220.00'))
+        self.sisig = Product.objects.create(name='Sisig', description='Sizzling pork, great with chicken skin', price=Decimal('200.00'), available=False)
+        self.combo = MenuItem.objects.create(name='Adobo Combo', description='Adobo, rice and iced tea', price=Decimal('250.00'))
+
+    def names(self, url, **params):
+        response = self.client.get(reverse(url), params)
+        self.assertEqual(response.status_code, 200)
+        return [result['name'] for result in response.data['results']]
+
+    def test_search_ranks_name_matches_first(self):
+        self.assertEqual(self.names('search', q='chicken'), ['Chicken Adobo', 'Sisig'])
+        response = self.client.get(reverse('search'), {'q': 'adobo', 'type': 'menu_item'})
+        self.assertEqual(response.data['results'], [
+            {'type': 'menu_item', 'id': self.combo.id, 'name': 'Adobo Combo', 'description': 'Adobo, rice and iced tea',
+             'price': '250.00', 'available': True},
+        ])
+
+    def test_every_word_matches_as_prefix(self):
+        self.assertEqual(self.names('search', q='pork sin'), ['Pork Sinigang'])
+        self.assertEqual(self.names('search', q='por', available='true'), ['Pork Sinigang'])
+        self.assertEqual(self.names('search', q='pork adobo'), [])
+
+    def test_whole_words_fill_places_before_prefixes(self):
+        Product.objects.create(name='Halo-halo', description='Sweet tamarinds', price=Decimal('120.00'))
+        self.assertEqual(self.names('search', q='tamarind', limit=1), ['Pork Sinigang'])
+        self.assertEqual(self.names('search', q='tamarind'), ['Pork Sinigang', 'Halo-halo'])
+
+    def test_typos_are_corrected_when_nothing_matches(self):
+        response = self.client.get(reverse('search'), {'q': 'sinigan tamarnid'})
+        self.assertEqual(response.data['corrected'], 'sinigan tamarind')  # a prefix is not a typo
+        self.assertEqual([result['name'] for result in response.data['results']], ['Pork Sinigang'])
+        self.assertIsNone(self.client.get(reverse('search'), {'q': 'sinigang'}).data['corrected'])
+
+    def test_typo_candidates_are_cached_per_catalog_version(self):
+        self.assertIsNone(search_catalog('tamalse').corrected)
+        Product.objects.create(name='Tamales', price=Decimal('90.00'))
+        self.assertIsNone(search_catalog('tamalse').corrected)
+        bump_catalog_version()
+        self.assertEqual(search_catalog('tamalse').corrected, 'tamales')
+
+    def test_suggestions_match_names_only(self):
+        self.assertEqual(self.names('search-suggest', q='ado'), ['Adobo Combo', 'Chicken Adobo'])  # shortest first
+        self.assertEqual(self.names('search-suggest', q='adbo'), ['Adobo Combo', 'Chicken Adobo'])
+        self.assertEqual(self.names('search-suggest', q='soy'), [])
+        self.assertEqual(self.client.get(reverse('search-suggest'), {'q': ''}).status_code, 400)
+
+    def test_index_follows_catalog_writes(self):
+        self.adobo.name = 'Chicken Inasal'
+        self.adobo.save()
+        self.sinigang.delete()
+        self.assertEqual(self.names('search', q='inasal'), ['Chicken Inasal'])
+        self.assertEqual(self.names('search', q='sinigang'), [])
+        self.assertEqual(self.names('search', q='adobo'), ['Adobo Combo'])
+        self.assertEqual(SearchEntry.objects.count(), 3)
+
+    def test_rebuild_after_bulk_writes(self):
+        Product.objects.bulk_create([Product(name='Lechon Kawali', price=Decimal('300.00'))])
+        self.assertEqual(search_catalog('lechon').entries, [])
+        call_command('rebuild_search_index', stdout=StringIO())
+        self.assertEqual([entry.name for entry in search_catalog('lechon').entries], ['Lechon Kawali'])
+
+    def test_old_name_matches_beat_newer_description_matches_and_admin_sees_all(self):
+        Product.objects.bulk_create(
+            Product(name=f'Rice bowl {i}', description='Adobo flakes', price=Decimal('99.00')) for i in range(1100)
+        )
+        rebuild_search_index()
+        self.assertEqual(sorted(entry.name for entry in search_catalog('adobo', limit=2).entries), ['Adobo Combo', 'Chicken Adobo'])
+        self.assertEqual(Product.objects.filter(pk__in=matching_ids('adobo')).count(), 1102)
+        self.assertEqual(Product.objects.filter(pk__in=matching_ids('adbo', kind='menu_item')).get(), self.combo)
+        self.assertIsNone(matching_ids('zzzz'))
+
+    def test_closest_word(self):
+        self.assertEqual(edit_distance('adbo', 'adob', 2), 1)
+        self.assertEqual(closest_word('tamarnid', [('tamarind', 1), ('tamales', 5)]), 'tamarind')
+        self.assertIsNone(closest_word('tama', [('tamarind', 1)]))
+        self.assertIsNone(closest_word('xyz', [('tamarind', 1)]))
+
+
+class ImageTests(TestCase):
+    PNG = b'\x89PNG\r\n\x1a\n' + b'\x00' * 64
+
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        settings_override = override_settings(MEDIA_ROOT=media.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.product = Product.objects.create(name='Halo-halo', price=Decimal('120.00'))
+        self.admin = User.objects.create_user(email='admin@example.com', username='admin', password='pw', is_staff=True)
+
+    def upload(self, data, name='photo.png'):
+        return SimpleUploadedFile(name, data, content_type='image/png')
+
+    def test_uploads_are_stored_under_their_content_hash(self):
+        self.assertEqual(sniff_format(self.PNG[:16]), 'png')
+        self.assertIsNone(sniff_format(b'<svg xmlns=...'))
+        name = attach_image(self.product, self.upload(self.PNG))
+        self.assertEqual(name, hashed_name(self.PNG, 'png'))
+        other = Product.objects.create(name='Turon', price=Decimal('60.00'))
+        self.assertEqual(attach_image(other, self.upload(self.PNG, 'copy.png')), name)  # stored once
+        self.assertEqual(
+            list(Task.objects.filter(name='generate_image_variants').values_list('name', 'kwargs')),
+            [('generate_image_variants', {'product_id': self.product.pk}), ('generate_image_variants', {'product_id': other.pk})],
+        )
+        with self.assertRaises(InvalidImage):
+            attach_image(self.product, self.upload(b'GIF? no, a script'))
+
+    def test_upload_endpoint(self):
+        url = reverse('product-image', args=[self.product.pk])
+        client = APIClient()
+        client.force_authenticate(self.admin)
+        response = client.post(url, {'image': self.upload(self.PNG)})
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.data['images']['original'], f"/media/{hashed_name(self.PNG, 'png')}")
+        self.assertEqual(response.data['images']['variants'], {})
+        self.assertEqual(client.post(url, {'image': self.upload(b'not an image')}).status_code, 400)
+
+        client.force_authenticate(User.objects.create_user(email='guest@example.com', username='guest', password='pw'))
+        self.assertEqual(client.post(url, {'image': self.upload(self.PNG)}).status_code, 403)
+
+    def test_catalog_lists_variant_srcsets(self):
+        Product.objects.filter(pk=self.product.pk).update(image='products/ab/ab.png', image_variants={
+            'thumb': {'width': 160, 'height': 120, 'webp': 'products/cd/cd.webp'},
+            'card': {'width': 480, 'height': 360, 'webp': 'products/ef/ef.webp', 'avif': 'products/12/12.avif'},
+        })
+        response = self.client.get(reverse('product-list'), {'fields': 'id,images'})
+        images = response.json()['results'][0]['images']
+        self.assertEqual(images['srcset'], {
+            'avif': '/media/products/12/12.avif 480w',
+            'webp': '/media/products/cd/cd.webp 160w, /media/products/ef/ef.webp 480w',
+        })
+        self.assertEqual(images['variants']['thumb'], {'width': 160, 'height': 120, 'webp': '/media/products/cd/cd.webp'})
+
+    def test_media_is_served_by_the_front_server(self):
+        name = hashed_name(self.PNG, 'png')
+        self.assertEqual(media_headers(name)['Cache-Control'], 'public, max-age=31536000, immutable')
+        self.assertEqual(media_headers('products/legacy.jpg')['Cache-Control'], 'public, max-age=300')
+        from .views import serve_media
+        response = serve_media(RequestFactory().get(f'/media/{name}'), name)
+        self.assertEqual(response['X-Accel-Redirect'], f'/protected-media/{name}')
+        self.assertEqual(response['Content-Type'], 'image/png')
+        self.assertEqual(response.content, b'')
+        with self.assertRaises(Http404):
+            serve_media(RequestFactory().get('/media/../settings.py'), '../settings.py')
+
+    @skipUnless(Image, 'Pillow is not installed')
+    def test_variants_are_rendered_in_the_background(self):
+        buffer = io.BytesIO()
+        Image.new('RGB', (800, 600), 'orange').save(buffer, format='PNG')
+        attach_image(self.product, self.upload(buffer.getvalue()))
+        generate_image_variants(product_id=self.product.pk)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.image_variants['thumb']['width'], 160)
+        self.assertEqual(self.product.image_variants['detail']['width'], 800)  # never upscaled
+        self.assertIn('webp', self.product.image_variants['card'])
+
+    @skipUnless(Image is None, 'Pillow is installed')
+    def test_without_pillow_originals_are_kept(self):
+        attach_image(self.product, self.upload(self.PNG))
+        with self.assertLogs('api.jobs', 'WARNING'):
+            generate_image_variants(product_id=self.product.pk)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.image_variants, {})
+
+    def test_check_warns_when_variants_are_configured_without_pillow(self):
+        with mock.patch('api.images.Image', None):
+            self.assertEqual([w.id for w in check_pillow(None)], ['api.W003'])
+            with override_settings(PRODUCT_IMAGES={'VARIANTS': {}}):
+                self.assertEqual(check_pillow(None), [])
+
+
+class StructuredLoggingTests(TestCase):
+    def record(self, msg, *args, **extra):
+        record = logging.LogRecord('api.auth', logging.WARNING, __file__, 1, msg, args, None)
+        record.__dict__.update(extra)
+        return record
+
+    def test_records_are_redacted_json(self):
+        record = self.record('hash %s for %s', 'pbkdf2_sha256$870000$salt$hash', 'jane.doe@example.com',
+                             email='jane.doe@example.com', refresh_token='eyJhbGciOi.eyJzdWIi.c2lnbmF0dXJl', user_id=7)
+        self.assertTrue(RedactFilter().filter(record))
+        line = json.loads(JSONFormatter().format(record))
+        self.assertEqual(line['message'], 'hash [redacted] for j***@example.com')
+        self.assertEqual(line['email'], 'j***@example.com')
+        self.assertEqual(line['refresh_token'], '[redacted]')
+        self.assertEqual((line['level'], line['logger'], line['user_id']), ('WARNING', 'api.auth', 7))
+
+    def test_sampling_keeps_warnings(self):
+        sample = SampleFilter(rate=0.0)
+        info = self.record('login')
+        info.levelno = logging.INFO
+        self.assertFalse(sample.filter(info))
+        self.assertTrue(sample.filter(self.record('login failed')))
+
+    def test_handlers_run_behind_a_queue(self):
+        self.addCleanup(configure, settings.LOGGING)
+        stream = StringIO()
+        configure({
+            'version': 1,
+            'disable_existing_loggers': False,
+            'formatters': {'json': {'()': 'api.logs.JSONFormatter'}},
+            'handlers': {'memory': {'class': 'logging.StreamHandler', 'stream': stream, 'formatter': 'json'}},
+            'loggers': {'api.benchmark': {'handlers': ['memory'], 'level': 'INFO', 'propagate': False}},
+        })
+        self.assertEqual([type(h).__name__ for h in logging.getLogger('api.benchmark').handlers], ['DeferredQueueHandler'])
+        logging.getLogger('api.benchmark').info('Order %s paid', 12)
+        stop_listeners()  # flushes the queue
+        self.assertEqual(json.loads(stream.getvalue())['message'], 'Order 12 paid')
+
+    def test_runserver_access_log_is_queued(self):
+        handlers = logging.getLogger('django.server').handlers
+        self.assertEqual([type(h).__name__ for h in handlers], ['DeferredQueueHandler'])
+
+    def test_registration_does_not_log_the_password_hash(self):
+        with mock.patch('api.logs.random.random', return_value=0.0), self.assertLogs('api.auth', 'INFO') as logs:
+            response = APIClient().post(reverse('register'), {
+                'email': 'tala@example.com', 'username': 'tala', 'password': 'secret-pass',
+            }, format='json')
+        self.assertEqual(response.status_code, 201)
+        password = User.objects.get(email='tala@example.com').password
+        self.assertEqual(logs.output, [f"INFO:api.auth:User {response.data['user']['id']} registered"])
+        self.assertNotIn(password, ''.join(logs.output))
+
+
+class AdminTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.admin = User.objects.create_superuser(email='admin@example.com', username='admin', password='pw')
+        self.client.force_login(self.admin)
+
+    def changelist(self, model, **params):
+        response = self.client.get(reverse(f'admin:api_{model}_changelist'), params)
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def test_large_tables_are_not_counted(self):
+        User.objects.bulk_create([User(email=f'u{i}@example.com', username=f'u{i}') for i in range(30)])
+        paginator = EstimatedCountPaginator(User.objects.order_by('pk'), 10)
+        paginator.max_exact_count = 20
+        self.assertEqual(paginator.count, User.objects.order_by('-pk').first().pk)  # estimated from the highest id
+        paginator = EstimatedCountPaginator(User.objects.filter(username__startswith='u').order_by('pk'), 10)
+        paginator.max_exact_count = 20
+        self.assertEqual(paginator.count, 20)  # filtered: counted up to the cap
+        with CaptureQueriesContext(connection) as queries:
+            self.changelist('user')
+        self.assertFalse([q for q in queries if 'COUNT(*)' in q['sql'] and 'LIMIT' not in q['sql']])
+
+    def test_changelists_search_by_indexed_prefixes(self):
+        customer = User.objects.create_user(email='Dalisay@example.com', username='dali', password='pw')
+        product = Product.objects.create(name='Bibingka', price=Decimal('60.00'))
+        CartItem.objects.create(user=customer, product=product, quantity=1)
+        order = Order.objects.create(user=customer)
+        self.assertContains(self.changelist('user', q='dalisay'), 'Dalisay@example.com')
+        self.assertNotContains(self.changelist('user', q='example'), 'Dalisay@example.com')
+        self.assertContains(self.changelist('cartitem', q='bibingka'), 'Bibingka')
+        self.assertContains(self.changelist('cartitem', q='dal'), 'Bibingka')
+        self.assertEqual(list(self.changelist('order', q=f'#{order.pk}').context['cl'].result_list), [order])
+        for term in ('9223372036854775808', '9' * 5000, '²'):
+            self.assertEqual(list(self.changelist('order', q=term).context['cl'].result_list), [])
+
+    def test_cart_edits_invalidate_snapshots_on_commit(self):
+        customer = User.objects.create_user(email='tess@example.com', username='tess', password='pw')
+        item = CartItem.objects.create(user=customer, product=Product.objects.create(name='Puto', price=Decimal('15.00')), quantity=1)
+        model_admin = admin_site._registry[CartItem]
+        for change in (lambda: model_admin.save_model(None, item, None, True),
+                       lambda: model_admin.delete_queryset(None, CartItem.objects.filter(pk=item.pk))):
+            revision = cart_cache.revision(customer.pk)
+            with self.captureOnCommitCallbacks(execute=True):
+                change()
+                self.assertEqual(cart_cache.revision(customer.pk), revision)
+            self.assertNotEqual(cart_cache.revision(customer.pk), revision)
+
+    def test_availability_actions_update_in_one_statement(self):
+        products = [Product.objects.create(name=f'Kakanin {i}', price=Decimal('20.00')) for i in range(3)]
+        version = catalog_version()
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(reverse('admin:api_product_changelist'), {
+                'action': 'mark_unavailable', '_selected_action': [p.pk for p in products[:2]],
+            })
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(list(Product.objects.order_by('pk').values_list('available', flat=True)), [False, False, True])
+        self.assertGreater(Product.objects.get(pk=products[0].pk).updated_at, products[0].updated_at)
+        self.assertEqual(search_catalog('kakanin', available=True).entries[0].object_id, products[2].pk)
+        self.assertNotEqual(catalog_version(), version)
+
+    def test_order_actions_keep_counters_in_step(self):
+        customer = User.objects.create_user(email='tala@example.com', username='tala', password='pw')
+        orders = [Order.objects.create(user=customer, status=status) for status in ('pending', 'preparing', 'completed')]
+        with mock.patch('api.orders.publish_status_change') as publish, self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('admin:api_order_changelist'), {
+                'action': 'advance_status', '_selected_action': [o.pk for o in orders],
+            })
+        self.assertEqual([Order.objects.get(pk=o.pk).status for o in orders], ['preparing', 'ready', 'completed'])
+        self.assertEqual(sorted(publish.call_args_list), [
+            mock.call(orders[0].pk, customer.pk, 'preparing', 'pending'),
+            mock.call(orders[1].pk, customer.pk, 'ready', 'preparing'),
+        ])
+        self.assertEqual(status_counts(customer), {'completed': 1, 'preparing': 1, 'ready': 1})
+
+        self.client.post(reverse('admin:api_order_changelist'), {
+            'action': 'cancel_orders', '_selected_action': [o.pk for o in orders],
+        })
+        self.assertEqual(status_counts(customer), {'cancelled': 1, 'completed': 1, 'ready': 1})
+
+
+class CatalogImportExportTests(TestCase):
+    CSV = (
+        'sku,type,name,description,price,available\n'
+        'ADB-1,product,Chicken Adobo,Braised in vinegar,180.00,true\n'
+        'CMB-1,menu_item,Adobo Combo,,250,yes\n'
+        'BAD-1,product,,No name,10.00,true\n'
+        'BAD-2,product,Free lunch,,12.345,true\n'
+        'ADB-1,product,Chicken Adobo Special,Braised in vinegar,190.00,\n'
+    )
+
+    def setUp(self):
+        cache.clear()
+        self.admin = User.objects.create_user(email='admin@example.com', username='admin', password='pw', is_staff=True)
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def upload(self, content, name='catalog.csv'):
+        return self.client.post(reverse('catalog-import'), {'file': SimpleUploadedFile(name, content.encode())})
+
+    def test_import_upserts_by_sku_and_reports_invalid_rows(self):
+        version = catalog_version()
+        response = self.upload(self.CSV)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['imported'], 2)  # ADB-1 twice in one batch: the last row wins
+        self.assertEqual(response.data['errors'], [
+            {'line': 4, 'error': 'name is required (at most 100 characters)'},
+            {'line': 5, 'error': 'price must be between 0 and 99999999.99 with at most two decimals'},
+        ])
+        self.assertEqual(Product.objects.get(sku='ADB-1').price, Decimal('190.00'))
+        self.assertEqual(MenuItem.objects.get(sku='CMB-1').description, '')
+        self.assertEqual(sorted(entry.name for entry in search_catalog('adobo').entries), ['Adobo Combo', 'Chicken Adobo Special'])
+        self.assertNotEqual(catalog_version(), version)
+
+        product = Product.objects.get(sku='ADB-1')
+        self.upload('sku,name,price,available\nADB-1,Chicken Adobo,185.50,false\n')
+        updated = Product.objects.get(sku='ADB-1')
+        self.assertEqual((updated.pk, updated.price, updated.available), (product.pk, Decimal('185.50'), False))
+        self.assertGreater(updated.updated_at, product.updated_at)
+        self.assertEqual(updated.created_at, product.created_at)
+        self.assertFalse(search_catalog('adobo', kind='product').entries[0].available)
+
+    def test_json_lines_import_command(self):
+        path = tempfile.NamedTemporaryFile('w', suffix='.jsonl', delete=False)
+        self.addCleanup(lambda: os.remove(path.name))
+        with path:
+            path.write('{"sku": "LCH-1", "name": "Lechon", "price": 420.5, "available": true}\n\n[1, 2]\n{broken\n')
+        out, err = StringIO(), StringIO()
+        call_command('import_catalog', path.name, stdout=out, stderr=err)
+        self.assertIn('Imported 1 items, skipped 2 invalid rows.', out.getvalue())
+        self.assertIn('line 3: Expected a JSON object', err.getvalue())
+        self.assertEqual(Product.objects.get(sku='LCH-1').price, Decimal('420.50'))
+
+    def test_export_streams_the_import_format(self):
+        self.upload(self.CSV)
+        response = self.client.get(reverse('catalog-export'))
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Disposition'], 'attachment; filename="catalog.csv"')
+        self.assertEqual(b''.join(response.streaming_content).decode().splitlines(), [
+            'sku,type,name,description,price,available',
+            'ADB-1,product,Chicken Adobo Special,Braised in vinegar,190.00,true',
+            'CMB-1,menu_item,Adobo Combo,,250.00,true',
+        ])
+        response = self.client.get(reverse('catalog-export'), {'file_format': 'jsonl', 'type': 'menu_item'})
+        self.assertEqual([json.loads(line) for line in b''.join(response.streaming_content).splitlines()], [
+            {'sku': 'CMB-1', 'type': 'menu_item', 'name': 'Adobo Combo', 'description': '', 'price': '250.00', 'available': True},
+        ])
+
+    def test_undecodable_and_malformed_rows_do_not_abort_the_import(self):
+        version = catalog_version()
+        rows = ''.join(f'SKU-{i},product,Dish {i},,10.00,true\n' for i in range(2500))
+        content = (
+            b'sku,type,name,description,price,available\n' + rows.encode()
+            + b'LAT-1,product,Caf\xe9,,10.00,true\n'
+            + b'BIG-1,product,Big,"' + b'x' * 200_000 + b'",10.00,true\n'
+            + b'END-1,product,Last,,10.00,true\n'
+        )
+        response = self.client.post(reverse('catalog-import'), {'file': SimpleUploadedFile('catalog.csv', content)})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['imported'], 2501)
+        self.assertEqual([error['line'] for error in response.data['errors']], [2502, 2503])
+        self.assertEqual(response.data['errors'][0]['error'], 'Not valid UTF-8')
+        self.assertTrue(Product.objects.filter(sku='END-1').exists())
+        self.assertNotEqual(catalog_version(), version)
+
+    def test_failed_batch_still_publishes_committed_ones(self):
+        version = catalog_version()
+        content = b'sku,name,price\nA-1,Adobo,10\nA-2,Sinigang,12\n'
+        with mock.patch('api.catalog_io.upsert_batch', side_effect=[1, RuntimeError('disk full')]):
+            with self.assertRaises(RuntimeError):
+                import_catalog(io.BytesIO(content), batch_size=1)
+        self.assertNotEqual(catalog_version(), version)
+
+    def test_admin_only(self):
+        self.client.force_authenticate(User.objects.create_user(email='guest@example.com', username='guest', password='pw'))
+        self.assertEqual(self.client.get(reverse('catalog-export')).status_code, 403)
+        self.assertEqual(self.upload(self.CSV).status_code, 403)
+
+
+class CompressionTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        catalog_cache.clear()
+        compressed_cache.clear()
+        self.client = APIClient()
+        self.url = reverse('product-list')
+        Product.objects.bulk_create(
+            Product(name=f'Dish {i}', description='Savory garlic rice with tamarind', price=Decimal('99.50'))
+            for i in range(20)
+        )
+
+    def test_negotiation(self):
+        self.assertEqual(negotiate('gzip, deflate, br', ['br', 'gzip']), 'br')
+        self.assertEqual(negotiate('br;q=0, gzip;q=0.8', ['br', 'gzip']), 'gzip')
+        self.assertEqual(negotiate('*;q=0.5', ['gzip']), 'gzip')
+        self.assertIsNone(negotiate('gzip;q=0, *', ['gzip']))
+        self.assertIsNone(negotiate('identity', ['br', 'gzip']))
+        self.assertIsNone(negotiate('', ['gzip']))
+
+    def test_catalog_is_gzipped_once_and_revalidates_with_weak_etag(self):
+        identity = self.client.get(self.url)
+        self.assertFalse(identity.has_header('Content-Encoding'))
+        self.assertIn('Accept-Encoding', identity['Vary'])
+
+        hits = metrics.counter('compression_cache_hits_total').value
+        first = self.client.get(self.url, HTTP_ACCEPT_ENCODING='gzip')
+        second = self.client.get(self.url, HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(first['Content-Encoding'], 'gzip')
+        self.assertEqual(gzip.decompress(first.content), identity.content)
+        self.assertEqual(second.content, first.content)
+        self.assertEqual(metrics.counter('compression_cache_hits_total').value, hits + 1)
+        self.assertEqual(first['ETag'], 'W/' + identity['ETag'])
+        self.assertEqual(int(first['Content-Length']), len(first.content))
+
+        response = self.client.get(self.url, HTTP_ACCEPT_ENCODING='gzip', HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+    def test_small_and_error_responses_are_not_compressed(self):
+        response = self.client.get(self.url, {'page_size': 1}, HTTP_ACCEPT_ENCODING='gzip')
+        self.assertFalse(response.has_header('Content-Encoding'))
+        response = self.client.get(self.url, {'min_price': 'abc'}, HTTP_ACCEPT_ENCODING='gzip')
+        self.assertFalse(response.has_header('Content-Encoding'))
+
+    def test_only_public_responses_are_cached_compressed(self):
+        request = RequestFactory().get('/api/cart/', HTTP_ACCEPT_ENCODING='gzip')
+        hits = metrics.counter('compression_cache_hits_total').value
+        for _ in range(2):
+            response = HttpResponse(b'{"items": []}' * 200, content_type='application/json', headers={'ETag': '"cart-1"'})
+            self.assertEqual(compress_response(request, response)['Content-Encoding'], 'gzip')
+        self.assertEqual(metrics.counter('compression_cache_hits_total').value, hits)
+        self.assertEqual(self.client.get(self.url)['Cache-Control'], 'public, no-cache')
+
+    def test_missing_encoders_are_reported_at_startup(self):
+        with mock.patch('api.compression.brotli', None), mock.patch('api.renderers.orjson', None):
+            self.assertEqual([w.id for w in check_encodings(None) + check_encoder(None)], ['api.W001', 'api.W002'])
+
+    def test_streaming_export_is_gzipped(self):
+        Product.objects.update(sku=None)
+        admin = User.objects.create_user(email='admin@example.com', username='admin', password='pw', is_staff=True)
+        self.client.force_authenticate(admin)
+        response = self.client.get(reverse('catalog-export'), HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        lines = gzip.decompress(b''.join(response.streaming_content)).decode().splitlines()
+        self.assertEqual(len(lines), 21)
+
+    @skipUnless(orjson, 'orjson is not installed')
+    def test_orjson_rendering_matches_drf(self):
+        data = {
+            'price': Decimal('12.50'), 'name': 'Sinigang na baboy \u2028 ñ', 'when': timezone.now(),
+            'tags': ('sour', 'soup'), 1: None, 'ratio': 0.5,
+        }
+        with override_settings(API_JSON_ENCODER='json'):
+            expected = JSONRenderer().render(data)
+        self.assertEqual(JSONRenderer().render(data), expected)
+        self.assertIn(b'\n  ', JSONRenderer().render(data, 'application/json; indent=2'))  # indented: DRF's encoder
+
+
+class UnifiedCatalogTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        catalog_cache.clear()
+        self.user = User.objects.create_user(email='cook@example.com', username='cook', password='pw')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.adobo = Product.objects.create(name='Chicken Adobo', price=Decimal('180.00'))
+        self.combo = MenuItem.objects.create(name='Adobo Combo', price=Decimal('250.00'))
+
+    def test_menu_items_are_catalog_items(self):
+        self.assertEqual(self.combo.kind, Product.Kind.MENU_ITEM)
+        self.assertEqual(list(MenuItem.objects.all()), [self.combo])
+        self.assertEqual(Product.objects.get(pk=self.combo.pk).kind, 'menu_item')
+        self.assertNotEqual(self.combo.pk, self.adobo.pk)
+        bulk, = MenuItem.objects.bulk_create([MenuItem(name='Halo-halo', price=Decimal('80.00'))])
+        self.assertEqual(Product.objects.get(pk=bulk.pk).kind, 'menu_item')
+
+    def test_catalog_lists_and_filters_by_type(self):
+        url = reverse('product-list')
+        rows = self.client.get(url).json()['results']
+        self.assertEqual([(row['name'], row['kind']) for row in rows], [('Chicken Adobo', 'product'), ('Adobo Combo', 'menu_item')])
+        rows = self.client.get(url, {'type': 'menu_item'}).json()['results']
+        self.assertEqual([row['id'] for row in rows], [self.combo.pk])
+        self.assertEqual(self.client.get(url, {'type': 'drink'}).status_code, 400)
+
+    def test_menu_items_go_through_cart_and_checkout(self):
+        response = self.client.post(reverse('cart-add'), {'product_id': self.combo.pk, 'quantity': 2}, format='json')
+        self.assertEqual(response.status_code, 201)
+        order, _ = checkout(self.user)
+        self.assertEqual([(line.name, line.unit_price) for line in order.lines.all()], [('Adobo Combo', Decimal('250.00'))])
+        order.items.add(self.combo)
+        self.assertEqual(self.client.get(reverse('order-list')).json()['results'][0]['items'], [self.combo.pk])
+
+    def test_import_can_retype_an_item(self):
+        import_catalog(io.BytesIO(b'sku,type,name,price\nADB-1,product,Adobo Plate,99\n'))
+        import_catalog(io.BytesIO(b'sku,type,name,price\nADB-1,menu_item,Adobo Plate,99\n'))
+        item = Product.objects.get(sku='ADB-1')
+        self.assertEqual(item.kind, 'menu_item')
+        self.assertEqual(
+            list(SearchEntry.objects.filter(object_id=item.pk).values_list('kind', flat=True)), ['menu_item'],
+        )
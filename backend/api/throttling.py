@@ -0,0 +1,237 @@
+"""
+Request throttling for the endpoints that are expensive to abuse.
+
+Login and registration hash a password per request, and cart writes hit
+the database, so a burst of credential stuffing or cart spam is limited
+before the view runs. Throttles are DRF throttle classes: a rejected
+request gets a 429 with a ``Retry-After`` header computed by the algorithm.
+
+Two algorithms are available:
+
+* ``SlidingWindowThrottle`` approximates a sliding window from two fixed
+  windows: the previous window's count, weighted by how much of it still
+  overlaps the sliding window, plus the current count. One counter per key
+  and window, so it only needs an atomic increment from the store.
+* ``TokenBucketThrottle`` allows bursts up to the limit and refills at the
+  average rate, which suits interactive traffic such as cart edits.
+
+Rates are configured per scope in ``THROTTLING['RATES']`` (``'10/min'``,
+``'100/5m'``, ...); a scope without a rate is not throttled. Counters live in
+the store named by ``THROTTLING['STORE']``: ``LocalStore`` keeps them in
+process (limits apply per worker), ``CacheStore`` in a Django cache, which
+with the Redis backend gives limits shared by every worker.
+"""
+import math
+import re
+import threading
+import time
+from collections import OrderedDict
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.module_loading import import_string
+from rest_framework.throttling import BaseThrottle
+
+from . import metrics
+
+DEFAULTS = {
+    'STORE': 'api.throttling.LocalStore',
+    'CACHE_ALIAS': 'default',  # used by CacheStore
+    'LOCAL_MAX_KEYS': 10000,   # keys LocalStore tracks before evicting the least recently used
+    'RATES': {},               # scope -> 'count/period'
+}
+
+PERIODS = {'s': 1, 'sec': 1, 'm': 60, 'min': 60, 'h': 3600, 'hour': 3600, 'd': 86400, 'day': 86400}
+
+
+def throttle_settings():
+    return {**DEFAULTS, **getattr(settings, 'THROTTLING', {})}
+
+
+@lru_cache(maxsize=64)
+def parse_rate(rate):
+    """Parse ``'10/min'`` or ``'100/5m'`` into ``(count, seconds)``."""
+    match = re.fullmatch(r'\s*(\d+)\s*/\s*(\d*)\s*([a-z]+)\s*', rate)
+    if not match or match[3] not in PERIODS:
+        raise ValueError(f'Invalid throttle rate {rate!r}')
+    return int(match[1]), int(match[2] or 1) * PERIODS[match[3]]
+
+
+class Store:
+    """Interface for throttle counter stores. Both operations must be atomic per key."""
+
+    def window_hit(self, key, window, now):
+        """
+        Count a hit for ``key`` in the fixed window of ``window`` seconds
+        containing ``now``; return ``(previous window count, current count)``.
+        """
+        raise NotImplementedError
+
+    def bucket_take(self, key, capacity, rate, now):
+        """
+        Take a token from ``key``'s bucket (``capacity`` tokens, refilled at
+        ``rate`` per second). Return 0 if one was taken, else the seconds
+        until one is available.
+        """
+        raise NotImplementedError
+
+
+class LocalStore(Store):
+    """Counters in a dict guarded by a lock; bounded by ``LOCAL_MAX_KEYS``."""
+
+    def __init__(self):
+        self.max_keys = throttle_settings()['LOCAL_MAX_KEYS']
+        self._windows = OrderedDict()  # key -> [window index, previous count, current count]
+        self._buckets = OrderedDict()  # key -> (tokens, last refill)
+        self._lock = threading.Lock()
+
+    def window_hit(self, key, window, now):
+        index = int(now // window)
+        with self._lock:
+            entry = self._windows.get(key)
+            if entry is None:
+                entry = self._windows[key] = [index, 0, 0]
+                if len(self._windows) > self.max_keys:
+                    self._windows.popitem(last=False)
+            else:
+                self._windows.move_to_end(key)
+                if entry[0] != index:
+                    entry[1] = entry[2] if entry[0] == index - 1 else 0
+                    entry[0], entry[2] = index, 0
+            entry[2] += 1
+            return entry[1], entry[2]
+
+    def bucket_take(self, key, capacity, rate, now):
+        with self._lock:
+            tokens, updated = self._buckets.pop(key, (capacity, now))
+            tokens = min(capacity, tokens + (now - updated) * rate)
+            wait = 0.0 if tokens >= 1 else (1 - tokens) / rate
+            self._buckets[key] = (tokens - 1 if not wait else tokens, now)
+            if len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+            return wait
+
+    def clear(self):
+        with self._lock:
+            self._windows.clear()
+            self._buckets.clear()
+
+
+class CacheStore(Store):
+    """
+    Counters in the Django cache ``CACHE_ALIAS``.
+
+    Window counters use ``incr``, which is atomic in Redis and Memcached.
+    Token buckets are read and written back, so concurrent requests for the
+    same key may occasionally overdraw a bucket by a token.
+    """
+
+    prefix = 'throttle'
+
+    def __init__(self):
+        self.cache = caches[throttle_settings()['CACHE_ALIAS']]
+
+    def window_hit(self, key, window, now):
+        index = int(now // window)
+        current_key = f'{self.prefix}:w:{key}:{index}'
+        try:
+            current = self.cache.incr(current_key)
+        except ValueError:
+            # First hit in this window (the previous window's counter must outlive it).
+            current = 1 if self.cache.add(current_key, 1, timeout=math.ceil(2 * window)) else self.cache.incr(current_key)
+        return self.cache.get(f'{self.prefix}:w:{key}:{index - 1}', 0), current
+
+    def bucket_take(self, key, capacity, rate, now):
+        cache_key = f'{self.prefix}:b:{key}'
+        tokens, updated = self.cache.get(cache_key, (capacity, now))
+        tokens = min(capacity, tokens + (now - updated) * rate)
+        wait = 0.0 if tokens >= 1 else (1 - tokens) / rate
+        self.cache.set(cache_key, (tokens - 1 if not wait else tokens, now), timeout=math.ceil(capacity / rate) + 1)
+        return wait
+
+
+@lru_cache(maxsize=None)
+def _load_store(path):
+    return import_string(path)()
+
+
+def get_store():
+    return _load_store(throttle_settings()['STORE'])
+
+
+def sliding_window(store, key, limit, window, now):
+    """Count a hit; return 0 if it is within ``limit`` per ``window`` seconds, else seconds to wait."""
+    previous, current = store.window_hit(key, window, now)
+    elapsed = now % window
+    excess = previous * (1 - elapsed / window) + current - limit
+    if excess <= 0:
+        return 0.0
+    # Rejected hits are counted as well, so a client hammering the limit stays throttled.
+    # Wait until the next hit fits: first while the previous window fades out ...
+    if previous and excess + 1 <= previous * (window - elapsed) / window:
+        return (excess + 1) * window / previous
+    # ... otherwise once this window has become the previous one.
+    return window - elapsed + max(0, current + 1 - limit) * window / current
+
+
+def token_bucket(store, key, limit, period, now):
+    """Take a token from a bucket of ``limit`` refilled over ``period`` seconds; return the wait as above."""
+    return store.bucket_take(key, limit, limit / period, now)
+
+
+class RateThrottle(BaseThrottle):
+    """
+    Base class: throttle ``scope`` at ``THROTTLING['RATES'][scope]``.
+
+    ``per`` picks who shares a limit: ``'ip'`` (the client address, honouring
+    DRF's ``NUM_PROXIES``), ``'user'`` (falls back to the address for anonymous
+    requests) or ``'route'`` (everyone calling the scope).
+    """
+
+    scope = None
+    per = 'ip'
+    algorithm = None  # (store, key, limit, period, now) -> seconds to wait, 0 if allowed
+
+    def allow_request(self, request, view):
+        options = throttle_settings()
+        rate = options['RATES'].get(self.scope)
+        if rate is None:
+            return True
+        limit, period = parse_rate(rate)
+        store = _load_store(options['STORE'])
+        self._wait = self.algorithm(store, f'{self.scope}:{self.get_cache_key(request)}', limit, period, time.time())
+        if self._wait:
+            metrics.counter('throttled_requests_total', 'Requests rejected by a throttle.', labels={'scope': self.scope}).inc()
+        return not self._wait
+
+    def get_cache_key(self, request):
+        if self.per == 'route':
+            return '*'
+        if self.per == 'user' and request.user and request.user.is_authenticated:
+            return f'u{request.user.pk}'
+        return self.get_ident(request)
+
+    def wait(self):
+        return self._wait
+
+
+class SlidingWindowThrottle(RateThrottle):
+    algorithm = staticmethod(sliding_window)
+
+
+class TokenBucketThrottle(RateThrottle):
+    algorithm = staticmethod(token_bucket)
+
+
+class LoginThrottle(SlidingWindowThrottle):
+    scope = 'login'
+
+
+class RegisterThrottle(SlidingWindowThrottle):
+    scope = 'register'
+
+
+class CartThrottle(TokenBucketThrottle):
+    scope = 'cart'
+    per = 'user'
@@ -1,10 +1,45 @@
+from django.conf import settings
 from django.urls import path
-from .views import RegisterView, LoginView, UserDetailView, LogoutView, ProductListView
+from rest_framework_simplejwt.views import TokenRefreshView
+from . import async_views
+from .views import RegisterView, LoginView, UserDetailView, LogoutView, ProductListView, OrderListView
+from .views import catalog_export, catalog_import, search, search_suggestions, upload_product_image
+from .views import get_cart_items, get_cart_summary, update_cart, add_to_cart, remove_from_cart, checkout, get_order_summary, update_order_status
+
+ASYNC_ROUTES = set(getattr(settings, 'ASYNC_API_ROUTES', ()))
+
+
+def route(name, sync_view, async_view):
+    """Pick the sync or async implementation of a route (see ASYNC_API_ROUTES)."""
+    return async_view if name in ASYNC_ROUTES else sync_view
+
 
 urlpatterns = [
     path('register/', RegisterView.as_view(), name='register'),
     path('login/', LoginView.as_view(), name='login'),
-    path('user/', UserDetailView.as_view(), name='user-detail'),
+    path('user/', route('user-detail', UserDetailView.as_view(), async_views.user_detail), name='user-detail'),
     path('logout/', LogoutView.as_view(), name='logout'),
-    path('products/', ProductListView.as_view(), name='product-list'),  # Ensure this endpoint is defined
-]
\ No newline at end of file
+    path('token/refresh/', TokenRefreshView.as_view(), name='token-refresh'),
+    path('products/', route('product-list', ProductListView.as_view(), async_views.product_list), name='product-list'),  # Ensure this endpoint is defined
+    path('products/<int:product_id>/image/', upload_product_image, name='product-image'),
+    path('catalog/import/', catalog_import, name='catalog-import'),
+    path('catalog/export/', catalog_export, name='catalog-export'),
+    path('search/', search, name='search'),
+    path('search/suggest/', search_suggestions, name='search-suggest'),
+    path('cart/', route('cart', get_cart_items, async_views.cart_items), name='cart'),
+    path('cart/summary/', get_cart_summary, name='cart-summary'),
+    path('cart/update/', update_cart, name='cart-update'),
+    path('cart/add/', add_to_cart, name='cart-add'),
+    path('cart/remove/<int:product_id>/', remove_from_cart, name='cart-remove'),
+    path('checkout/', checkout, name='checkout'),
+    path('orders/', OrderListView.as_view(), name='order-list'),
+    path('orders/summary/', get_order_summary, name='order-summary'),
+    path('orders/<int:order_id>/status/', update_order_status, name='order-status'),
+    path('orders/events/', async_views.order_events, name='order-events'),
+    path('kitchen/events/', async_views.kitchen_events, name='kitchen-events'),
+
+    # Async variants are always reachable here, e.g. for side-by-side load tests.
+    path('async/user/', async_views.user_detail, name='async-user-detail'),
+    path('async/products/', async_views.product_list, name='async-product-list'),
+    path('async/cart/', async_views.cart_items, name='async-cart'),
+]
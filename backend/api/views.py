@@ -1,61 +1,109 @@
 from rest_framework.views import APIView
 from rest_framework.response import Response
-from rest_framework_simplejwt.tokens import RefreshToken
 from rest_framework.permissions import IsAuthenticated, AllowAny
 from django.contrib.auth import authenticate
 from rest_framework import status
 from rest_framework.generics import ListAPIView
 from .models import User, Product
 from .serializers import UserSerializer, ProductSerializer
+import hmac
 import logging
 from rest_framework.permissions import AllowAny 
 from rest_framework import status
 from rest_framework.response import Response
-from rest_framework.decorators import api_view, permission_classes
+from rest_framework.decorators import api_view, permission_classes, throttle_classes
 from rest_framework.permissions import IsAuthenticated
+from django.db import transaction
 from django.shortcuts import get_object_or_404
 from .models import CartItem, Product
-from .serializers import CartItemSerializer
+from .serializers import CartAddSerializer, CartItemSerializer, CartSummarySerializer, CartDeltaSerializer
+from .orders import EmptyCart, InvalidTransition, UnavailableProducts, checkout as checkout_cart, order_history, status_counts, transition
+from .serializers import OrderStatusSerializer
+from .models import Order
+from .pagination import OrderHistoryPagination
+from .serializers import OrderSerializer
+from .serializers import SearchQuerySerializer, SearchResultSerializer, SearchSuggestionSerializer
+from .search import search_catalog
+from .cart import UnknownProducts, apply_cart_deltas, cart_cache, cart_lines, cart_summary, remove_cart_line
+from django.http import Http404
+from .pagination import KeysetPagination
+from .authentication import ClaimsRefreshToken
+from .hashing import HashingBusy
+from .tasks import enqueue
+from .throttling import CartThrottle, LoginThrottle, RegisterThrottle
+from . import metrics
+from .middleware import metrics_settings
+from .catalog import catalog_cache, catalog_version, catalog_etag
+from django.http import HttpResponse
+from rest_framework.exceptions import ValidationError
+from decimal import Decimal, InvalidOperation
+from rest_framework.decorators import parser_classes
+from rest_framework.parsers import MultiPartParser
+from rest_framework.permissions import IsAdminUser
+from .images import InvalidImage, attach_image, image_settings, media_headers
+from .catalog_io import export_catalog, format_of, import_catalog
+from .serializers import CatalogFileQuerySerializer
+from django.http import StreamingHttpResponse
+from functools import partial
+from .renderers import JSONRenderer
 
 logger = logging.getLogger(__name__)
+auth_logger = logging.getLogger('api.auth')  # high volume: sampled below WARNING (see LOGGING)
 
 class RegisterView(APIView):
+    throttle_classes = [RegisterThrottle]
+
     def post(self, request):
         serializer = UserSerializer(data=request.data)
         if serializer.is_valid():
-            user = serializer.save()
-            logger.info(f"User created with email: {user.email}, password hash: {user.password}")
-            refresh = RefreshToken.for_user(user)
+            try:
+                user = serializer.save()
+            except HashingBusy:
+                return hashing_busy_response()
+            auth_logger.info('User %s registered', user.pk)
+            enqueue('send_welcome_email', user_id=user.pk)
+            refresh = ClaimsRefreshToken.for_user(user)
             return Response({
                 'refresh': str(refresh),
                 'access': str(refresh.access_token),
                 'user': serializer.data
             }, status=status.HTTP_201_CREATED)
-        logger.error(f"Registration failed: {serializer.errors}")
+        auth_logger.info('Registration rejected: invalid %s', ', '.join(serializer.errors))
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 class LoginView(APIView):
+    throttle_classes = [LoginThrottle]
+
     def post(self, request):
         email = request.data.get('email')
         password = request.data.get('password')
 
-        logger.info(f"Attempting to authenticate user with email: {email}")
-
-        user = authenticate(request, email=email, password=password)
+        try:
+            user = authenticate(request, email=email, password=password)
+        except HashingBusy:
+            return hashing_busy_response()
 
         if user:
-            logger.info(f"User {email} authenticated successfully")
-            refresh = RefreshToken.for_user(user)
+            auth_logger.info('User %s logged in', user.pk)
+            refresh = ClaimsRefreshToken.for_user(user)
             return Response({
                 'refresh': str(refresh),
                 'access': str(refresh.access_token),
                 'user': UserSerializer(user).data  # Include user data in the response
             })
         else:
-            logger.error(f"Authentication failed for user with email: {email}")
+            auth_logger.warning('Login failed', extra={'email': email})
             return Response({'error': 'Invalid Credentials'}, status=status.HTTP_400_BAD_REQUEST)
 
 
+def hashing_busy_response():
+    return Response(
+        {'error': 'Server is busy, please retry shortly'},
+        status=status.HTTP_503_SERVICE_UNAVAILABLE,
+        headers={'Retry-After': '1'},
+    )
+
+
 class UserDetailView(APIView):
     permission_classes = [IsAuthenticated]
 
@@ -68,7 +116,7 @@ class LogoutView(APIView):
     def post(self, request):
         try:
             refresh_token = request.data.get("refresh")  # Get refresh token from request body
-            token = RefreshToken(refresh_token)
+            token = ClaimsRefreshToken(refresh_token)
             token.blacklist()  # Blacklist the token
 
             return Response({"message": "Successfully logged out"}, status=status.HTTP_200_OK)
@@ -77,44 +125,375 @@ class LogoutView(APIView):
         
 
 class ProductListView(ListAPIView):
+    """
+    Product catalog, keyset-paginated on (created_at, id).
+
+    Lists products and menu items alike; ``?type=product|menu_item`` picks
+    one kind. Supports ``?available=``, ``?min_price=``/``?max_price=`` and sparse
+    fieldsets via ``?fields=id,name,price``. Responses carry an ETag
+    derived from the catalog version, so ``If-None-Match`` can be answered
+    with a 304 before the catalog is queried or serialized.
+    """
     queryset = Product.objects.all()
     serializer_class = ProductSerializer
     permission_classes = [AllowAny]
+    pagination_class = KeysetPagination
+
+    def list(self, request, *args, **kwargs):
+        version = catalog_version()
+        etag = catalog_etag(version, request.GET.urlencode())
+        if etag_matches(request, etag):
+            return Response(status=status.HTTP_304_NOT_MODIFIED, headers={'ETag': etag})
+
+        if request.accepted_renderer.format != 'json':
+            response = super().list(request, *args, **kwargs)
+            response['ETag'] = etag
+            return response
+
+        # JSON pages are rendered once per catalog version and served as bytes.
+        variant = f'{request.get_host()}?{request.GET.urlencode()}'
+        body = catalog_cache.get_or_render(
+            version, variant, partial(render_product_page, request.GET, request.build_absolute_uri()),
+        )
+        # Public: the bytes are the same for every client, so shared caches (and
+        # api.compression's LRU) may keep them; no-cache makes clients revalidate.
+        headers = {'ETag': etag, 'Cache-Control': 'public, no-cache'}
+        return HttpResponse(body, content_type=request.accepted_media_type, headers=headers)
+
+    def get_queryset(self):
+        fields = self.get_fields()
+        return filter_products(super().get_queryset(), self.request.query_params, fields, self.pagination_class.ordering)
+
+    def get_fields(self):
+        return requested_fields(self.request.query_params, self.serializer_class)
+
+    def get_serializer(self, *args, **kwargs):
+        kwargs.setdefault('fields', self.get_fields())
+        return super().get_serializer(*args, **kwargs)
+
+
+def render_product_page(params, url):
+    """
+    The JSON body of the product list page for query ``params`` (a QueryDict)
+    served at the absolute ``url``. Used by ``ProductListView`` and by the
+    catalog warmup (``api.jobs.warm_catalog``), which has no request.
+    """
+    paginator = ProductListView.pagination_class()
+    fields = requested_fields(params, ProductSerializer)
+    queryset = filter_products(Product.objects.all(), params, fields, paginator.ordering)
+    page = paginator.paginate_params(queryset, params, url)
+    data = ProductSerializer(page, many=True, fields=fields).data
+    return JSONRenderer().render(paginator.get_paginated_data(data))
+
+
+def filter_products(queryset, params, fields=None, ordering=()):
+    """Apply the catalog's ``type``/``available``/``min_price``/``max_price`` filters and column projection."""
+    kind = params.get('type')
+    if kind is not None:
+        if kind not in Product.Kind.values:
+            raise ValidationError({'type': f"Must be one of {', '.join(Product.Kind.values)}."})
+        queryset = queryset.filter(kind=kind)
+
+    available = params.get('available')
+    if available is not None:
+        if available.lower() not in ('true', 'false', '1', '0'):
+            raise ValidationError({'available': 'Must be true or false.'})
+        queryset = queryset.filter(available=available.lower() in ('true', '1'))
+
+    for param, lookup in (('min_price', 'price__gte'), ('max_price', 'price__lte')):
+        if param in params:
+            try:
+                queryset = queryset.filter(**{lookup: Decimal(params[param])})
+            except InvalidOperation:
+                raise ValidationError({param: 'Enter a number.'})
+
+    if fields is not None:
+        # Never load columns we are not going to render (e.g. long descriptions).
+        columns = {column for name in fields for column in ProductSerializer.field_columns.get(name, (name,))}
+        queryset = queryset.only(*columns | set(ordering))
+    return queryset
+
+
+def requested_fields(params, serializer_class):
+    """Parse ``?fields=a,b`` into a list, or None when the client wants every field."""
+    if 'fields' not in params:
+        return None
+    fields = [name for name in params['fields'].split(',') if name]
+    unknown = set(fields) - set(serializer_class().fields)
+    if unknown:
+        raise ValidationError({'fields': f"Unknown fields: {', '.join(sorted(unknown))}"})
+    return fields
+
+
+def etag_matches(request, etag):
+    """
+    Return True if the request's If-None-Match header matches ``etag``, using
+    the weak comparison of RFC 9110 (``W/"x"`` matches ``"x"``), since
+    compressed responses carry the weak form (see ``api.compression``).
+    """
+    header = request.headers.get('If-None-Match')
+    if not header:
+        return False
+    candidates = [tag.strip().removeprefix('W/') for tag in header.split(',')]
+    return '*' in candidates or etag.removeprefix('W/') in candidates
+
+
+@api_view(['GET'])
+@permission_classes([AllowAny])
+def search(request):
+    """
+    Ranked search over products and menu items: ``?q=`` (every word matches
+    as a prefix), optional ``?type=product|menu_item``, ``?available=`` and
+    ``?limit=`` (default 20, at most 50). When nothing matches, typos are
+    corrected and ``corrected`` holds the query that was run instead.
+    """
+    return search_response(request, SearchResultSerializer, 20, autocomplete=False)
+
+
+@api_view(['GET'])
+@permission_classes([AllowAny])
+def search_suggestions(request):
+    """Autocomplete: like ``search`` but matching names only, with compact results (default 10)."""
+    return search_response(request, SearchSuggestionSerializer, 10, autocomplete=True)
+
+
+def search_response(request, serializer_class, default_limit, autocomplete):
+    params = SearchQuerySerializer(data=request.GET)
+    params.is_valid(raise_exception=True)
+    query = params.validated_data
+    results = search_catalog(
+        query['q'], query.get('limit', default_limit), query.get('type'), query['available'], autocomplete=autocomplete,
+    )
+    return Response({
+        'query': query['q'],
+        'corrected': results.corrected,
+        'results': serializer_class(results.entries, many=True).data,
+    })
 
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def get_cart_items(request):
     """Fetch the logged-in user's cart items."""
-    cart_items = CartItem.objects.filter(user=request.user)
-    serializer = CartItemSerializer(cart_items, many=True)
-    return Response(serializer.data)
+    data = cart_cache.get_or_build(
+        request.user.pk, 'items',
+        lambda: CartItemSerializer(cart_lines(request.user), many=True).data,
+    )
+    return Response(data)
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def get_cart_summary(request):
+    """Cart lines plus item count and grand total, computed by the database."""
+    return Response(cart_cache.get_or_build(request.user.pk, 'summary', lambda: serialize_cart_summary(request.user)))
 
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
+@throttle_classes([CartThrottle])
 def add_to_cart(request):
-    """Add a product to the logged-in user's cart or update quantity."""
-    product_id = request.data.get('product_id')
-    quantity = request.data.get('quantity', 1)  # Default quantity is 1
+    """
+    Add ``quantity`` (at least 1) of a product to the logged-in user's cart:
+    201 with the new line, or 200 when the product was already in the cart.
+    """
+    add = CartAddSerializer(data=request.data)
+    add.is_valid(raise_exception=True)
+    product_id, quantity = add.validated_data['product_id'], add.validated_data['quantity']
 
-    product = get_object_or_404(Product, id=product_id)
+    try:
+        # Read the line back in the same transaction: it holds exactly the
+        # added quantity only if this request created it.
+        with transaction.atomic():
+            apply_cart_deltas(request.user, [(product_id, quantity)])
+            cart_item = cart_lines(request.user).get(product_id=product_id)
+    except UnknownProducts:
+        raise Http404
+    created = cart_item.quantity == quantity
+    return Response(CartItemSerializer(cart_item).data, status=status.HTTP_201_CREATED if created else status.HTTP_200_OK)
 
-    cart_item, created = CartItem.objects.get_or_create(
-        user=request.user, product=product,
-        defaults={'quantity': quantity}
-    )
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+@throttle_classes([CartThrottle])
+def update_cart(request):
+    """Apply a batch of ``{product_id, quantity}`` deltas in one transaction and return the cart."""
+    deltas = CartDeltaSerializer(data=request.data, many=True)
+    deltas.is_valid(raise_exception=True)
+
+    try:
+        apply_cart_deltas(request.user, [(d['product_id'], d['quantity']) for d in deltas.validated_data])
+    except UnknownProducts as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
-    if not created:
-        cart_item.quantity += quantity
-        cart_item.save()
+    return Response(serialize_cart_summary(request.user))
 
-    serializer = CartItemSerializer(cart_item)
-    return Response(serializer.data, status=status.HTTP_201_CREATED)
+def serialize_cart_summary(user):
+    items, item_count, total = cart_summary(user)
+    return CartSummarySerializer({'items': items, 'item_count': item_count, 'total': total}).data
 
 @api_view(['DELETE'])
 @permission_classes([IsAuthenticated])
 def remove_from_cart(request, product_id):
     """Remove a product from the cart."""
-    cart_item = get_object_or_404(CartItem, user=request.user, product_id=product_id)
-    cart_item.delete()
-    return Response({'message': 'Item removed from cart'}, status=status.HTTP_204_NO_CONTENT)
\ No newline at end of file
+    if not remove_cart_line(request.user, product_id):
+        raise Http404
+    return Response({'message': 'Item removed from cart'}, status=status.HTTP_204_NO_CONTENT)
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def checkout(request):
+    """
+    Place an order for everything in the cart.
+
+    Send an ``Idempotency-Key`` header to make retries safe: repeating the
+    request with the same key returns the original order with 200 instead of
+    creating a second one.
+    """
+    key = request.headers.get('Idempotency-Key', '').strip()
+    if len(key) > 64:
+        return Response({'error': 'Idempotency-Key must be at most 64 characters.'}, status=status.HTTP_400_BAD_REQUEST)
+
+    try:
+        order, created = checkout_cart(request.user, key or None)
+    except EmptyCart:
+        return Response({'error': 'Cart is empty.'}, status=status.HTTP_400_BAD_REQUEST)
+    except UnavailableProducts as e:
+        return Response({'error': str(e)}, status=status.HTTP_409_CONFLICT)
+
+    return Response(OrderSerializer(order).data, status=status.HTTP_201_CREATED if created else status.HTTP_200_OK)
+
+
+class OrderListView(ListAPIView):
+    """The logged-in user's orders, newest first, keyset-paginated on (created_at, id)."""
+    serializer_class = OrderSerializer
+    permission_classes = [IsAuthenticated]
+    pagination_class = OrderHistoryPagination
+
+    def get_queryset(self):
+        return order_history(self.request.user)
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def get_order_summary(request):
+    """Order counts per status, read from the denormalized counter table."""
+    counts = status_counts(request.user)
+    return Response({'total': sum(counts.values()), 'statuses': counts})
+
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def update_order_status(request, order_id):
+    """
+    Move an order along the state machine (see ``Order.TRANSITIONS``).
+
+    Staff may make any allowed move; customers may only cancel their own orders.
+    """
+    serializer = OrderStatusSerializer(data=request.data)
+    serializer.is_valid(raise_exception=True)
+    new_status = serializer.validated_data['status']
+    if not request.user.is_staff and new_status != Order.Status.CANCELLED:
+        return Response({'error': 'Only the kitchen can change this status.'}, status=status.HTTP_403_FORBIDDEN)
+
+    try:
+        order = transition(order_id, new_status, user=None if request.user.is_staff else request.user)
+    except Order.DoesNotExist:
+        raise Http404
+    except InvalidTransition as e:
+        return Response({'error': str(e)}, status=status.HTTP_409_CONFLICT)
+    return Response({'id': order.id, 'status': order.status})
+
+
+@api_view(['POST'])
+@permission_classes([IsAdminUser])
+@parser_classes([MultiPartParser])
+def upload_product_image(request, product_id):
+    """
+    Replace a product's image (multipart field ``image``). The original is
+    stored right away; the resized variants are rendered in the background,
+    so the response is 202 and ``images.variants`` fills in later.
+    """
+    product = get_object_or_404(Product, pk=product_id)
+    upload = request.FILES.get('image')
+    if upload is None:
+        return Response({'image': 'No file was submitted.'}, status=status.HTTP_400_BAD_REQUEST)
+    try:
+        attach_image(product, upload)
+    except InvalidImage as e:
+        return Response({'image': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    return Response(ProductSerializer(product).data, status=status.HTTP_202_ACCEPTED)
+
+
+@api_view(['POST'])
+@permission_classes([IsAdminUser])
+@parser_classes([MultiPartParser])
+def catalog_import(request):
+    """
+    Upsert products and menu items by SKU from an uploaded CSV or JSON Lines
+    file (multipart field ``file``; see api/catalog_io.py). The format comes
+    from ``?file_format=`` or the file name. Invalid rows are skipped and listed.
+    """
+    params = CatalogFileQuerySerializer(data=request.GET)
+    params.is_valid(raise_exception=True)
+    upload = request.FILES.get('file')
+    if upload is None:
+        return Response({'file': 'No file was submitted.'}, status=status.HTTP_400_BAD_REQUEST)
+    report = import_catalog(upload, params.validated_data.get('file_format') or format_of(upload.name))
+    return Response({
+        'imported': report.imported,
+        'invalid': report.invalid,
+        'errors': [{'line': line, 'error': message} for line, message in report.errors],
+    })
+
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def catalog_export(request):
+    """
+    Stream the catalog as CSV (default) or JSON Lines (``?file_format=jsonl``);
+    ``?type=`` limits it to products or menu items.
+    """
+    params = CatalogFileQuerySerializer(data=request.GET)
+    params.is_valid(raise_exception=True)
+    fmt = params.validated_data.get('file_format', 'csv')
+    kind = params.validated_data.get('type')
+    response = StreamingHttpResponse(
+        export_catalog(fmt, [kind] if kind else None),
+        content_type='text/csv; charset=utf-8' if fmt == 'csv' else 'application/x-ndjson; charset=utf-8',
+    )
+    response['Content-Disposition'] = f'attachment; filename="catalog.{fmt}"'
+    return response
+
+
+def serve_media(request, name):
+    """
+    Hand a media file to the front server with an ``X-Accel-Redirect``
+    (see ``PRODUCT_IMAGES``), so Django never streams the bytes itself.
+    """
+    if '..' in name.split('/') or name.startswith('/'):
+        raise Http404
+    options = image_settings()
+    response = HttpResponse(headers=media_headers(name))
+    response[options['ACCEL_REDIRECT_HEADER']] = options['ACCEL_REDIRECT_PREFIX'] + name
+    return response
+
+
+def prometheus_metrics(request):
+    """
+    Every registered metric in the Prometheus text format (scraped by Prometheus).
+
+    Closed unless the scraper sends ``Bearer <TOKEN>``, connects from one of
+    ``ALLOWED_IPS``, or is a signed-in staff user: route labels and counts
+    describe traffic and should not be public.
+    """
+    if not metrics_allowed(request, metrics_settings()):
+        return HttpResponse(status=status.HTTP_403_FORBIDDEN)
+    return HttpResponse(metrics.exposition(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+def metrics_allowed(request, options):
+    token = options['TOKEN']
+    if token and hmac.compare_digest(request.headers.get('Authorization', '').encode(), f'Bearer {token}'.encode()):
+        return True
+    if request.META.get('REMOTE_ADDR') in options['ALLOWED_IPS']:
+        return True
+    user = getattr(request, 'user', None)
+    return bool(user and user.is_staff)
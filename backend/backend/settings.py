@@ -6,6 +6,7 @@ For more details, visit:
 https://docs.djangoproject.com/en/5.1/topics/settings/
 """
 
+import os
 from pathlib import Path
 from datetime import timedelta
 
@@ -43,11 +44,35 @@ INSTALLED_APPS = [
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
         'rest_framework_simplejwt.authentication.JWTAuthentication',
+        # Stateless fast path: user built from token claims, no per-request
+        # User query. Swap it in for the line above to enable.
+        # 'api.authentication.ClaimsJWTAuthentication',
     ),
+    'DEFAULT_RENDERER_CLASSES': (
+        'api.renderers.JSONRenderer',  # timed for the request metrics
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ),
+    # Reverse proxies in front of the app. Per-IP throttles key on the address
+    # this many hops back in X-Forwarded-For; 0 ignores the (client-supplied)
+    # header and uses REMOTE_ADDR. Never leave it unset: DRF then keys on the
+    # whole header, which a client can change on every request.
+    'NUM_PROXIES': int(os.environ.get('NUM_PROXIES', '0')),
 }
 
+# Routes served by the async views in api/async_views.py when running under
+# ASGI (backend.asgi). Any of: 'product-list', 'cart', 'user-detail'.
+ASYNC_API_ROUTES = []
+
+# JSON encoder of api.renderers.JSONRenderer: 'orjson' (if installed) or 'json'
+API_JSON_ENCODER = os.environ.get('API_JSON_ENCODER', 'orjson')
+
+# Seconds a worker trusts its cached is_active and is_staff flags under ClaimsJWTAuthentication
+STATELESS_AUTH_STATUS_TTL = 30
+
 # 🔹 Middleware 
 MIDDLEWARE = [
+    'api.middleware.request_metrics_middleware',  # outermost, so it times everything below
+    'api.compression.compression_middleware',  # sees final bodies; the metrics above record bytes sent
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',  # CORS Middleware
@@ -58,6 +83,56 @@ MIDDLEWARE = [
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
+# 🔹 Response Compression (see api/compression.py; 'br' needs the brotli package)
+RESPONSE_COMPRESSION = {
+    'ENCODINGS': ['br', 'gzip'],
+    'MIN_SIZE': 1024,
+    'GZIP_LEVEL': 6,
+    'BROTLI_QUALITY': 5,
+    'CACHE_ENTRIES': 256,
+}
+
+# 🔹 Request Metrics (see api/middleware.py; scraped from /metrics)
+# /metrics answers 403 unless the scraper sends METRICS_TOKEN as a bearer
+# token or connects from METRICS_ALLOWED_IPS (comma-separated); staff
+# users signed in to the admin can always read it.
+REQUEST_METRICS = {
+    'SAMPLE_RATE': float(os.environ.get('METRICS_SAMPLE_RATE', '1.0')),
+    'SLOW_REQUEST_MS': 500,
+    'SERVER_TIMING': DEBUG,
+    'MAX_STATEMENTS': 50,
+    'TOKEN': os.environ.get('METRICS_TOKEN'),
+    'ALLOWED_IPS': [ip.strip() for ip in os.environ.get('METRICS_ALLOWED_IPS', '').split(',') if ip.strip()],
+}
+
+# 🔹 Logging (see api/logs.py)
+# JSON lines on stderr, written by a background thread. Auth events are
+# sampled below WARNING: set LOG_AUTH_SAMPLE_RATE=1 to keep every login.
+LOGGING_CONFIG = 'api.logs.configure'
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'queue': True,  # handlers run on a QueueListener thread, not the request thread
+    'formatters': {
+        'json': {'()': 'api.logs.JSONFormatter'},
+    },
+    'filters': {
+        'redact': {'()': 'api.logs.RedactFilter'},
+        'sample_auth': {'()': 'api.logs.SampleFilter', 'rate': float(os.environ.get('LOG_AUTH_SAMPLE_RATE', '0.1'))},
+    },
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler', 'formatter': 'json', 'filters': ['redact']},
+    },
+    'root': {'handlers': ['console'], 'level': os.environ.get('LOG_LEVEL', 'INFO')},
+    'loggers': {
+        'django': {'handlers': ['console'], 'level': 'INFO', 'propagate': False},
+        # Django's default config gives runserver's access log its own handler
+        # and propagate=False; listing it here queues and JSON-formats it too.
+        'django.server': {'handlers': ['console'], 'level': 'INFO', 'propagate': False},
+        'api.auth': {'filters': ['sample_auth']},
+    },
+}
+
 # 🔹 URL Configuration
 ROOT_URLCONF = 'backend.urls'
 
@@ -81,14 +156,134 @@ TEMPLATES = [
 # 🔹 WSGI Application
 WSGI_APPLICATION = 'backend.wsgi.application'
 
-# 🔹 Database Configuration (Uses SQLite)
-DATABASES = {
+# 🔹 Database Configuration
+# Chosen by environment so the same code runs on a laptop and in production:
+#   DB_ENGINE=sqlite (default)  SQLite file, WAL journal, IMMEDIATE transactions
+#   DB_ENGINE=postgres          PostgreSQL via DB_NAME/DB_USER/DB_PASSWORD/DB_HOST/DB_PORT
+#                               DB_POOL=django uses psycopg's built-in pool,
+#                               DB_POOL=pgbouncer assumes PgBouncer in transaction mode.
+# DB_CONN_MAX_AGE keeps connections open between requests (seconds; 0 = per request);
+# health checks make a reused connection that the server dropped reconnect cleanly.
+DB_ENGINE = os.environ.get('DB_ENGINE', 'sqlite')
+DB_POOL = os.environ.get('DB_POOL', '')
+DB_CONN_MAX_AGE = int(os.environ.get('DB_CONN_MAX_AGE', '60'))
+
+if DB_ENGINE == 'postgres':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': os.environ.get('DB_NAME', 'tasty_kitchen'),
+            'USER': os.environ.get('DB_USER', 'postgres'),
+            'PASSWORD': os.environ.get('DB_PASSWORD', ''),
+            'HOST': os.environ.get('DB_HOST', 'localhost'),
+            'PORT': os.environ.get('DB_PORT', '5432'),
+            'CONN_MAX_AGE': DB_CONN_MAX_AGE,
+            'CONN_HEALTH_CHECKS': True,
+            'OPTIONS': {},
+        }
+    }
+    if DB_POOL == 'django':
+        # Django's native pool replaces persistent connections (CONN_MAX_AGE must be 0).
+        DATABASES['default']['CONN_MAX_AGE'] = 0
+        DATABASES['default']['OPTIONS']['pool'] = {
+            'min_size': int(os.environ.get('DB_POOL_MIN', '2')),
+            'max_size': int(os.environ.get('DB_POOL_MAX', '10')),
+            'timeout': 10,
+        }
+    elif DB_POOL == 'pgbouncer':
+        # Transaction pooling cannot keep server-side cursors open across statements.
+        DATABASES['default']['DISABLE_SERVER_SIDE_CURSORS'] = True
+else:
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.environ.get('DB_NAME', BASE_DIR / "db.sqlite3"),
+            'CONN_MAX_AGE': DB_CONN_MAX_AGE,
+            'CONN_HEALTH_CHECKS': True,
+            'OPTIONS': {
+                # Take the write lock at BEGIN so concurrent cart writes wait on the
+                # busy timeout instead of failing on a read-to-write lock upgrade.
+                'transaction_mode': 'IMMEDIATE',
+                'timeout': 20,
+            },
+            # A file (not shared-cache memory) so threaded tests get real locking.
+            'TEST': {'NAME': BASE_DIR / 'test_db.sqlite3'},
+        }
+    }
+
+# PRAGMAs applied to every new SQLite connection (see api.signals). WAL lets
+# readers proceed while a cart write is in progress, and synchronous=NORMAL
+# is durable across application crashes in WAL mode while avoiding an fsync
+# per commit. busy_timeout is in milliseconds.
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'busy_timeout': 20000,
+    'temp_store': 'MEMORY',
+}
+
+# 🔹 Cache Configuration
+# LocMem is per-process; point 'default' at Redis/Memcached (or a shared
+# FileBasedCache) when running several workers so catalog invalidation is seen by all.
+# Cart snapshots (api/cart.py) live here too: on LocMem, a cart changed through
+# one worker stays stale on the others for up to 300 s (`check --deploy` warns, api.W004).
+CACHES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / "db.sqlite3",
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
     }
 }
 
+# 🔹 Catalog Cache (see api/catalog.py)
+CATALOG_CACHE = {
+    'CACHE_ALIAS': 'default',
+    'LOCAL_MAX_ENTRIES': 256,
+    'TIMEOUT': 600,
+    # Pages re-rendered in the background after catalog changes (api.jobs.warm_catalog);
+    # skipped while CACHE_ALIAS is per-process (LocMem), as a worker could only warm itself.
+    'WARM_URLS': [
+        'http://localhost:8000/api/products/',
+        'http://localhost:8000/api/products/?available=true',
+    ],
+}
+
+# 🔹 Background Tasks (see api/tasks.py; run with `python manage.py run_worker`)
+TASK_QUEUE = {
+    'THREADS': 4,
+    'POLL_INTERVAL': 1.0,
+    'LEASE': 300,
+    'MAX_ATTEMPTS': 3,
+    'BACKOFF': 5,
+    'BACKOFF_MAX': 600,
+    'PERIODIC': {
+        'prune_tokens': 60 * 60,
+    },
+}
+
+# 🔹 Throttling (see api/throttling.py)
+# LocalStore limits apply per worker process; for limits shared by every
+# worker use 'api.throttling.CacheStore' with a Redis or Memcached cache.
+THROTTLING = {
+    'STORE': 'api.throttling.LocalStore',
+    'RATES': {
+        'login': '10/min',     # per client IP, sliding window
+        'register': '20/hour', # per client IP, sliding window
+        'cart': '60/min',      # per user, token bucket: bursts of up to 60 edits
+    },
+}
+
+# 🔹 Email
+EMAIL_BACKEND = os.environ.get('EMAIL_BACKEND', 'django.core.mail.backends.console.EmailBackend')
+DEFAULT_FROM_EMAIL = os.environ.get('DEFAULT_FROM_EMAIL', 'Tasty Kitchen <no-reply@tastykitchen.local>')
+
+# 🔹 Order Status Events (see api/events.py)
+# The SSE endpoints need an ASGI server; LocalBroker only fans out within one
+# process, so swap in a shared broker before running several ASGI workers.
+ORDER_EVENTS = {
+    'BROKER': 'api.events.LocalBroker',
+    'QUEUE_SIZE': 100,
+    'HEARTBEAT': 15,
+}
+
 # 🔹 Password Validation
 AUTH_PASSWORD_VALIDATORS = [
     {'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator'},
@@ -97,6 +292,31 @@ AUTH_PASSWORD_VALIDATORS = [
     {'NAME': 'django.contrib.auth.password_validation.NumericPasswordValidator'},
 ]
 
+# 🔹 Password Hashing
+# The first hasher is preferred: stored hashes from the others are upgraded to
+# it on the next successful login. Argon2 is used when argon2-cffi is installed,
+# otherwise scrypt (stdlib); both verify faster than PBKDF2 at comparable strength.
+PASSWORD_HASHERS = [
+    'django.contrib.auth.hashers.ScryptPasswordHasher',
+    'django.contrib.auth.hashers.PBKDF2PasswordHasher',
+    'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
+    'django.contrib.auth.hashers.Argon2PasswordHasher',
+    'django.contrib.auth.hashers.BCryptSHA256PasswordHasher',
+]
+try:
+    import argon2  # noqa: F401
+    PASSWORD_HASHERS.insert(0, PASSWORD_HASHERS.pop(PASSWORD_HASHERS.index('django.contrib.auth.hashers.Argon2PasswordHasher')))
+except ImportError:
+    pass
+
+# Bounded pool for password hashing (api/hashing.py): at most MAX_WORKERS
+# hashes run at once per process; callers waiting longer than QUEUE_TIMEOUT
+# seconds get a 503 instead of queueing behind a login spike.
+PASSWORD_HASHING = {
+    'MAX_WORKERS': 4,
+    'QUEUE_TIMEOUT': 2.0,
+}
+
 # 🔹 Internationalization
 LANGUAGE_CODE = 'en-us'
 TIME_ZONE = 'UTC'
@@ -108,6 +328,18 @@ STATIC_URL = '/static/'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# 🔹 Product Images (see api/images.py; variants need Pillow)
+# Uploads are stored under content hashes and served with a one-year
+# immutable Cache-Control. Without DEBUG, /media/ answers with an
+# X-Accel-Redirect, so the front server must map the prefix to MEDIA_ROOT:
+#   location /protected-media/ { internal; alias /srv/tasty-kitchen/media/; }
+# With object storage (django-storages) the URLs point at the bucket instead.
+PRODUCT_IMAGES = {
+    'VARIANTS': {'thumb': 160, 'card': 480, 'detail': 1200},
+    'FORMATS': ['avif', 'webp'],
+    'ACCEL_REDIRECT_PREFIX': '/protected-media/',
+}
+
 # 🔹 Default Primary Key Field Type
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
@@ -124,7 +356,7 @@ CORS_ALLOWED_ORIGINS = [
 # 🔹 Authentication Backends
 
 AUTHENTICATION_BACKENDS = [
-    'django.contrib.auth.backends.ModelBackend',
+    'api.backends.PooledHashBackend',  # ModelBackend with bounded, off-thread hashing
 ]
 # if di mugana tryi ni AUTHENTICATION_BACKENDS = [
 #     'api.backends.EmailBackend',  # Custom backend for email-based authentication
@@ -137,4 +369,8 @@ SIMPLE_JWT = {
     'REFRESH_TOKEN_LIFETIME': timedelta(days=7),
     'ROTATE_REFRESH_TOKENS': True,  # Generates a new refresh token upon refresh
     'BLACKLIST_AFTER_ROTATION': True,  # Blacklist old refresh tokens
-}
\ No newline at end of file
+    'TOKEN_REFRESH_SERIALIZER': 'api.serializers.ClaimsTokenRefreshSerializer',
+}
+
+# Seconds between incremental refreshes of the in-memory token blacklist index
+TOKEN_BLACKLIST_SYNC_INTERVAL = 5
\ No newline at end of file
@@ -17,7 +17,10 @@
 
       const fetchCart = async () => {
         try {
-          const response = await fetch(`http://localhost:8000/api/cart/${user}/`);
+          const token = localStorage.getItem("accessToken");
+          const response = await fetch("http://localhost:8000/api/cart/", {
+            headers: { Authorization: `Bearer ${token}` },
+          });
           if (!response.ok) throw new Error("Failed to fetch cart");
           const data = await response.json();
           setCart(data);
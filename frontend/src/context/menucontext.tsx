@@ -35,13 +35,19 @@ export const MenuProvider: React.FC<{ children: ReactNode }> = ({ children }) =>
     const token = localStorage.getItem("token");
     setIsLoggedIn(!!token);
 
-    // Fetch products from API
+    // Fetch products from API, following the `next` links until the last page
     const fetchProducts = async () => {
       try {
-        const response = await fetch("http://127.0.0.1:8000/api/products/");
-        if (!response.ok) throw new Error("Network response was not ok");
-        const data = await response.json();
-        setProducts(data);
+        const all: Product[] = [];
+        let url: string | null = "http://127.0.0.1:8000/api/products/?page_size=200";
+        while (url) {
+          const response = await fetch(url);
+          if (!response.ok) throw new Error("Network response was not ok");
+          const data: { next: string | null; results: Product[] } = await response.json();
+          all.push(...data.results);
+          url = data.next;
+        }
+        setProducts(all);
       } catch (error) {
         console.error("Error fetching products:", error);
       }
@@ -22,18 +22,24 @@ const Home = () => {
   const { user } = useAuth();
   const { addToCart } = useCart();
 
-  // Fetch products from API
+  // Fetch products from API, following the `next` links until the last page
   useEffect(() => {
     const fetchProducts = async () => {
       try {
         const token = localStorage.getItem('accessToken'); // ✅ Consistent key
-        const response = await axios.get<Product[]>('http://127.0.0.1:8000/api/products/', {
-          headers: {
-            'Content-Type': 'application/json',
-            'Authorization': token ? `Bearer ${token}` : '',
-          },
-        });
-        setProducts(response.data); // ✅ Now TypeScript knows it's Product[]
+        const all: Product[] = [];
+        let url: string | null = 'http://127.0.0.1:8000/api/products/?page_size=200';
+        while (url) {
+          const response: { data: { next: string | null; results: Product[] } } = await axios.get(url, {
+            headers: {
+              'Content-Type': 'application/json',
+              'Authorization': token ? `Bearer ${token}` : '',
+            },
+          });
+          all.push(...response.data.results);
+          url = response.data.next;
+        }
+        setProducts(all);
       } catch (error) {
         console.error('Error fetching products:', error);
       }